@@ -0,0 +1,174 @@
+"""Compares the torch and ONNX Runtime int8 embedding backends of flask_model2.
+
+Embeds a synthetic set of judgment chunks and questions with each backend in
+its own process, so load time and peak RSS aren't mixed up, and checks that
+the int8 model retrieves the same chunks: for every question the top-k
+chunks by cosine similarity are compared between the two backends. Exits
+non-zero when the mean top-k overlap falls below --min-overlap. The ONNX
+export is written to --onnx-dir (a temporary directory by default) from a
+separate process, so torch doesn't count towards the ONNX peak RSS. Run
+from the repository root:
+
+    python benchmarks/bench_onnx_embeddings.py --chunks 512 --threads 1
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'flask_model2'))
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+SENTENCES = [
+    "The learned counsel for the appellant submitted that the impugned order is bad in law.",
+    "It is well settled that the burden of proof lies on the prosecution to establish the guilt.",
+    "In the present case, the trial court failed to appreciate the evidence on record.",
+    "This Court has held in a catena of decisions that bail is the rule and jail the exception.",
+    "The respondent filed a written statement denying the averments made in the plaint.",
+    "We have carefully considered the rival submissions and perused the material placed before us.",
+    "Section 25F of the Industrial Disputes Act mandates payment of retrenchment compensation.",
+    "Accordingly, the appeal is allowed and the judgment of the High Court is set aside.",
+    "The assessee claimed a deduction under Section 80-IB which was disallowed by the assessing officer.",
+    "The tenant contended that the eviction petition was not maintainable under the Rent Control Act.",
+    "The writ petition challenges the constitutional validity of the amendment under Article 14.",
+    "The arbitral award was set aside on the ground that it was in conflict with public policy.",
+]
+
+QUESTIONS = [
+    "Who bears the burden of proof?",
+    "Was the appeal allowed?",
+    "What did the court say about bail?",
+    "Is retrenchment compensation payable?",
+    "Why was the deduction disallowed?",
+    "Was the eviction petition maintainable?",
+    "Which article of the constitution is challenged?",
+    "On what ground was the arbitral award set aside?",
+    "What did the respondent state in the written statement?",
+    "Did the trial court appreciate the evidence?",
+]
+
+
+def make_chunks(count, seed):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 10))) for _ in range(count)]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export(model, onnx_dir):
+    from onnx_embeddings import export_quantized
+
+    start = time.perf_counter()
+    export_quantized(model, onnx_dir)
+    return time.perf_counter() - start
+
+
+def run_backend(backend, model, onnx_dir, threads, chunks, questions, batch_size):
+    # Runs in a fresh process per backend
+    timings = {}
+    if backend == 'onnx':
+        from onnx_embeddings import OnnxEmbeddings
+
+        start = time.perf_counter()
+        encoder = OnnxEmbeddings(model, onnx_dir, threads=threads)
+        timings['load_seconds'] = time.perf_counter() - start
+
+        def encode(texts):
+            vectors = []
+            for i in range(0, len(texts), batch_size):
+                vectors.extend(encoder.embed_documents(texts[i:i + batch_size]))
+            return np.asarray(vectors, dtype=np.float32)
+    else:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(threads)
+        start = time.perf_counter()
+        encoder = SentenceTransformer(model, device='cpu')
+        timings['load_seconds'] = time.perf_counter() - start
+
+        def encode(texts):
+            return encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+    encode(chunks[:batch_size])
+    start = time.perf_counter()
+    chunk_vectors = encode(chunks)
+    timings['embed_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    question_vectors = np.stack([encode([question])[0] for question in questions])
+    timings['query_ms'] = (time.perf_counter() - start) / len(questions) * 1000
+    timings['peak_rss_mb'] = peak_rss_mb()
+    return timings, np.asarray(chunk_vectors), question_vectors
+
+
+def top_k(question_vectors, chunk_vectors, k):
+    scores = question_vectors @ chunk_vectors.T
+    return np.argsort(-scores, axis=1, kind='stable')[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--chunks', type=int, default=512)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--top-k', type=int, default=4)
+    parser.add_argument('--min-overlap', type=float, default=0.9)
+    parser.add_argument('--onnx-dir', default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks, args.seed)
+    onnx_dir = args.onnx_dir or tempfile.mkdtemp(prefix='onnx-embeddings-')
+    print(f"{len(chunks)} chunks, {len(QUESTIONS)} questions, {args.threads} thread(s), model {args.model}")
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(1) as pool:
+            export_seconds = pool.apply(export, (args.model, onnx_dir))
+        for backend in ('torch', 'onnx'):
+            with context.Pool(1) as pool:
+                results[backend] = pool.apply(run_backend, (
+                    backend, args.model, onnx_dir, args.threads, chunks, QUESTIONS, args.batch_size
+                ))
+    finally:
+        if args.onnx_dir is None:
+            shutil.rmtree(onnx_dir, ignore_errors=True)
+
+    print(f"  onnx export {export_seconds:.1f} s")
+    baseline = results['torch'][0]
+    for backend, (timings, _, _) in results.items():
+        speedup = baseline['embed_seconds'] / timings['embed_seconds']
+        print(f"  {backend:6} load {timings['load_seconds']:6.2f} s  "
+              f"embed {timings['embed_seconds']:7.2f} s ({len(chunks) / timings['embed_seconds']:7.1f} chunks/s, "
+              f"{speedup:4.1f}x)  query {timings['query_ms']:6.1f} ms  peak RSS {timings['peak_rss_mb']:7.1f} MB")
+
+    _, torch_chunks, torch_questions = results['torch']
+    _, onnx_chunks, onnx_questions = results['onnx']
+    cosine = (torch_chunks * onnx_chunks).sum(axis=1)
+    expected = top_k(torch_questions, torch_chunks, args.top_k)
+    actual = top_k(onnx_questions, onnx_chunks, args.top_k)
+    overlap = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(expected, actual)])
+    top1 = np.mean(expected[:, 0] == actual[:, 0])
+
+    print(f"  chunk cosine torch vs onnx: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    print(f"  top-{args.top_k} overlap {overlap:.3f}, top-1 agreement {top1:.3f} (min overlap {args.min_overlap})")
+    return 0 if overlap >= args.min_overlap else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,670 @@
+"""Offline end-to-end benchmark of the summarization and Q&A pipelines.
+
+Builds a fixed corpus of synthetic judgments as PDF, DOCX and TXT files in
+each of --sizes pages, --repeat seeded variants of each so that no request
+is answered from a cache, and sends it through both apps, each in a fresh
+copy of its directory and its own process, with the Flask test client:
+
+  summarize      POST /summarize of every document (flask_model1)
+  resummarize    POST /summarize of each TXT document again, with one word of
+                 its last paragraph changed, as an edited re-upload
+                 (flask_model1)
+  upload         POST /upload of every document (flask_model2)
+  ask            POST /ask of each of QUESTIONS about every uploaded document
+  corpus_search  POST /corpus/search after each upload
+
+The end-to-end time of each request is recorded, together with the time
+spent in each pipeline stage, read from the stage histograms of /metrics.
+p50, p95 and mean per size and format, throughput, model load time and the
+peak RSS of each app's process are printed and written to --output as
+JSON. With --compare, the run is checked against a previous output:
+latencies and peak RSS that grew, or throughputs that fell, by more than
+--threshold are flagged as regressions. Small absolute changes (under
+--min-delta-ms, or --min-delta-mb for RSS) are not flagged. The run exits
+non-zero if there are regressions, and fails outright if a summary comes
+back from the summary cache or an edited re-upload doesn't reuse the
+summaries of the chunks it left unchanged.
+
+Everything runs offline with HF_HUB_OFFLINE set. When an app's model isn't
+in the local Hugging Face cache, or with --stand-in, a small randomly
+initialised model of the same kind is built once under --models-dir and
+used instead. Stand-in results are only compared with stand-in results.
+Run from the repository root:
+
+    python benchmarks/bench_pipelines.py --output before.json
+    python benchmarks/bench_pipelines.py --output after.json --compare before.json
+
+--corpus DIR writes the corpus to DIR, or reuses the one already there.
+"""
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUMMARIZER_NAME = "Ruthwik/LExiMinD_legal_t5_summarizer"
+EMBEDDER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+FORMATS = ('pdf', 'docx', 'txt')
+# Bumped when the generated documents change, so an old corpus isn't reused
+CORPUS_VERSION = 1
+
+# The apps must not reach the network or rate limit the benchmark
+CHILD_ENV = {
+    'HF_HUB_OFFLINE': '1',
+    'TRANSFORMERS_OFFLINE': '1',
+    'MODEL_LOADING': 'lazy',
+    'RATE_LIMIT_SUMMARIZE': '0',
+    'RATE_LIMIT_UPLOAD': '0',
+    'RATE_LIMIT_ASK': '0',
+    'TOKENIZERS_PARALLELISM': 'false',
+}
+
+SENTENCES = [
+    "The appellant was convicted under Section {section} of the Indian Penal Code and sentenced to "
+    "{years} years of rigorous imprisonment.",
+    "Learned counsel for the appellant submitted that the prosecution failed to prove the guilt of the "
+    "accused beyond reasonable doubt.",
+    "The testimony of PW-{witness} is consistent with the medical evidence and inspires confidence.",
+    "It is well settled that the burden of proof lies on the prosecution to establish every link in the "
+    "chain of circumstances.",
+    "Reliance was placed on State of Punjab v. Ajaib Singh ({year}) SCR {page}, where this Court "
+    "considered the scope of Section {section}.",
+    "The trial court failed to appreciate that the weapon was recovered {days} days after the occurrence.",
+    "The respondent filed a written statement denying the averments made in paragraph {paragraph} of the "
+    "plaint.",
+    "Section 25F of the Industrial Disputes Act mandates payment of retrenchment compensation before the "
+    "termination of a workman.",
+    "We have carefully considered the rival submissions and perused the material placed on record.",
+    "The High Court, by the impugned judgment dated {day}.{month}.{year}, dismissed the criminal appeal.",
+    "In our opinion, the findings of the courts below do not call for interference under Article 136 of "
+    "the Constitution.",
+    "The delay of {days} days in lodging the first information report has not been satisfactorily "
+    "explained.",
+    "Bail is the rule and jail the exception, and the petitioner has been in custody for {years} years.",
+    "Accordingly, the appeal is allowed and the judgment of the High Court is set aside.",
+]
+SENTENCES_PER_PAGE = 24
+LINE_WIDTH = 90
+
+QUESTIONS = [
+    "What did the court hold about the conviction under Section 302 of the Indian Penal Code?",
+    "Why was the evidence of the witness and the burden of proof on the prosecution discussed?",
+    "What was held in State of Punjab v. Ajaib Singh (1953) SCR 254?",
+]
+CORPUS_QUESTION = "burden of proof on the prosecution in a criminal appeal"
+# The edit for resummarize: the last " the " of the document becomes " this ".
+# The word count, and so the summary length bounds, stay the same, and only
+# the last chunk's text changes.
+EDIT_WORDS = (' the ', ' this ')
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+STAGE_RE = re.compile(r'stage="([^"]*)"')
+
+
+# Corpus
+
+def make_judgment(pages, seed):
+    # A list of pages, each a (header lines, paragraphs, footer lines) triple
+    rng = random.Random(seed)
+    header = [
+        "IN THE SUPREME COURT OF INDIA",
+        f"CRIMINAL APPEAL NO. {rng.randint(100, 2999)} OF {rng.randint(1990, 2023)}",
+    ]
+    judgment = []
+    for number in range(1, pages + 1):
+        sentences = [
+            rng.choice(SENTENCES).format(
+                section=rng.choice((302, 304, 307, 323, 376, 420, 498)),
+                years=rng.randint(2, 14),
+                witness=rng.randint(1, 20),
+                year=rng.randint(1950, 2020),
+                page=rng.randint(1, 999),
+                days=rng.randint(2, 90),
+                paragraph=rng.randint(1, 40),
+                day=rng.randint(1, 28),
+                month=rng.randint(1, 12)
+            )
+            for _ in range(SENTENCES_PER_PAGE)
+        ]
+        paragraphs = []
+        while sentences:
+            size = rng.randint(3, 6)
+            paragraphs.append(' '.join(sentences[:size]))
+            sentences = sentences[size:]
+        judgment.append((header, paragraphs, [f"Page {number} of {pages}"]))
+    return judgment
+
+
+def judgment_lines(page):
+    header, paragraphs, footer = page
+    lines = list(header) + ['']
+    for paragraph in paragraphs:
+        lines.extend(textwrap.wrap(paragraph, LINE_WIDTH))
+        lines.append('')
+    return lines + list(footer)
+
+
+def write_txt(path, judgment):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join('\n'.join(judgment_lines(page)) for page in judgment) + '\n')
+
+
+def write_docx(path, judgment):
+    import docx
+
+    document = docx.Document()
+    for number, (header, paragraphs, footer) in enumerate(judgment):
+        if number:
+            document.add_page_break()
+        for text in list(header) + paragraphs + list(footer):
+            document.add_paragraph(text)
+    document.save(path)
+
+
+def _pdf_string(text):
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def write_pdf(path, judgment):
+    # A plain PDF with one Helvetica text object per page, so no PDF library
+    # is needed to write it
+    objects = []
+    pages_id = 2 + 2 * len(judgment)
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for page in judgment:
+        operators = ["BT /F1 10 Tf 12 TL 50 800 Td"]
+        operators += [f"{_pdf_string(line)} Tj T*" for line in judgment_lines(page)]
+        operators.append("ET")
+        stream = '\n'.join(operators).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(len(objects) + 1)
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 1 0 R >> >> >>" % (pages_id, len(objects))
+        )
+    objects.append(
+        b"<< /Type /Pages /Kids [" + b' '.join(b"%d 0 R" % kid for kid in kids) + b"] /Count %d >>" % len(kids)
+    )
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+WRITERS = {'pdf': write_pdf, 'docx': write_docx, 'txt': write_txt}
+
+
+def build_corpus(directory, sizes, repeat, seed):
+    # Reuses the corpus in directory if it was built with the same settings
+    settings = {"version": CORPUS_VERSION, "sizes": sizes, "repeat": repeat, "seed": seed, "formats": FORMATS}
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['settings'] == json.loads(json.dumps(settings)):
+            return manifest['documents']
+        print(f"Corpus in {directory} was built with other settings, rebuilding it")
+
+    os.makedirs(directory, exist_ok=True)
+    documents = []
+    # Warm-up documents, one per format, pull in the lazy imports untimed
+    plan = [(1, 'warmup', 0)]
+    plan += [(pages, f"{pages}p", variant) for pages in sizes for variant in range(repeat)]
+    for pages, case, variant in plan:
+        for fmt in FORMATS:
+            # Each format gets its own text, or the caches would answer for the others
+            judgment = make_judgment(pages, f"{seed}:{case}:{variant}:{fmt}")
+            chars = sum(len(' '.join(paragraphs)) for _, paragraphs, _ in judgment)
+            name = f"{case}_{variant}.{fmt}"
+            WRITERS[fmt](os.path.join(directory, name), judgment)
+            documents.append({
+                "file": name,
+                "case": f"{case}/{fmt}",
+                "warmup": case == 'warmup',
+                "pages": pages,
+                "chars": chars,
+                "text": '\n\n'.join(' '.join(paragraphs) for _, paragraphs, _ in judgment)
+            })
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"settings": settings, "documents": documents}, f)
+    return documents
+
+
+# Stand-in models
+
+def cached_locally(name):
+    # Whether the model is a directory or has weights in the Hugging Face cache
+    if os.path.isdir(name):
+        return True
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return False
+    return any(
+        isinstance(try_to_load_from_cache(name, filename), str)
+        for filename in ('model.safetensors', 'pytorch_model.bin')
+    )
+
+
+def build_t5_stand_in(path, texts):
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors, trainers
+    from transformers import PreTrainedTokenizerFast, T5Config, T5ForConditionalGeneration
+
+    tokenizer = Tokenizer(models.WordPiece(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.train_from_iterator(texts, trainers.WordPieceTrainer(
+        vocab_size=2000, special_tokens=["<pad>", "</s>", "<unk>"]
+    ))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="$A </s>", special_tokens=[("</s>", tokenizer.token_to_id("</s>"))]
+    )
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>", unk_token="<unk>", model_max_length=512
+    )
+
+    torch.manual_seed(0)
+    config = T5Config(
+        vocab_size=len(tokenizer), d_model=64, d_ff=128, num_layers=2, num_heads=4, d_kv=16,
+        decoder_start_token_id=0, pad_token_id=0, eos_token_id=1
+    )
+    tokenizer.save_pretrained(path)
+    T5ForConditionalGeneration(config).save_pretrained(path)
+
+
+def build_embedder_stand_in(path, texts):
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from tokenizers import BertWordPieceTokenizer
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    os.makedirs(path, exist_ok=True)
+    transformer_path = os.path.join(path, 'transformer')
+    os.makedirs(transformer_path, exist_ok=True)
+    wordpiece = BertWordPieceTokenizer(lowercase=True)
+    wordpiece.train_from_iterator(texts, vocab_size=2000)
+    wordpiece.save_model(transformer_path)
+    tokenizer = BertTokenizerFast(vocab_file=os.path.join(transformer_path, 'vocab.txt'), do_lower_case=True)
+
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(tokenizer), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+        intermediate_size=128, max_position_embeddings=512
+    )
+    BertModel(config).save_pretrained(transformer_path)
+    tokenizer.save_pretrained(transformer_path)
+    transformer = models.Transformer(transformer_path, max_seq_length=256)
+    model = SentenceTransformer(modules=[
+        transformer, models.Pooling(transformer.get_word_embedding_dimension(), 'mean'), models.Normalize()
+    ])
+    model.save(path)
+
+
+STAND_INS = {
+    'flask_model1': ('t5-stand-in', build_t5_stand_in),
+    'flask_model2': ('minilm-stand-in', build_embedder_stand_in),
+}
+
+
+def resolve_model(app_name, documents, models_dir, stand_in):
+    # Runs in a process of its own, so building a stand-in doesn't count
+    # towards the app's peak RSS
+    os.environ.update(CHILD_ENV)
+    name = SUMMARIZER_NAME if app_name == 'flask_model1' else EMBEDDER_NAME
+    if not stand_in and cached_locally(name):
+        return {"name": name, "stand_in": False}
+    directory, build = STAND_INS[app_name]
+    path = os.path.join(models_dir, directory)
+    if not os.path.exists(os.path.join(path, 'config.json')):
+        print(f"  {name} not available offline, building a stand-in in {path}")
+        build(path, [document['text'] for document in documents])
+    return {"name": path, "stand_in": True}
+
+
+# Runs
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def scrape(client):
+    # {(sample name, labels): value} from /metrics, without the buckets
+    samples = {}
+    for line in client.get('/metrics').get_data(as_text=True).splitlines():
+        match = SAMPLE_RE.match(line)
+        if match is None or match.group(1).endswith('_bucket'):
+            continue
+        samples[(match.group(1), match.group(2) or '')] = float(match.group(3))
+    return samples
+
+
+def measure(client, send):
+    # (seconds, stage seconds, tokens, chunks, response) for one request
+    before = scrape(client)
+    start = time.perf_counter()
+    response = send()
+    seconds = time.perf_counter() - start
+    after = scrape(client)
+
+    if response.status_code != 200 or (response.is_json and response.get_json().get('status') == 'error'):
+        raise RuntimeError(f"{response.status_code} {response.get_data(as_text=True)[:500]}")
+
+    def delta(name, labels=''):
+        return after.get((name, labels), 0.0) - before.get((name, labels), 0.0)
+
+    stages = {}
+    for name, labels in after:
+        if name == 'pipeline_stage_seconds_count' and delta(name, labels):
+            stages[STAGE_RE.search(labels).group(1)] = delta('pipeline_stage_seconds_sum', labels)
+    tokens = delta('request_tokens_sum') if delta('request_tokens_count') else None
+    chunks = delta('request_chunks_sum') if delta('request_chunks_count') else None
+    return seconds, stages, tokens, chunks, response
+
+
+def record(case, chars, seconds, stages, tokens, chunks):
+    return {
+        "case": case,
+        "chars": chars,
+        "seconds": seconds,
+        "stages": stages,
+        "tokens": tokens,
+        "chunks": chunks
+    }
+
+
+def upload_data(corpus, document, edit=None):
+    with open(os.path.join(corpus, document['file']), 'rb') as f:
+        content = f.read()
+    if edit is not None:
+        old, new = (word.encode('utf-8') for word in edit)
+        head, found, tail = content.rpartition(old)
+        if not found:
+            raise RuntimeError(f"{document['file']} has no {edit[0]!r} to edit")
+        content = head + new + tail
+    return {'file': (io.BytesIO(content), document['file'])}
+
+
+def run_app(app_name, work_dir, corpus, documents, model, threads):
+    # Runs in a fresh process per app, inside a copy of the app directory
+    os.environ.update(CHILD_ENV)
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.chdir(work_dir)
+    sys.path.insert(0, work_dir)
+
+    import torch
+    import app
+
+    torch.set_num_threads(threads)
+    client = app.app.test_client()
+    start = time.perf_counter()
+    if app_name == 'flask_model1':
+        app.MODEL_NAME = model['name']
+        app.warm_up_model()
+    else:
+        app.EMBEDDING_MODEL_NAME = model['name']
+        app.warm_up_embeddings()
+    load_seconds = time.perf_counter() - start
+
+    records = {}
+    for document in documents:
+        def keep(pipeline, result, whole_document=True):
+            # Questions don't get slower per character of the document, so
+            # only requests that process the whole document carry its size
+            if not document['warmup']:
+                chars = document['chars'] if whole_document else None
+                records.setdefault(pipeline, []).append(record(document['case'], chars, *result[:4]))
+            return result[4]
+
+        data = upload_data(corpus, document)
+        if app_name == 'flask_model1':
+            response = keep('summarize', measure(client, lambda: client.post(
+                '/summarize', data=data, content_type='multipart/form-data'
+            )))
+            first = response.get_json()
+            if first['cached']:
+                raise RuntimeError(f"{document['file']} was answered from the summary cache")
+            if document['file'].endswith('.txt'):
+                data = upload_data(corpus, document, EDIT_WORDS)
+                edited = keep('resummarize', measure(client, lambda: client.post(
+                    '/summarize', data=data, content_type='multipart/form-data'
+                ))).get_json()
+                # Only the chunk holding the changed word may change
+                if edited['cached'] or edited['chunks_reused'] < first['chunk_count'] - 1:
+                    raise RuntimeError(
+                        f"Edited {document['file']} reused {edited['chunks_reused']} of "
+                        f"{first['chunk_count']} chunk summaries"
+                    )
+            continue
+
+        response = keep('upload', measure(client, lambda: client.post(
+            '/upload', data=data, content_type='multipart/form-data'
+        )))
+        document_id = response.get_json()['document_id']
+        for question in QUESTIONS:
+            keep('ask', measure(client, lambda: client.post(
+                '/ask', data={'document_id': document_id, 'question': question}
+            )), whole_document=False)
+        keep('corpus_search', measure(client, lambda: client.post(
+            '/corpus/search', data={'question': CORPUS_QUESTION}
+        )), whole_document=False)
+
+    return {
+        "model": model,
+        "model_load_seconds": load_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "records": records
+    }
+
+
+# Results
+
+def percentile(values, p):
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def mean(values):
+    return sum(values) / len(values)
+
+
+def distribution(values):
+    return {
+        "p50": round(percentile(values, 50), 6),
+        "p95": round(percentile(values, 95), 6),
+        "mean": round(mean(values), 6)
+    }
+
+
+def summarize_pipeline(records):
+    cases = {}
+    for case in sorted({item['case'] for item in records}, key=lambda case: (int(case.split('p')[0]), case)):
+        items = [item for item in records if item['case'] == case]
+        stages = {}
+        for item in items:
+            for stage, seconds in item['stages'].items():
+                stages.setdefault(stage, []).append(seconds)
+        cases[case] = {
+            "requests": len(items),
+            "chars": round(mean([item['chars'] for item in items])) if items[0]['chars'] is not None else None,
+            "seconds": distribution([item['seconds'] for item in items]),
+            "stages": {stage: distribution(values) for stage, values in sorted(stages.items())},
+            "tokens": round(mean([item['tokens'] for item in items])) if items[0]['tokens'] is not None else None,
+            "chunks": round(mean([item['chunks'] for item in items]), 1) if items[0]['chunks'] is not None else None
+        }
+
+    seconds = sum(item['seconds'] for item in records)
+    throughput = {"requests_per_second": round(len(records) / seconds, 3)}
+    if records[0]['chars'] is not None:
+        throughput["chars_per_second"] = round(sum(item['chars'] for item in records) / seconds, 1)
+    return {"throughput": throughput, "cases": cases}
+
+
+def figures(results):
+    # {key: (value, kind)} of everything a regression is checked on
+    found = {}
+    for app_name, result in results['apps'].items():
+        found[f"{app_name}/peak_rss_mb"] = (result['peak_rss_mb'], 'mb')
+        found[f"{app_name}/model_load_seconds"] = (result['model_load_seconds'], 'seconds')
+    for pipeline, result in results['pipelines'].items():
+        for name, value in result['throughput'].items():
+            found[f"{pipeline}/throughput/{name}"] = (value, 'rate')
+        for case, stats in result['cases'].items():
+            for stat in ('p50', 'p95'):
+                found[f"{pipeline}/{case}/{stat}"] = (stats['seconds'][stat], 'seconds')
+                for stage, values in stats['stages'].items():
+                    found[f"{pipeline}/{case}/{stage}/{stat}"] = (values[stat], 'seconds')
+    return found
+
+
+def compare(results, baseline, threshold, min_delta_ms, min_delta_mb):
+    models = {app_name: result['model'] for app_name, result in results['apps'].items()}
+    baseline_models = {app_name: result['model'] for app_name, result in baseline['apps'].items()}
+    if models != baseline_models:
+        print(f"Not compared: the baseline used other models ({baseline_models})")
+        return None
+
+    regressions = []
+    previous = figures(baseline)
+    for key, (value, kind) in figures(results).items():
+        if key not in previous:
+            continue
+        old = previous[key][0]
+        if kind == 'rate':
+            worse = value < old / (1 + threshold)
+        else:
+            minimum = min_delta_mb if kind == 'mb' else min_delta_ms / 1000
+            worse = value - old > max(old * threshold, minimum)
+        if worse:
+            regressions.append({"figure": key, "baseline": old, "value": value})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_results(results):
+    for app_name, result in results['apps'].items():
+        model = result['model']
+        print(f"{app_name}: model {model['name']}{' (stand-in)' if model['stand_in'] else ''}, "
+              f"loaded in {result['model_load_seconds']:.1f} s, peak RSS {result['peak_rss_mb']:.0f} MB")
+    for pipeline, result in results['pipelines'].items():
+        throughput = result['throughput']
+        chars = f", {throughput['chars_per_second']:.0f} chars/s" if 'chars_per_second' in throughput else ''
+        print(f"{pipeline}: {throughput['requests_per_second']:.2f} requests/s{chars}")
+        for case, stats in result['cases'].items():
+            # The three slowest stages, by mean
+            slowest = sorted(stats['stages'].items(), key=lambda item: -item[1]['mean'])[:3]
+            counts = ''.join([
+                f"  {stats['chunks']:g} chunks" if stats['chunks'] is not None else '',
+                f"  {stats['tokens']} tokens" if stats['tokens'] is not None else ''
+            ])
+            print(f"  {case:10} p50 {stats['seconds']['p50'] * 1000:8.1f} ms  p95 {stats['seconds']['p95'] * 1000:8.1f} ms"
+                  f"{counts}  " + ', '.join(f"{stage} {values['mean'] * 1000:.1f}" for stage, values in slowest))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 4], help="pages per document")
+    parser.add_argument('--repeat', type=int, default=3, help="documents per size and format")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--apps', nargs='+', default=['flask_model1', 'flask_model2'])
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--corpus', default=None)
+    parser.add_argument('--models-dir', default=os.path.join(tempfile.gettempdir(), 'bench_pipelines_models'))
+    parser.add_argument('--stand-in', action='store_true', help="use stand-in models even if the real ones are cached")
+    parser.add_argument('--output', default='bench_pipelines.json')
+    parser.add_argument('--compare', default=None)
+    parser.add_argument('--threshold', type=float, default=0.1)
+    parser.add_argument('--min-delta-ms', type=float, default=5.0)
+    parser.add_argument('--min-delta-mb', type=float, default=20.0)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    work_dir = tempfile.mkdtemp(prefix='bench-pipelines-')
+    try:
+        corpus = args.corpus or os.path.join(work_dir, 'corpus')
+        documents = build_corpus(corpus, args.sizes, args.repeat, args.seed)
+        print(f"{sum(not document['warmup'] for document in documents)} documents of {args.sizes} pages "
+              f"in {corpus}, {args.threads} thread(s)")
+
+        results = {
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "commit": git_commit(),
+            "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+            "settings": {"sizes": args.sizes, "repeat": args.repeat, "seed": args.seed, "threads": args.threads},
+            "apps": {},
+            "pipelines": {}
+        }
+        context = multiprocessing.get_context('spawn')
+        for app_name in args.apps:
+            app_dir = os.path.join(work_dir, app_name)
+            shutil.copytree(
+                os.path.join(ROOT, app_name), app_dir,
+                ignore=shutil.ignore_patterns('uploads', 'processed', 'preprocessed', '__pycache__')
+            )
+            print(f"Running {app_name}...")
+            with context.Pool(1) as pool:
+                model = pool.apply(resolve_model, (app_name, documents, args.models_dir, args.stand_in))
+            with context.Pool(1) as pool:
+                result = pool.apply(run_app, (app_name, app_dir, corpus, documents, model, args.threads))
+            results['apps'][app_name] = {key: value for key, value in result.items() if key != 'records'}
+            for pipeline, records in result['records'].items():
+                results['pipelines'][pipeline] = summarize_pipeline(records)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    regressions = None
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms, args.min_delta_mb)
+        results['comparison'] = {"baseline": args.compare, "commit": baseline.get('commit'), "regressions": regressions}
+        if regressions is not None:
+            print(f"{len(regressions)} regression(s) against {args.compare} "
+                  f"(over {args.threshold:.0%} and {args.min_delta_ms:g} ms / {args.min_delta_mb:g} MB)")
+            for regression in regressions:
+                print(f"  {regression['figure']}: {regression['baseline']:g} -> {regression['value']:g}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Micro-benchmark for the shared preprocessing module.
+
+Builds a synthetic judgment with court headers, case numbers and page
+footers on every page, checks that the module gives byte-identical output
+to the preprocess_text both apps shipped before, and times the old and new
+paths. The same text is also re-split into pages at random characters, so
+that noise straddles page boundaries, and clean_pages must still match. Structured mode has no legacy equivalent; it is timed and the
+amount of text it removes is printed. Run from the repository root:
+
+    python benchmarks/bench_preprocessing.py --pages 500 --repeat 5
+"""
+import argparse
+import filecmp
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'flask_model1'))
+
+from preprocessing import clean_pages, clean_structured, clean_text  # noqa: E402
+
+APP_PREFIXES = {
+    'flask_model1': ('§', '©', 'Page', 'http'),
+    'flask_model2': ('Sl', '©', 'Page', 'http'),
+}
+
+SENTENCES = [
+    "The learned counsel for the appellant submitted that the impugned order is bad in law.",
+    "It is well settled that the burden of proof lies on the prosecution to establish the guilt.",
+    "In the present case, the trial court failed to appreciate the evidence on record.",
+    "This Court has held in a catena of decisions that bail is the rule and jail the exception.",
+    "The respondent filed a written statement denying the averments made in the plaint.",
+    "We have carefully considered the rival submissions and perused the material placed before us.",
+    "Section 25F of the Industrial Disputes Act mandates payment of retrenchment compensation.",
+    "Accordingly, the appeal is allowed and the judgment of the High Court is set aside.",
+]
+
+# Page splits that once made streaming differ from cleaning the joined text
+SPLIT_CASES = [
+    ['sbefore.case no:\nx', ':\nſ25F applies here.\non'],
+    ['xx present: judgment reserved on: before: case no: 1\nquiet line one here\n'
+     'quiet line two here\nquiet line three here\n', 'quiet line four here\nquiet line five here\nsix'],
+]
+
+
+def legacy_preprocess(text, skip_prefixes):
+    # preprocess_text as it was in both apps, minus the try/except
+    if not text or not isinstance(text, str):
+        return ""
+
+    text = re.sub(r'Page\s*\d+\s*of\s*\d+', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'\n\d+\n', '\n', text)
+
+    noise_patterns = [
+        r'This\s+document\s+was\s+signed\s+electronically.*',
+        r'Electronic\s+signature.*',
+        r'IN\s+THE\s+(?:SUPREME\s+)?COURT\s+OF\s+.*\n',
+        r'CASE\s+NO[.:].*\n',
+        r'BEFORE[.:].*\n',
+        r'JUDGMENT\s+RESERVED\s+ON[.:].*\n',
+        r'PRESENT[.:].*\n'
+    ]
+
+    for pattern in noise_patterns:
+        text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+
+    lines = text.split('\n')
+    cleaned_lines = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if (re.fullmatch(r'\d+', line) or
+            len(line) < 25 or
+            line.startswith(skip_prefixes)):
+            continue
+
+        cleaned_lines.append(line)
+
+    return '\n\n'.join(cleaned_lines) or ""
+
+
+def make_pages(count, seed):
+    rng = random.Random(seed)
+    pages = []
+    for number in range(1, count + 1):
+        words = ' '.join(rng.choice(SENTENCES) for _ in range(40)).split()
+        lines, current = [], []
+        for word in words:
+            current.append(word)
+            if len(' '.join(current)) > 80:
+                lines.append(' '.join(current))
+                current = []
+        lines.append(' '.join(current))
+        header = [
+            "IN THE HIGH COURT OF DELHI AT NEW DELHI",
+            f"CASE NO.: CRL.A. {rng.randint(100, 999)}/2020",
+        ]
+        footer = [f"Page {number} of {count}", str(number)]
+        if number == count:
+            footer.insert(0, "This document was signed electronically on 01.02.2021")
+        pages.append('\n'.join(header + lines + footer))
+    return pages
+
+
+def random_splits(text, rng, count):
+    cuts = sorted(rng.sample(range(1, len(text)), count))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def split_mismatches(text, prefixes, seed, rounds=20):
+    rng = random.Random(seed)
+    cases = SPLIT_CASES + [random_splits(text, rng, rng.randint(1, 200)) for _ in range(rounds)]
+    mismatches = 0
+    for pages in cases:
+        expected = legacy_preprocess('\n'.join(pages).strip(), prefixes)
+        if clean_pages(iter(pages), prefixes) != expected:
+            mismatches += 1
+    return mismatches, len(cases)
+
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    copies = [os.path.join(ROOT, app, 'preprocessing.py') for app in APP_PREFIXES]
+    if not filecmp.cmp(*copies, shallow=False):
+        print("preprocessing.py differs between the two apps")
+        return 1
+
+    pages = make_pages(args.pages, args.seed)
+    text = '\n'.join(pages).strip()
+    print(f"{args.pages} pages, {len(text)} chars, best of {args.repeat}")
+
+    failed = False
+    for app, prefixes in APP_PREFIXES.items():
+        legacy_seconds, expected = best_time(lambda: legacy_preprocess(text, prefixes), args.repeat)
+        text_seconds, from_text = best_time(lambda: clean_text(text, prefixes), args.repeat)
+        pages_seconds, from_pages = best_time(lambda: clean_pages(iter(pages), prefixes), args.repeat)
+
+        mismatches, cases = split_mismatches(text, prefixes, args.seed)
+        identical = expected == from_text == from_pages
+        failed = failed or not identical or mismatches > 0
+        print(f"{app}: identical={identical}, page splits differing: {mismatches} of {cases}")
+        print(f"  legacy       {legacy_seconds * 1000:8.1f} ms")
+        print(f"  clean_text   {text_seconds * 1000:8.1f} ms  {legacy_seconds / text_seconds:5.1f}x")
+        print(f"  clean_pages  {pages_seconds * 1000:8.1f} ms  {legacy_seconds / pages_seconds:5.1f}x")
+
+        stats = {}
+        structured_seconds, _ = best_time(lambda: clean_structured(pages, prefixes, stats), args.repeat)
+        print(f"  structured   {structured_seconds * 1000:8.1f} ms  "
+              f"removed {stats['removed_chars']} chars, {stats['removed_lines']} lines, "
+              f"{stats['repeated_lines']} repeated header/footer lines")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""Compares the fp32, int8 and bf16 inference modes of the flask_model1 summarizer.
+
+Each mode runs in its own process: the model is loaded and converted as
+load_model does, then a fixed set of judgment excerpts is summarized with
+the app's beam search settings. Load/convert time, weight size, generation
+time and peak RSS (after loading, after converting and overall) are printed,
+and every summary is scored with ROUGE-1/2/L F1 against the fp32 summary of
+the same excerpt. Exits non-zero when the mean ROUGE-L of a mode falls below
+--min-rouge-l. bf16 is skipped on CPUs without native support. Run from the
+repository root:
+
+    python benchmarks/bench_t5_inference.py --modes fp32 int8 bf16
+
+--docs DIR summarizes the .txt files in DIR instead of the built-in excerpts.
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'flask_model1'))
+
+MODEL_NAME = "Ruthwik/LExiMinD_legal_t5_summarizer"
+MAX_INPUT_TOKENS = 512
+# As GENERATION_KWARGS in flask_model1/app.py
+GENERATION_KWARGS = {
+    'length_penalty': 1.5,
+    'num_beams': 4,
+    'no_repeat_ngram_size': 3,
+    'early_stopping': True
+}
+
+JUDGMENTS = [
+    "The appellant was convicted under Section 302 of the Indian Penal Code and sentenced to imprisonment "
+    "for life. The conviction rests on circumstantial evidence, namely the last seen theory, the recovery of "
+    "the weapon at the instance of the accused and the motive arising out of a land dispute. The High Court "
+    "affirmed the conviction. Before us, learned counsel for the appellant contended that the chain of "
+    "circumstances is incomplete, that the recovery was made from an open place accessible to all and that "
+    "the witnesses who last saw the deceased with the appellant are interested witnesses. Having examined the "
+    "record, we find that the time gap between the deceased being last seen with the appellant and the "
+    "recovery of the body is nearly four days. In such a case the last seen theory cannot by itself form the "
+    "basis of conviction. The recovery is also of doubtful value. The appeal is allowed and the appellant is "
+    "acquitted.",
+    "The respondent workman was employed as a daily wager and was disengaged without notice or retrenchment "
+    "compensation. The Labour Court held that he had completed 240 days of continuous service in the "
+    "preceding twelve months and that the termination was in violation of Section 25F of the Industrial "
+    "Disputes Act. It directed reinstatement with full back wages. The employer contends that the workman "
+    "was engaged in a scheme that came to an end and that reinstatement could not have been ordered. We are "
+    "of the view that, although the termination was illegal, reinstatement with full back wages is not "
+    "automatic. Considering the nature of employment and the length of service, compensation of two lakh "
+    "rupees in lieu of reinstatement would meet the ends of justice. The award is modified accordingly.",
+    "The assessee, a company engaged in the manufacture of pharmaceutical products, claimed a deduction "
+    "under Section 80-IB of the Income Tax Act in respect of profits of a new industrial undertaking. The "
+    "Assessing Officer disallowed the claim on the ground that the undertaking was formed by the "
+    "reconstruction of an existing business. The Commissioner of Income Tax (Appeals) and the Tribunal "
+    "allowed the claim, finding that new plant and machinery had been installed and that the old machinery "
+    "transferred was less than twenty percent of the total value. The High Court dismissed the appeal of "
+    "the revenue. We find no infirmity in the concurrent findings of fact. The civil appeal is dismissed.",
+    "The petitioner challenges the order of detention passed under the preventive detention law on the "
+    "ground that the representation submitted by him was not considered with reasonable expedition. The "
+    "representation was received on the fifth of the month and was disposed of after thirty two days. No "
+    "explanation has been offered for the delay. It is settled law that the unexplained delay in deciding a "
+    "representation violates the right guaranteed under Article 22(5) of the Constitution and vitiates the "
+    "continued detention. The writ petition is allowed, the detention order is quashed and the petitioner "
+    "is directed to be released forthwith unless required in any other case.",
+    "The tenant contended that the eviction petition filed by the landlord on the ground of bona fide "
+    "requirement was not maintainable as the landlord owned other premises in the same city. The Rent "
+    "Controller and the Appellate Authority found that the other premises were not suitable for the "
+    "business the landlord's son proposed to start. The revision was dismissed by the High Court. The "
+    "landlord is the best judge of his requirement and it is not for the tenant to dictate how the landlord "
+    "should use his property. The findings are based on evidence and call for no interference. The tenant "
+    "is granted six months to vacate the premises on filing the usual undertaking.",
+]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, model_name, texts, threads, max_length, min_length):
+    # Runs in a fresh process per mode
+    import torch
+    from transformers import AutoTokenizer, T5ForConditionalGeneration
+    from inference_mode import apply_inference_mode, model_bytes
+
+    torch.set_num_threads(threads)
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = T5ForConditionalGeneration.from_pretrained(model_name)
+    load_seconds = time.perf_counter() - start
+    load_peak_rss_mb = peak_rss_mb()
+
+    start = time.perf_counter()
+    model = apply_inference_mode(model, mode)
+    convert_seconds = time.perf_counter() - start
+    convert_peak_rss_mb = peak_rss_mb()
+
+    prefix = getattr(model.config, 'prefix', None) or ""
+    summaries = []
+    generate_seconds = []
+    for text in texts:
+        encoded = tokenizer(prefix + text, truncation=True, max_length=MAX_INPUT_TOKENS, return_tensors='pt')
+        start = time.perf_counter()
+        with torch.inference_mode():
+            output_ids = model.generate(
+                input_ids=encoded['input_ids'],
+                attention_mask=encoded['attention_mask'],
+                max_length=max_length,
+                min_length=min_length,
+                **GENERATION_KWARGS
+            )
+        generate_seconds.append(time.perf_counter() - start)
+        summaries.append(tokenizer.decode(output_ids[0], skip_special_tokens=True))
+
+    return {
+        "load_seconds": load_seconds,
+        "convert_seconds": convert_seconds,
+        "weight_mb": model_bytes(model) / 1024 / 1024,
+        "load_peak_rss_mb": load_peak_rss_mb,
+        "convert_peak_rss_mb": convert_peak_rss_mb,
+        "generate_seconds": generate_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "summaries": summaries
+    }
+
+
+def tokens(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def ngrams(words, n):
+    return Counter(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+
+
+def f1(overlap, candidate_total, reference_total):
+    if not overlap:
+        return 0.0
+    precision = overlap / candidate_total
+    recall = overlap / reference_total
+    return 2 * precision * recall / (precision + recall)
+
+
+def lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def rouge(candidate, reference):
+    # ROUGE-1, ROUGE-2 and ROUGE-L F1 over lowercased word tokens
+    candidate, reference = tokens(candidate), tokens(reference)
+    scores = {}
+    for n in (1, 2):
+        c, r = ngrams(candidate, n), ngrams(reference, n)
+        scores[f"rouge{n}"] = f1(sum((c & r).values()), sum(c.values()), sum(r.values()))
+    scores["rougeL"] = f1(lcs_length(candidate, reference), len(candidate), len(reference))
+    return scores
+
+
+def load_texts(directory):
+    texts = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.txt'):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--modes', nargs='+', default=['fp32', 'int8', 'bf16'])
+    parser.add_argument('--docs', default=None)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--max-length', type=int, default=150)
+    parser.add_argument('--min-length', type=int, default=50)
+    parser.add_argument('--min-rouge-l', type=float, default=0.7)
+    args = parser.parse_args()
+
+    from inference_mode import resolve_inference_mode
+
+    texts = load_texts(args.docs) if args.docs else JUDGMENTS
+    modes = ['fp32'] + [mode for mode in args.modes if mode != 'fp32']
+    print(f"{len(texts)} judgments, {args.threads} thread(s), model {args.model}")
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for mode in modes:
+        if resolve_inference_mode(mode) != mode:
+            print(f"  {mode:5} skipped, not available on this machine")
+            continue
+        with context.Pool(1) as pool:
+            results[mode] = pool.apply(run_mode, (
+                mode, args.model, texts, args.threads, args.max_length, args.min_length
+            ))
+
+    failed = False
+    baseline = results['fp32']
+    for mode, result in results.items():
+        total = sum(result['generate_seconds'])
+        speedup = sum(baseline['generate_seconds']) / total
+        line = (f"  {mode:5} load {result['load_seconds']:5.1f} s + convert {result['convert_seconds']:4.1f} s  "
+                f"weights {result['weight_mb']:6.1f} MB  generate {total:6.1f} s ({speedup:4.2f}x)  "
+                f"peak RSS {result['peak_rss_mb']:7.1f} MB (load {result['load_peak_rss_mb']:.1f}, "
+                f"convert {result['convert_peak_rss_mb']:.1f})")
+        if mode != 'fp32':
+            scores = [rouge(summary, reference)
+                      for summary, reference in zip(result['summaries'], baseline['summaries'])]
+            mean = {key: sum(score[key] for score in scores) / len(scores) for key in scores[0]}
+            line += (f"  ROUGE-1 {mean['rouge1']:.3f} ROUGE-2 {mean['rouge2']:.3f} "
+                     f"ROUGE-L {mean['rougeL']:.3f} (min {min(score['rougeL'] for score in scores):.3f})")
+            failed = failed or mean['rougeL'] < args.min_rouge_l
+        print(line)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
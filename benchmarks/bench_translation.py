@@ -0,0 +1,173 @@
+"""Compares serial and pooled concurrent translation of a summary.
+
+Runs against the local stand-in server (translation_standin.py), which
+answers with a fixed latency. The summary is made of legal boilerplate
+sentences, some repeated, and translated:
+
+  serial   500-character slices, one fresh requests.get each, as /translate
+           used to
+  pooled   sentence segments through TranslationClient, numbered and
+           packed into calls of up to 500 chars, --concurrency calls in
+           flight per provider
+  memory   the same with a translation memory, translated twice by two
+           clients sharing the database, as two workers would
+
+Wall time, provider calls, TCP connections opened and the peak number of
+calls in flight are printed for each, and the reassembled translation is
+checked against the expected output. The memory run must store each
+distinct sentence once, and its second pass must make no calls at all. A
+last run makes --fail-rate of the MyMemory calls answer 429, half of them
+inside an HTTP 200 as MyMemory does, and merges two lines of the reply in
+--mangle-rate of the packed calls. It checks that retries stay within the
+retry budget, that every segment still translates through the
+LibreTranslate fallback or one by one, and that the translation memory
+holds neither a rejection nor a misplaced sentence. Exits non-zero on a wrong or failed translation. Run from the
+repository root:
+
+    python benchmarks/bench_translation.py --chars 5000 --latency 0.2
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'flask_model1'))
+
+from translation_standin import StandinServer, translated  # noqa: E402
+
+CHUNK_CHARS = 500
+SENTENCES = [
+    "The appeal is allowed and the judgment of the High Court is set aside.",
+    "There shall be no order as to costs.",
+    "Pending applications, if any, stand disposed of.",
+    "The appellant was convicted under Sec. 302 IPC by the trial court.",
+    "Learned counsel for the respondent supported the impugned judgment.",
+    "We have heard learned counsel for the parties and perused the record.",
+    "The conviction rests entirely on circumstantial evidence.",
+    "The chain of circumstances is not complete.",
+]
+
+
+def serial(server, text, lang):
+    results = []
+    for i in range(0, len(text), CHUNK_CHARS):
+        response = requests.get(
+            server.url('mymemory'), params={'q': text[i:i + CHUNK_CHARS], 'langpair': f'en|{lang}'}, timeout=15
+        )
+        results.append(response.json()['responseData']['translatedText'])
+    return ' '.join(results), None
+
+
+def pooled(server, text, lang, concurrency, retry_budget, memory=None):
+    from translation import TranslationClient, split_segments, join_segments
+
+    client = TranslationClient(
+        [('mymemory', server.url('mymemory')), ('libretranslate', server.url('libretranslate'))],
+        memory=memory,
+        concurrency=concurrency,
+        retry_budget=retry_budget,
+        backoff=0.01
+    )
+    segments, separators = split_segments(text, CHUNK_CHARS)
+    return join_segments(client.translate_many(segments, lang), separators), client.stats()
+
+
+def expected_translation(text, lang):
+    from translation import split_segments, join_segments
+
+    segments, separators = split_segments(text, CHUNK_CHARS)
+    return join_segments([translated(segment, lang) for segment in segments], separators)
+
+
+def run(name, server, translate, expected):
+    server.reset()
+    start = time.perf_counter()
+    result, stats = translate()
+    seconds = time.perf_counter() - start
+    correct = expected is None or result == expected
+    print(f"  {name:7} {seconds:6.2f} s  calls {sum(server.calls.values()):3}  connections {server.connections:3}  "
+          f"peak in flight {server.peak_in_flight['mymemory']}{'' if correct else '  WRONG OUTPUT'}")
+    return seconds, correct, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chars', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--retry-budget', type=int, default=4)
+    parser.add_argument('--fail-rate', type=float, default=0.5)
+    parser.add_argument('--mangle-rate', type=float, default=0.3)
+    parser.add_argument('--lang', default='hi')
+    args = parser.parse_args()
+
+    from translation import split_segments
+    from translation_memory import TranslationMemory
+
+    # Boilerplate sentences repeat; numbered ones stand for the rest
+    rng = random.Random(1)
+    sentences = []
+    while sum(len(sentence) + 1 for sentence in sentences) < args.chars:
+        sentence = rng.choice(SENTENCES)
+        sentences.append(sentence if rng.random() < 0.5 else f"In paragraph {len(sentences)}, {sentence.lower()}")
+    text = ' '.join(sentences)
+    distinct = len(set(split_segments(text, CHUNK_CHARS)[0]))
+    expected = expected_translation(text, args.lang)
+    server = StandinServer(('127.0.0.1', 0), latency=args.latency).start()
+    print(f"{len(text)} chars, {len(sentences)} sentences ({distinct} distinct), "
+          f"{args.latency * 1000:.0f} ms per call")
+
+    failed = False
+    serial_seconds, _, _ = run('serial', server, lambda: serial(server, text, args.lang), None)
+    pooled_seconds, correct, _ = run('pooled', server, lambda: pooled(
+        server, text, args.lang, args.concurrency, args.retry_budget
+    ), expected)
+    failed = failed or not correct
+    print(f"  pooled vs serial {serial_seconds / pooled_seconds:.1f}x")
+
+    directory = tempfile.mkdtemp(prefix='translation-memory-')
+    try:
+        for worker in (1, 2):
+            memory = TranslationMemory(os.path.join(directory, 'translations.db'))
+            _, correct, stats = run(f'memory{worker}', server, lambda: pooled(
+                server, text, args.lang, args.concurrency, args.retry_budget, memory
+            ), expected)
+            calls = sum(stats['calls'].values())
+            failed = failed or not correct or stats['memory']['entries'] != distinct or (worker == 2 and calls)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{args.fail_rate:.0%} of MyMemory calls rejected, {args.mangle_rate:.0%} of packed replies "
+          f"with lines merged, retry budget {args.retry_budget}")
+    server.fail_rate = args.fail_rate
+    server.mangle_rate = args.mangle_rate
+    directory = tempfile.mkdtemp(prefix='translation-memory-')
+    try:
+        memory = TranslationMemory(os.path.join(directory, 'translations.db'))
+        _, correct, stats = run('pooled', server, lambda: pooled(
+            server, text, args.lang, args.concurrency, args.retry_budget, memory
+        ), expected)
+        segments = list(dict.fromkeys(split_segments(text, CHUNK_CHARS)[0]))
+        stored = memory.get_many(segments, args.lang)
+        wrong = sum(value != translated(segment, args.lang) for segment, value in zip(segments, stored))
+    except Exception as e:
+        print(f"  failed: {e}")
+        return 1
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print(f"  retries {stats['retries']}, MyMemory failures {stats['failures']['mymemory']}, "
+          f"LibreTranslate calls {stats['calls']['libretranslate']}, "
+          f"batches retranslated one by one {stats['batch_fallbacks']}, wrong in memory {wrong}")
+    failed = failed or not correct or wrong or stats['retries'] > args.retry_budget
+    server.shutdown()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Cold-start profile of both Flask apps, failing past a time budget.
+
+For each app a fresh interpreter imports app.py and answers one
+/health/live request through the test client, with MODEL_LOADING=lazy so
+nothing loads in the background. The best wall time of --repeat runs is
+compared with --budget, and the modules of the heaviest imports, taken
+from `python -X importtime`, are listed. The run fails when an app is over
+budget or when one of the HEAVY_MODULES, which must only be imported on
+the code paths that use them, was imported at startup. Run from the
+repository root:
+
+    python benchmarks/profile_startup.py --budget 1.0 --top 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = ('flask_model1', 'flask_model2')
+
+HEAVY_MODULES = (
+    'torch',
+    'transformers',
+    'sentence_transformers',
+    'onnxruntime',
+    'faiss',
+    'langchain_community',
+    'langchain_text_splitters',
+    'PyPDF2',
+    'docx',
+)
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+status = app.app.test_client().get('/health/live').status_code
+answered = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "health_seconds": answered - imported,
+    "total_seconds": answered - start,
+    "status": status,
+    "heavy": [name for name in %r if name in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_child(app_dir, importtime=False):
+    env = dict(os.environ, MODEL_LOADING='lazy')
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    result = subprocess.run(command, cwd=app_dir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{os.path.basename(app_dir)} failed to start:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def top_level_imports(importtime_output, top):
+    # Lines look like "import time:  self [us] | cumulative | imported package",
+    # nested imports indented by two spaces per level; the modules app.py
+    # imports itself are one level down
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:]
+        if name.startswith('  ') and not name.startswith('   '):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=1.0, help="seconds to import the app and answer /health/live")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    for app in APPS:
+        app_dir = os.path.join(ROOT, app)
+        runs = [run_child(app_dir)[0] for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run['total_seconds'])
+        _, importtime_output = run_child(app_dir, importtime=True)
+
+        over_budget = best['total_seconds'] > args.budget
+        heavy = sorted(set(name for run in runs for name in run['heavy']))
+        failed = failed or over_budget or bool(heavy) or best['status'] != 200
+        print(f"{app}: import {best['import_seconds'] * 1000:.0f} ms, first /health/live "
+              f"{best['health_seconds'] * 1000:.0f} ms, total {best['total_seconds'] * 1000:.0f} ms "
+              f"(budget {args.budget * 1000:.0f} ms){'  OVER BUDGET' if over_budget else ''}")
+        if heavy:
+            print(f"  imported at startup: {', '.join(heavy)}")
+        for seconds, name in top_level_imports(importtime_output, args.top):
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Local stand-in for the MyMemory and LibreTranslate APIs.
+
+Serves GET /mymemory/get?q=...&langpair=en|xx and POST /libretranslate/translate
+with the response shapes flask_model1 expects, translating each line of a
+text to "[xx] line", with a leading "[n]" segment number kept in front. A
+--mangle-rate of the calls with several lines come back with the last two
+merged, as a provider that joins lines would. Each call takes --latency
+seconds, and --fail-rate of the
+MyMemory calls are rejected, so retries and the fallback can be exercised:
+every other rejection is an HTTP 429, the rest an HTTP 200 that carries
+responseStatus 429 and a warning in place of the translation, as MyMemory
+answers when it throttles.
+The server counts calls, TCP connections and the peak number of calls in
+flight per provider. Point flask_model1 at it with:
+
+    python benchmarks/translation_standin.py --port 8765
+    MYMEMORY_URL=http://127.0.0.1:8765/mymemory/get \\
+    LIBRE_URL=http://127.0.0.1:8765/libretranslate/translate python app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+NUMBER_RE = re.compile(r'(\[\d+\] )?(.*)')
+
+
+def translated(text, lang):
+    # Line by line, as both services keep line breaks and bracketed numbers
+    return '\n'.join(
+        '{}[{}] {}'.format(match.group(1) or '', lang, match.group(2))
+        for match in (NUMBER_RE.fullmatch(line) for line in text.split('\n'))
+    )
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.1, fail_rate=0.0, mangle_rate=0.0, seed=0):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.mangle_rate = mangle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.calls = {'mymemory': 0, 'libretranslate': 0}
+            self.rejected = {'mymemory': 0, 'libretranslate': 0}
+            self.in_flight = {'mymemory': 0, 'libretranslate': 0}
+            self.peak_in_flight = {'mymemory': 0, 'libretranslate': 0}
+
+    def url(self, provider):
+        host, port = self.server_address[:2]
+        path = 'mymemory/get' if provider == 'mymemory' else 'libretranslate/translate'
+        return f"http://{host}:{port}/{path}"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so a pooled client reuses its connections
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _serve(self, provider, text, lang):
+        server = self.server
+        with server.lock:
+            server.calls[provider] += 1
+            server.in_flight[provider] += 1
+            server.peak_in_flight[provider] = max(server.peak_in_flight[provider], server.in_flight[provider])
+            rejected = provider == 'mymemory' and server.random.random() < server.fail_rate
+            mangled = '\n' in text and server.random.random() < server.mangle_rate
+        try:
+            time.sleep(server.latency)
+        finally:
+            with server.lock:
+                server.in_flight[provider] -= 1
+
+        if rejected:
+            with server.lock:
+                server.rejected[provider] += 1
+                in_body = server.rejected[provider] % 2 == 0
+            if in_body:
+                self._respond(200, {
+                    "responseData": {"translatedText": "MYMEMORY WARNING: YOU USED ALL AVAILABLE FREE TRANSLATIONS"},
+                    "responseStatus": 429,
+                    "quotaFinished": False
+                })
+            else:
+                self._respond(429, {"error": "Too many requests"})
+        else:
+            result = translated(text, lang)
+            if mangled:
+                head, _, tail = result.rpartition('\n')
+                result = f"{head} {NUMBER_RE.fullmatch(tail).group(2)}"
+            if provider == 'mymemory':
+                self._respond(200, {"responseData": {"translatedText": result}, "responseStatus": 200})
+            else:
+                self._respond(200, {"translatedText": result})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/mymemory/get':
+            return self._respond(404, {"error": "Not found"})
+        params = parse_qs(url.query)
+        self._serve('mymemory', params['q'][0], params['langpair'][0].split('|')[1])
+
+    def do_POST(self):
+        if self.path != '/libretranslate/translate':
+            return self._respond(404, {"error": "Not found"})
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self._serve('libretranslate', body['q'], body['target'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--mangle-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StandinServer(
+        (args.host, args.port), latency=args.latency, fail_rate=args.fail_rate, mangle_rate=args.mangle_rate
+    )
+    print(f"MyMemory at {server.url('mymemory')}, LibreTranslate at {server.url('libretranslate')}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 import os
+import json
 import logging
 from werkzeug.utils import secure_filename
-import PyPDF2
-import docx
+from extraction import iter_pdf_pages, iter_document_pages
+from preprocessing import clean_text, clean_pages, clean_structured
 import re
-from concurrent.futures import ThreadPoolExecutor
 import time
-from transformers import pipeline, AutoTokenizer, T5ForConditionalGeneration
-import requests
-from datetime import datetime, timedelta
+import uuid
+import gc
+import threading
 from werkzeug.exceptions import HTTPException
-from functools import lru_cache, wraps
+from functools import wraps
+from summary_cache import SummaryCache, make_cache_key
+from jobs import JobQueue, QueueFullError
+from inference_mode import resolve_inference_mode, apply_inference_mode, model_bytes
+from translation import TranslationClient, split_segments, join_segments
+from translation_memory import TranslationMemory
+from rate_limiter import RateLimiter
+from metrics import MetricsRegistry, CONTENT_TYPE, COUNT_BUCKETS, cache_lookups, process_rss_bytes
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -30,12 +37,45 @@ logger = logging.getLogger(__name__)
 
 # Model configuration for summarization
 MODEL_NAME = "Ruthwik/LExiMinD_legal_t5_summarizer"
-CHUNK_SIZE = 512
 DEFAULT_MAX_LENGTH = 300
 DEFAULT_MIN_LENGTH = 100
+MAX_INPUT_TOKENS = 512
+# Summary length bounds grow with the document's word count. Set to 0 to
+# generate every chunk with the default bounds instead: a chunk's summary
+# then depends only on its own text and survives any edit elsewhere in the
+# document, where with scaling an edit that changes the word count's 100-word
+# bucket changes the bounds and so every chunk's summary.
+SUMMARY_LENGTH_SCALING = os.getenv('SUMMARY_LENGTH_SCALING', '1') != '0'
+# 'fp32', 'int8' (dynamic quantization of the linear layers) or 'bf16'
+# (only where the CPU supports it natively, fp32 otherwise)
+INFERENCE_MODE = resolve_inference_mode(os.getenv('INFERENCE_MODE', 'fp32'))
+
+# Chunking is measured in model tokens (prefix and EOS included)
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', MAX_INPUT_TOKENS))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 0))
+# Close a chunk at a paragraph break once it is at least this full
+PARAGRAPH_BREAK_FILL = 0.75
+PARAGRAPH_SPLIT_RE = re.compile(r'\n\s*\n')
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?;:])\s+')
+
+# Batched generation: chunks are sorted by token length and grouped into
+# micro-batches bounded by both row count and padded input tokens
+SUMMARY_BATCH_SIZE = int(os.getenv('SUMMARY_BATCH_SIZE', 4))
+SUMMARY_BATCH_TOKENS = int(os.getenv('SUMMARY_BATCH_TOKENS', 2048))
+GENERATION_KWARGS = {
+    'length_penalty': 1.5,
+    'num_beams': 4,
+    'no_repeat_ngram_size': 3,
+    'early_stopping': True
+}
 
 # Configuration for file handling
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt'}
+# 'structured' filters line by line and drops repeated page headers/footers,
+# 'legacy' reproduces the old single-line output
+PREPROCESS_MODE = os.getenv('PREPROCESS_MODE', 'structured')
+# Cleaned text starting with these is dropped as boilerplate
+SKIP_PREFIXES = ('§', '©', 'Page', 'http')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 PREPROCESSED_FOLDER = os.path.join(BASE_DIR, 'preprocessed')
@@ -51,66 +91,308 @@ app.config['PREPROCESSED_FOLDER'] = PREPROCESSED_FOLDER
 app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB file size limit
 
+# Served at /metrics in the Prometheus text format; stage timings are
+# recorded as requests run
+metrics = MetricsRegistry()
+metrics.add_process_metrics()
+stage_seconds = metrics.histogram(
+    'pipeline_stage_seconds',
+    'Time spent in each pipeline stage, per call (per chunk for generate).',
+    ['stage']
+)
+request_seconds = metrics.histogram(
+    'request_seconds',
+    'Request handling time by endpoint, up to the first byte for streamed responses.',
+    ['endpoint']
+)
+request_chunks = metrics.histogram(
+    'request_chunks', 'Chunks per summarized document.', buckets=COUNT_BUCKETS
+)
+request_tokens = metrics.histogram(
+    'request_tokens', 'Model input tokens per summarized document.', buckets=COUNT_BUCKETS
+)
+
+# Finished summaries keyed by cleaned text and generation settings
+SUMMARY_CACHE_DIR = os.path.join(PROCESSED_FOLDER, 'summaries')
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv('SUMMARY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+SUMMARY_CACHE_MEMORY_ENTRIES = int(os.getenv('SUMMARY_CACHE_MEMORY_ENTRIES', 128))
+summary_cache = SummaryCache(
+    SUMMARY_CACHE_DIR,
+    max_bytes=SUMMARY_CACHE_MAX_BYTES,
+    memory_entries=SUMMARY_CACHE_MEMORY_ENTRIES
+)
+
+# Per-chunk summaries, so an edited re-upload only regenerates changed chunks
+CHUNK_CACHE_DIR = os.path.join(PROCESSED_FOLDER, 'chunks')
+CHUNK_CACHE_MAX_BYTES = int(os.getenv('CHUNK_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+CHUNK_CACHE_MEMORY_ENTRIES = int(os.getenv('CHUNK_CACHE_MEMORY_ENTRIES', 1024))
+chunk_cache = SummaryCache(
+    CHUNK_CACHE_DIR,
+    max_bytes=CHUNK_CACHE_MAX_BYTES,
+    memory_entries=CHUNK_CACHE_MEMORY_ENTRIES
+)
+
 # Translation configuration
 app.config.from_mapping(
-    MYMEMORY_URL='https://api.mymemory.translated.net/get',
-    LIBRE_URL='https://libretranslate.de/translate',
-    RATE_LIMIT=10,  # requests per minute
-    CACHE_SIZE=1000,
-    REQUEST_TIMEOUT=15
+    MYMEMORY_URL=os.getenv('MYMEMORY_URL', 'https://api.mymemory.translated.net/get'),
+    LIBRE_URL=os.getenv('LIBRE_URL', 'https://libretranslate.de/translate'),
+    RATE_LIMIT=int(os.getenv('RATE_LIMIT', 10)),  # /translate requests per minute
+    REQUEST_TIMEOUT=15,
+    # Calls in flight per provider, and retries shared by all chunks of a request
+    TRANSLATION_CONCURRENCY=int(os.getenv('TRANSLATION_CONCURRENCY', 4)),
+    TRANSLATION_RETRY_BUDGET=int(os.getenv('TRANSLATION_RETRY_BUDGET', 4)),
+    TRANSLATION_BACKOFF=float(os.getenv('TRANSLATION_BACKOFF', 0.5)),
+    # Translated sentences, shared by the workers and kept across restarts
+    TRANSLATION_MEMORY_MAX_BYTES=int(os.getenv('TRANSLATION_MEMORY_MAX_BYTES', 32 * 1024 * 1024))
+)
+translation_memory = TranslationMemory(
+    os.path.join(PROCESSED_FOLDER, 'translations.db'),
+    max_bytes=app.config['TRANSLATION_MEMORY_MAX_BYTES']
+)
+# MyMemory first, LibreTranslate as the fallback
+translation_client = TranslationClient(
+    [('mymemory', app.config['MYMEMORY_URL']), ('libretranslate', app.config['LIBRE_URL'])],
+    memory=translation_memory,
+    concurrency=app.config['TRANSLATION_CONCURRENCY'],
+    retry_budget=app.config['TRANSLATION_RETRY_BUDGET'],
+    backoff=app.config['TRANSLATION_BACKOFF'],
+    timeout=app.config['REQUEST_TIMEOUT'],
+    observe_call=lambda name, seconds: stage_seconds.observe(seconds, stage='translation')
+)
+
+# Background summarization jobs (in-process, so gunicorn must run a single worker)
+SUMMARY_JOB_WORKERS = int(os.getenv('SUMMARY_JOB_WORKERS', 1))
+SUMMARY_JOB_MAX_PENDING = int(os.getenv('SUMMARY_JOB_MAX_PENDING', 8))
+SUMMARY_JOB_RESULT_TTL = int(os.getenv('SUMMARY_JOB_RESULT_TTL', 3600))
+job_queue = JobQueue(
+    workers=SUMMARY_JOB_WORKERS,
+    max_pending=SUMMARY_JOB_MAX_PENDING,
+    result_ttl=SUMMARY_JOB_RESULT_TTL
 )
 
-# Rate limiting storage
-request_timestamps = {}
+# Requests per minute and client, counted across workers in SQLite; 0 turns
+# a limit off. /summarize, /summarize/stream and /jobs share one limit.
+RATE_LIMIT_SUMMARIZE = int(os.getenv('RATE_LIMIT_SUMMARIZE', 6))
+# Header with the client address when behind a proxy, e.g. Fly-Client-IP
+RATE_LIMIT_CLIENT_HEADER = os.getenv('RATE_LIMIT_CLIENT_HEADER', '')
+rate_limiter = RateLimiter(os.path.join(PROCESSED_FOLDER, 'rate_limits.db'), window=60)
+
+# Read from the caches, queues and models above when /metrics is scraped
+metrics.collected(
+    'cache_lookups_total', 'Cache lookups by cache and result.', 'counter',
+    lambda: cache_lookups({'summary': summary_cache, 'chunk': chunk_cache, 'translation': translation_memory}),
+    ['cache', 'result']
+)
+metrics.collected(
+    'queue_depth', 'Summarization jobs submitted and not yet finished.', 'gauge',
+    lambda: {('summary_jobs',): job_queue.stats()['pending']},
+    ['queue']
+)
+metrics.collected(
+    'translation_calls_total', 'Translation provider calls, by provider.', 'counter',
+    lambda: {(name,): calls for name, calls in translation_client.stats()['calls'].items()},
+    ['provider']
+)
+metrics.collected(
+    'translation_failures_total', 'Failed translation provider calls, by provider.', 'counter',
+    lambda: {(name,): failures for name, failures in translation_client.stats()['failures'].items()},
+    ['provider']
+)
+metrics.collected(
+    'model_loaded', 'Whether the model is loaded in this process.', 'gauge',
+    lambda: {(MODEL_NAME,): int(summarizer is not None)},
+    ['model']
+)
+
+# When the model is loaded and warmed (see gunicorn.conf.py):
+#   'background' - in a thread of each worker, which serves /health meanwhile
+#   'preload'    - in the gunicorn master, so workers fork with it loaded
+#   'lazy'       - on the first request that needs it
+# /health/ready answers 503 until it is warm, except in lazy mode
+MODEL_LOADING = os.getenv('MODEL_LOADING', 'background')
+WARMUP_TEXT = "The appeal is allowed and the judgment of the High Court is set aside."
 
 # Lazy-load the summarization model
 summarizer = None
 tokenizer = None
 model = None
+model_load_stats = None
+model_warm = False
+model_lock = threading.RLock()
 
 def load_model():
-    global summarizer, tokenizer, model
-    if summarizer is None:
-        logger.info("⏳ Loading summarization model...")
-        device = -1  # Always use CPU
-        logger.info("Using device: CPU")
+    global summarizer, tokenizer, model, model_load_stats
+    # Requests arriving during a background load and warm-up wait here
+    with model_lock:
+        if summarizer is None:
+            from transformers import pipeline, AutoTokenizer, T5ForConditionalGeneration
+
+            logger.info(f"⏳ Loading summarization model ({INFERENCE_MODE})...")
+            device = -1  # Always use CPU
+            logger.info("Using device: CPU")
+            try:
+                start_time = time.time()
+                tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+                model = T5ForConditionalGeneration.from_pretrained(MODEL_NAME)
+                load_seconds = time.time() - start_time
+                fp32_bytes = model_bytes(model)
+
+                start_time = time.time()
+                rss_before = process_rss_bytes()
+                model = apply_inference_mode(model, INFERENCE_MODE)
+                rss_after = process_rss_bytes()
+                model_load_stats = {
+                    "inference_mode": INFERENCE_MODE,
+                    "load_seconds": round(load_seconds, 2),
+                    "convert_seconds": round(time.time() - start_time, 2),
+                    "fp32_weight_bytes": fp32_bytes,
+                    "weight_bytes": model_bytes(model),
+                    "rss_before_convert_bytes": rss_before,
+                    "rss_after_convert_bytes": rss_after
+                }
+                logger.info(
+                    f"Model loaded in {load_seconds:.2f}s, converted to {INFERENCE_MODE} in "
+                    f"{model_load_stats['convert_seconds']:.2f}s, weights "
+                    f"{fp32_bytes / 1024 / 1024:.0f} MB -> {model_load_stats['weight_bytes'] / 1024 / 1024:.0f} MB"
+                )
+                if rss_before is not None and rss_after is not None:
+                    logger.info(
+                        f"Memory usage: {rss_before / 1024 / 1024:.0f} MB resident before converting, "
+                        f"{rss_after / 1024 / 1024:.0f} MB after"
+                    )
+                summarizer = pipeline(
+                    "summarization",
+                    model=model,
+                    tokenizer=tokenizer,
+                    device=device
+                )
+                logger.info("✅ Model loaded successfully!")
+            except Exception as e:
+                logger.error(f"❌ Failed to load model: {str(e)}")
+                raise
+
+def warm_up_model(single_threaded=False):
+    # Holds the model lock throughout, so requests wait for the warm-up
+    # rather than share the tokenizer with it
+    global model_warm
+    import torch
+
+    with model_lock:
+        load_model()
+        threads = torch.get_num_threads()
+        if single_threaded:
+            torch.set_num_threads(1)
+        start_time = time.time()
+        summarize_batches([WARMUP_TEXT], max_length=16, min_length=1)
+        torch.set_num_threads(threads)
+        model_warm = True
+    logger.info(f"Model warmed up in {time.time() - start_time:.2f}s")
+
+def preload_models():
+    # Runs in the gunicorn master. The warm-up generate is single-threaded:
+    # OpenMP threads started before the fork would be missing in the workers.
+    warm_up_model(single_threaded=True)
+
+    # Objects that exist now are never collected; keeping the collector off
+    # them stops it writing to their pages, so they stay shared with workers
+    gc.collect()
+    gc.freeze()
+
+def start_background_load():
+    def run():
         try:
-            tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-            model = T5ForConditionalGeneration.from_pretrained(MODEL_NAME)
-            summarizer = pipeline(
-                "summarization",
-                model=model,
-                tokenizer=tokenizer,
-                device=device
-            )
-            logger.info("✅ Model loaded successfully!")
+            warm_up_model()
         except Exception as e:
-            logger.error(f"❌ Failed to load model: {str(e)}")
-            raise
+            logger.error(f"Background model load failed: {str(e)}")
+
+    threading.Thread(target=run, name='model-loader', daemon=True).start()
+
+def is_ready():
+    return model_warm or MODEL_LOADING == 'lazy'
+
+class EmptyDocumentError(ValueError):
+    pass
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def log_memory_usage():
-    logger.info("Memory usage logging disabled for CPU-only mode")
+    rss = process_rss_bytes()
+    if rss is not None:
+        logger.info(f"Memory usage: {rss / 1024 / 1024:.0f} MB resident")
+
+def split_sentences(text):
+    units = []
+    for paragraph in PARAGRAPH_SPLIT_RE.split(text):
+        sentences = [part.strip() for part in SENTENCE_SPLIT_RE.split(paragraph) if part.strip()]
+        for i, sentence in enumerate(sentences):
+            units.append((sentence, i == 0))
+    return units
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, stats=None):
+    # stats, if given, gets input_tokens: the document's length in model tokens
+    units = split_sentences(text)
+    if not units:
+        return []
+
+    # Reserve room for the task prefix and EOS the summarizer adds
+    prefix = getattr(model.config, 'prefix', None) or ""
+    budget = max(chunk_size - len(tokenizer(prefix)['input_ids']), 1)
+    overlap = min(overlap, budget // 2)
+
+    # One batched tokenizer call over the whole document
+    encoded = tokenizer(
+        [sentence for sentence, _ in units],
+        add_special_tokens=False,
+        return_offsets_mapping=True
+    )
+    if stats is not None:
+        stats['input_tokens'] = sum(len(offsets) for offsets in encoded['offset_mapping'])
 
-def chunk_text(text, chunk_size=CHUNK_SIZE):
-    words = text.split()
     chunks = []
-    current_chunk = []
-    current_length = 0
+    current = []
+    current_tokens = 0
+    has_new_text = False
 
-    for word in words:
-        if current_length + len(word) < chunk_size:
-            current_chunk.append(word)
-            current_length += len(word)
-        else:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = [word]
-            current_length = len(word)
+    def flush():
+        nonlocal current, current_tokens, has_new_text
+        if has_new_text:
+            chunks.append(' '.join(sentence for sentence, _ in current))
+        has_new_text = False
+        carried = []
+        carried_tokens = 0
+        for sentence, n in reversed(current):
+            if carried_tokens + n > overlap:
+                break
+            carried.insert(0, (sentence, n))
+            carried_tokens += n
+        current = carried
+        current_tokens = carried_tokens
+
+    for (sentence, paragraph_start), offsets in zip(units, encoded['offset_mapping']):
+        n = len(offsets)
+
+        if n > budget:
+            # A single sentence longer than the window is cut on token boundaries
+            flush()
+            current, current_tokens = [], 0
+            for i in range(0, n, budget):
+                window = offsets[i:i + budget]
+                chunks.append(sentence[window[0][0]:window[-1][1]].strip())
+            continue
 
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
+        if current_tokens + n > budget:
+            flush()
+            if current_tokens + n > budget:
+                current, current_tokens = [], 0
+        elif paragraph_start and current_tokens >= budget * PARAGRAPH_BREAK_FILL:
+            flush()
+
+        current.append((sentence, n))
+        current_tokens += n
+        has_new_text = True
+
+    flush()
 
     return chunks
 
@@ -120,33 +402,162 @@ def summarize_chunk(chunk, max_length=DEFAULT_MAX_LENGTH, min_length=DEFAULT_MIN
             chunk,
             max_length=max_length,
             min_length=min_length,
-            length_penalty=1.5,
-            num_beams=4,
-            no_repeat_ngram_size=3,
-            early_stopping=True
+            **GENERATION_KWARGS
         )[0]['summary_text']
     except Exception as e:
         logger.error(f"Error summarizing chunk: {str(e)}")
         return ""
 
-def parallel_summarize(text, max_length=None, min_length=None):
-    if not text.strip():
-        return ""
-        
-    word_count = len(text.split())
-    if max_length is None:
-        max_length = min(DEFAULT_MAX_LENGTH + (word_count // 100), 512)
-    if min_length is None:
-        min_length = min(DEFAULT_MIN_LENGTH + (word_count // 200), 256)
-    
-    chunks = chunk_text(text)
-    
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        summaries = list(executor.map(
-            lambda c: summarize_chunk(c, max_length, min_length),
-            chunks
-        ))
+def plan_batches(lengths, batch_size=SUMMARY_BATCH_SIZE, max_batch_tokens=SUMMARY_BATCH_TOKENS):
+    # Shortest first so rows in a batch have similar lengths and little padding
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    current = []
+
+    for i in order:
+        # Sorted ascending, so the incoming chunk sets the padded width
+        padded_tokens = lengths[i] * (len(current) + 1)
+        if current and (len(current) >= batch_size or padded_tokens > max_batch_tokens):
+            batches.append(current)
+            current = []
+        current.append(i)
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+def iter_summarize_batches(chunks, max_length=DEFAULT_MAX_LENGTH, min_length=DEFAULT_MIN_LENGTH,
+                           batch_size=SUMMARY_BATCH_SIZE, max_batch_tokens=SUMMARY_BATCH_TOKENS,
+                           timings=None):
+    if not chunks:
+        return
+    import torch
+
+    # Same input prefix the summarization pipeline would apply
+    prefix = getattr(model.config, 'prefix', None) or ""
+    input_ids = tokenizer(
+        [prefix + chunk for chunk in chunks],
+        truncation=True,
+        max_length=MAX_INPUT_TOKENS
+    )['input_ids']
+    lengths = [len(ids) for ids in input_ids]
+
+    for batch_no, batch in enumerate(plan_batches(lengths, batch_size, max_batch_tokens)):
+        start_time = time.time()
+        try:
+            encoded = tokenizer.pad(
+                {'input_ids': [input_ids[i] for i in batch]},
+                return_tensors='pt'
+            )
+            with torch.inference_mode():
+                output_ids = model.generate(
+                    **encoded,
+                    max_length=max_length,
+                    min_length=min_length,
+                    **GENERATION_KWARGS
+                )
+            summaries = tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+        except Exception as e:
+            logger.error(f"Error summarizing batch {batch_no}: {str(e)}, falling back to single chunks")
+            summaries = [summarize_chunk(chunks[i], max_length, min_length) for i in batch]
+
+        elapsed = time.time() - start_time
+        # Each chunk of the batch is counted with its share of the batch time
+        for _ in batch:
+            stage_seconds.observe(elapsed / len(batch), stage='generate')
+        logger.info(
+            f"Batch {batch_no}: {len(batch)} chunks, {max(lengths[i] for i in batch)} tokens wide, "
+            f"{elapsed:.2f} seconds"
+        )
+        if timings is not None:
+            timings.append({
+                "batch": batch_no,
+                "chunks": len(batch),
+                "padded_tokens": max(lengths[i] for i in batch) * len(batch),
+                "input_tokens": sum(lengths[i] for i in batch),
+                "seconds": round(elapsed, 3)
+            })
+
+        yield from zip(batch, summaries)
+
+def summarize_batches(chunks, max_length=DEFAULT_MAX_LENGTH, min_length=DEFAULT_MIN_LENGTH,
+                      batch_size=SUMMARY_BATCH_SIZE, max_batch_tokens=SUMMARY_BATCH_TOKENS,
+                      timings=None):
+    summaries = [""] * len(chunks)
+    for i, summary in iter_summarize_batches(chunks, max_length, min_length,
+                                             batch_size, max_batch_tokens, timings):
+        summaries[i] = summary
+    return summaries
+
+def summary_params(text, max_length=None, min_length=None):
+    if SUMMARY_LENGTH_SCALING:
+        word_count = len(text.split())
+        default_max_length = min(DEFAULT_MAX_LENGTH + (word_count // 100), 512)
+        default_min_length = min(DEFAULT_MIN_LENGTH + (word_count // 200), 256)
+    else:
+        default_max_length = DEFAULT_MAX_LENGTH
+        default_min_length = DEFAULT_MIN_LENGTH
+
+    return {
+        "model": MODEL_NAME,
+        "inference_mode": INFERENCE_MODE,
+        "max_length": default_max_length if max_length is None else max_length,
+        "min_length": default_min_length if min_length is None else min_length,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        **GENERATION_KWARGS
+    }
+
+def iter_chunk_summaries(text, max_length=None, min_length=None, stats=None):
+    # Yields (index, summary, cached) as soon as each chunk summary is available
+    if stats is None:
+        stats = {}
+
+    params = summary_params(text, max_length, min_length)
+    max_length = params['max_length']
+    min_length = params['min_length']
     
+    with stage_seconds.time(stage='chunking'):
+        chunks = chunk_text(text, stats=stats)
+    request_chunks.observe(len(chunks))
+    request_tokens.observe(stats.get('input_tokens', 0))
+    # Chunking settings are left out: the same chunk text with the same length
+    # bounds gets the same summary
+    chunk_params = {
+        "model": MODEL_NAME,
+        "inference_mode": INFERENCE_MODE,
+        "max_length": max_length,
+        "min_length": min_length,
+        **GENERATION_KWARGS
+    }
+    keys = [make_cache_key(chunk, chunk_params) for chunk in chunks]
+    cached_summaries = [chunk_cache.get(key) for key in keys]
+    missing = [i for i, cached in enumerate(cached_summaries) if cached is None]
+
+    stats['chunk_count'] = len(chunks)
+    stats['chunks_reused'] = len(chunks) - len(missing)
+    stats['chunks_computed'] = len(missing)
+    stats['batches'] = []
+    logger.info(f"Chunks: {len(chunks)} total, {len(chunks) - len(missing)} reused, {len(missing)} generated")
+
+    for i, cached in enumerate(cached_summaries):
+        if cached is not None:
+            yield i, cached['summary'], True
+
+    generated = iter_summarize_batches(
+        [chunks[i] for i in missing],
+        max_length,
+        min_length,
+        timings=stats['batches']
+    )
+    for j, summary in generated:
+        i = missing[j]
+        if summary:
+            chunk_cache.set(keys[i], {"summary": summary})
+        yield i, summary, False
+
+def join_summaries(summaries):
     final_summary = " ".join([s for s in summaries if s])
     final_summary = re.sub(r'\s+([.,;:])', r'\1', final_summary)
     final_summary = re.sub(r'\.\s+\.', '.', final_summary)
@@ -154,46 +565,21 @@ def parallel_summarize(text, max_length=None, min_length=None):
     
     return final_summary
 
+def parallel_summarize(text, max_length=None, min_length=None, stats=None):
+    if not text.strip():
+        return ""
+    
+    summaries = {}
+    for i, summary, _ in iter_chunk_summaries(text, max_length, min_length, stats):
+        summaries[i] = summary
+    
+    return join_summaries([summaries[i] for i in sorted(summaries)])
+
 def preprocess_text(text):
     try:
         if not text or not isinstance(text, str):
             return ""
-            
-        text = re.sub(r'Page\s*\d+\s*of\s*\d+', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'\n\d+\n', '\n', text)
-        
-        noise_patterns = [
-            r'This\s+document\s+was\s+signed\s+electronically.*',
-            r'Electronic\s+signature.*',
-            r'IN\s+THE\s+(?:SUPREME\s+)?COURT\s+OF\s+.*\n',
-            r'CASE\s+NO[.:].*\n',
-            r'BEFORE[.:].*\n',
-            r'JUDGMENT\s+RESERVED\s+ON[.:].*\n',
-            r'PRESENT[.:].*\n'
-        ]
-        
-        for pattern in noise_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
-        
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            if (re.fullmatch(r'\d+', line) or 
-                len(line) < 25 or 
-                line.startswith(('§', '©', 'Page', 'http'))):
-                continue
-                
-            cleaned_lines.append(line)
-        
-        return '\n\n'.join(cleaned_lines) or ""
+        return clean_text(text, SKIP_PREFIXES)
     except Exception as e:
         logger.error(f"Error in preprocessing: {str(e)}")
         return text if isinstance(text, str) else ""
@@ -206,115 +592,69 @@ def get_processed_path(filename):
     processed_filename = get_processed_filename(filename)
     return os.path.normpath(os.path.join(app.config['PROCESSED_FOLDER'], processed_filename))
 
-def extract_text_from_file(filepath, filename):
+def extract_clean_text(filepath, filename, stats, removed=None):
+    # stats gets input_chars (0 for an empty document) and clean_seconds;
+    # in legacy mode PDF pages are cleaned as they are extracted
     try:
         ext = os.path.splitext(filename)[1].lower()
         
-        if ext == '.pdf':
-            text = ""
-            with open(filepath, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    page_text = page.extract_text() or ""
-                    text += page_text + "\n"
-            return text.strip()
-        
-        elif ext in ['.doc', '.docx']:
-            doc = docx.Document(filepath)
-            return "\n".join(para.text for para in doc.paragraphs if para.text)
+        if PREPROCESS_MODE == 'structured':
+            if ext == '.pdf':
+                pages = iter_pdf_pages(filepath)
+            else:
+                pages = ["\n".join(iter_document_pages(filepath, filename))]
+            return clean_structured(pages, SKIP_PREFIXES, stats, removed)
         
-        elif ext == '.txt':
-            with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
-                return f.read()
+        if ext == '.pdf':
+            return clean_pages(iter_pdf_pages(filepath), SKIP_PREFIXES, stats)
         
-        raise ValueError(f"Unsupported file type: {ext}")
+        raw_text = "\n".join(iter_document_pages(filepath, filename))
+        start_time = time.time()
+        cleaned_text = preprocess_text(raw_text)
+        stats['input_chars'] = len(raw_text.strip())
+        stats['clean_seconds'] = time.time() - start_time
+        return cleaned_text
     
     except Exception as e:
         logger.error(f"Extraction failed for {filename}: {str(e)}")
         raise
 
-def rate_limited(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        ip = request.remote_addr
-        now = datetime.now()
-        
-        # Clean up old timestamps
-        request_timestamps[ip] = [
-            ts for ts in request_timestamps.get(ip, []) 
-            if now - ts < timedelta(minutes=1)
-        ]
-        
-        # Check rate limit
-        if len(request_timestamps.get(ip, [])) >= app.config['RATE_LIMIT']:
-            logger.warning(f"Rate limit exceeded for IP: {ip}")
-            return jsonify({
-                'error': 'Rate limit exceeded',
-                'message': f'Limit is {app.config["RATE_LIMIT"]} requests per minute.'
-            }), 429
-        
-        # Add new timestamp
-        request_timestamps.setdefault(ip, []).append(now)
-        
-        return f(*args, **kwargs)
-    return decorated_function
+def client_address():
+    if RATE_LIMIT_CLIENT_HEADER:
+        forwarded = request.headers.get(RATE_LIMIT_CLIENT_HEADER)
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr
 
-@lru_cache(maxsize=app.config['CACHE_SIZE'])
-def translate_text(text, target_lang):
-    import time
+def rate_limited(scope, limit):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            ip = client_address()
+            allowed, retry_after = rate_limiter.hit(scope, ip, limit)
+            if not allowed:
+                logger.warning(f"Rate limit exceeded for IP: {ip} ({scope})")
+                response = jsonify({
+                    'error': 'Rate limit exceeded',
+                    'message': f'Limit is {limit} requests per minute.',
+                    'retry_after': retry_after
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
 
-    # Retry configuration
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"Translating to {target_lang} using MyMemory: {text[:50]}...")
-            response = requests.get(
-                app.config['MYMEMORY_URL'],
-                params={'q': text, 'langpair': f'en|{target_lang}'},
-                timeout=app.config['REQUEST_TIMEOUT']
-            )
-            logger.info(f"MyMemory response status: {response.status_code}")
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"MyMemory response data: {data}")
-                if 'responseData' in data and 'translatedText' in data['responseData']:
-                    translated = data['responseData']['translatedText']
-                    logger.info(f"MyMemory translated text: {translated[:50]}...")
-                    return translated
-            elif response.status_code == 429:
-                logger.warning(f"MyMemory rate limit hit, retrying {attempt + 1}/{max_retries}")
-                time.sleep(2 ** attempt)
-                continue
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"MyMemory translation failed: {str(e)}, retrying {attempt + 1}/{max_retries}")
-            time.sleep(2 ** attempt)
-    
-    # Fallback to LibreTranslate
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"Translating to {target_lang} using LibreTranslate: {text[:50]}...")
-            response = requests.post(
-                app.config['LIBRE_URL'],
-                json={'q': text, 'source': 'en', 'target': target_lang},
-                timeout=app.config['REQUEST_TIMEOUT']
-            )
-            logger.info(f"LibreTranslate response status: {response.status_code}")
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"LibreTranslate response data: {data}")
-                if 'translatedText' in data:
-                    translated = data['translatedText']
-                    logger.info(f"LibreTranslate translated text: {translated[:50]}...")
-                    return translated
-            elif response.status_code == 429:
-                logger.warning(f"LibreTranslate rate limit hit, retrying {attempt + 1}/{max_retries}")
-                time.sleep(2 ** attempt)
-                continue
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"LibreTranslate translation failed: {str(e)}, retrying {attempt + 1}/{max_retries}")
-            time.sleep(2 ** attempt)
-    
-    raise Exception('Translation failed - all services exhausted after retries')
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Only matched routes, so unknown paths can't add label values
+    if request.url_rule is not None and 'request_start' in g:
+        request_seconds.observe(time.perf_counter() - g.request_start, endpoint=request.url_rule.rule)
+    return response
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -322,89 +662,208 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "model_loaded": summarizer is not None,
+        "ready": is_ready(),
         "device": "cpu",
+        "inference_mode": INFERENCE_MODE,
+        "model_load": model_load_stats,
         "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "batch_size": SUMMARY_BATCH_SIZE,
+        "batch_tokens": SUMMARY_BATCH_TOKENS,
         "default_max_length": DEFAULT_MAX_LENGTH,
-        "default_min_length": DEFAULT_MIN_LENGTH
+        "default_min_length": DEFAULT_MIN_LENGTH,
+        "summary_length_scaling": SUMMARY_LENGTH_SCALING,
+        "summary_cache": summary_cache.stats(),
+        "chunk_cache": chunk_cache.stats(),
+        "jobs": job_queue.stats(),
+        "translation": translation_client.stats(),
+        "rate_limits": rate_limiter.stats()
     })
 
-@app.route('/summarize', methods=['POST'])
-def summarize():
-    if summarizer is None:
-        try:
-            load_model()
-        except Exception as e:
-            return jsonify({
-                "error": "Model failed to load",
-                "summary": "",
-                "status": "error"
-            }), 503
-    
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    return jsonify({"status": "alive"})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    # Only warm instances should receive traffic
+    if not is_ready():
+        return jsonify({"status": "loading"}), 503
+    return jsonify({"status": "ready"})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+def validate_upload():
     if 'file' not in request.files:
-        return jsonify({
+        return None, (jsonify({
             "error": "No file uploaded",
             "summary": "",
             "status": "error"
-        }), 400
+        }), 400)
     
     file = request.files['file']
     if file.filename == '':
-        return jsonify({
+        return None, (jsonify({
             "error": "No selected file",
             "summary": "",
             "status": "error"
-        }), 400
+        }), 400)
     
     if not file or not allowed_file(file.filename):
-        return jsonify({
+        return None, (jsonify({
             "error": "Invalid file type. Allowed: pdf, doc, docx, txt",
             "summary": "",
             "status": "error"
-        }), 400
+        }), 400)
+    
+    return file, None
+
+def count_tokens(texts):
+    # None until the tokenizer has been loaded
+    if tokenizer is None:
+        return None
+    if not texts:
+        return 0
+    return sum(len(ids) for ids in tokenizer(texts, add_special_tokens=False)['input_ids'])
+
+def prepare_document(filepath, filename, timings):
+    start_time = time.time()
+    stats = {}
+    removed = []
+    cleaned_text = extract_clean_text(filepath, filename, stats, removed)
+    total_seconds = time.time() - start_time
+    timings['extraction_seconds'] = round(total_seconds - stats['clean_seconds'], 3)
+    timings['preprocessing_seconds'] = round(stats['clean_seconds'], 3)
+    stage_seconds.observe(total_seconds - stats['clean_seconds'], stage='extraction')
+    stage_seconds.observe(stats['clean_seconds'], stage='preprocessing')
+    if not stats['input_chars']:
+        logger.error(f"Empty text extracted from {filename}")
+        raise EmptyDocumentError("Empty file or could not extract text")
+    
+    preprocessing = {
+        "mode": PREPROCESS_MODE,
+        "removed_chars": max(stats['input_chars'] - len(cleaned_text), 0),
+        "removed_lines": stats.get('removed_lines', 0),
+        "repeated_lines": stats.get('repeated_lines', 0),
+        "removed_tokens": count_tokens(removed) if PREPROCESS_MODE == 'structured' else None
+    }
+    logger.info(f"Text length: {len(cleaned_text)} chars, {len(cleaned_text.split())} words")
+    logger.info(f"Preprocessing removed {preprocessing['removed_chars']} chars, "
+                f"{preprocessing['removed_tokens']} tokens")
     
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     preprocessed_path = os.path.join(app.config['PREPROCESSED_FOLDER'], f"preprocessed_{filename}.txt")
+    with open(preprocessed_path, 'w', encoding='utf-8') as f:
+        f.write(cleaned_text)
+    
+    return cleaned_text, preprocessing
+
+def summarize_document(filepath, filename, timings=None):
+    if timings is None:
+        timings = {}
+    
+    cleaned_text, preprocessing = prepare_document(filepath, filename, timings)
+    
+    start_time = time.time()
+    cache_key = make_cache_key(cleaned_text, summary_params(cleaned_text))
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        processing_time = time.time() - start_time
+        timings['summarization_seconds'] = round(processing_time, 3)
+        logger.info(f"Summary cache hit for {filename} ({cache_key[:12]})")
+        return {
+            **cached,
+            "processing_time": f"{processing_time:.2f} seconds",
+            "preprocessing": preprocessing,
+            "cached": True
+        }
+    
+    if not model_warm:
+        load_model()
     
+    stats = {}
+    summary = parallel_summarize(cleaned_text, stats=stats)
+    processing_time = time.time() - start_time
+    timings['summarization_seconds'] = round(processing_time, 3)
+    
+    result = finish_summary(cache_key, cleaned_text, summary, stats, processing_time)
+    return {**result, "preprocessing": preprocessing}
+
+def finish_summary(cache_key, cleaned_text, summary, stats, processing_time):
+    if not summary:
+        raise ValueError("Failed to generate summary - empty result")
+    
+    logger.info(f"Generated summary in {processing_time:.2f} seconds")
+    logger.info(f"Summary length: {len(summary.split())} words")
+    
+    result = {
+        "summary": summary,
+        "word_count": len(cleaned_text.split()),
+        "summary_length": len(summary.split()),
+        "chunk_count": stats.get('chunk_count', 0)
+    }
+    summary_cache.set(cache_key, result)
+    
+    return {
+        **result,
+        "processing_time": f"{processing_time:.2f} seconds",
+        "chunks_reused": stats.get('chunks_reused', 0),
+        "chunks_computed": stats.get('chunks_computed', 0),
+        "batches": stats.get('batches', []),
+        "cached": False
+    }
+
+def run_summarization_job(filepath, filename, timings=None):
     try:
-        file.save(filepath)
-        logger.info(f"Processing file: {filename}")
-        log_memory_usage()
-        
-        raw_text = extract_text_from_file(filepath, filename)
-        if not raw_text or not raw_text.strip():
-            logger.error(f"Empty text extracted from {filename}")
+        return summarize_document(filepath, filename, timings=timings)
+    finally:
+        if os.path.exists(filepath):
+            try:
+                os.remove(filepath)
+            except Exception as e:
+                logger.error(f"Error removing file {filepath}: {str(e)}")
+
+@app.route('/summarize', methods=['POST'])
+@rate_limited('summarize', RATE_LIMIT_SUMMARIZE)
+def summarize():
+    if not model_warm:
+        try:
+            load_model()
+        except Exception as e:
             return jsonify({
-                "error": "Empty file or could not extract text",
+                "error": "Model failed to load",
                 "summary": "",
                 "status": "error"
-            }), 400
-            
-        cleaned_text = preprocess_text(raw_text)
-        logger.info(f"Text length: {len(cleaned_text)} chars, {len(cleaned_text.split())} words")
-        
-        with open(preprocessed_path, 'w', encoding='utf-8') as f:
-            f.write(cleaned_text)
-        
-        start_time = time.time()
-        summary = parallel_summarize(cleaned_text)
-        processing_time = time.time() - start_time
-        
-        if not summary:
-            raise ValueError("Failed to generate summary - empty result")
+            }), 503
+    
+    file, error_response = validate_upload()
+    if error_response:
+        return error_response
+    
+    filename = secure_filename(file.filename)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    
+    try:
+        with stage_seconds.time(stage='file_save'):
+            file.save(filepath)
+        logger.info(f"Processing file: {filename}")
+        log_memory_usage()
         
-        logger.info(f"Generated summary in {processing_time:.2f} seconds")
-        logger.info(f"Summary length: {len(summary.split())} words")
+        result = summarize_document(filepath, filename)
         
         return jsonify({
-            "summary": summary,
+            **result,
             "filename": filename,
-            "processing_time": f"{processing_time:.2f} seconds",
-            "word_count": len(cleaned_text.split()),
-            "summary_length": len(summary.split()),
             "status": "success"
         })
         
+    except EmptyDocumentError as e:
+        return jsonify({
+            "error": str(e),
+            "summary": "",
+            "status": "error"
+        }), 400
     except Exception as e:
         logger.error(f"Error processing {filename}: {str(e)}")
         return jsonify({
@@ -422,8 +881,197 @@ def summarize():
                 logger.error(f"Error removing file {filepath}: {str(e)}")
         log_memory_usage()
 
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/summarize/stream', methods=['POST'])
+@rate_limited('summarize', RATE_LIMIT_SUMMARIZE)
+def summarize_stream():
+    if not model_warm:
+        try:
+            load_model()
+        except Exception as e:
+            return jsonify({
+                "error": "Model failed to load",
+                "summary": "",
+                "status": "error"
+            }), 503
+    
+    file, error_response = validate_upload()
+    if error_response:
+        return error_response
+    
+    filename = secure_filename(file.filename)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
+    
+    try:
+        with stage_seconds.time(stage='file_save'):
+            file.save(filepath)
+        logger.info(f"Streaming summary for file: {filename}")
+        cleaned_text, preprocessing = prepare_document(filepath, filename, {})
+    except EmptyDocumentError as e:
+        return jsonify({
+            "error": str(e),
+            "summary": "",
+            "status": "error"
+        }), 400
+    except Exception as e:
+        logger.error(f"Error processing {filename}: {str(e)}")
+        return jsonify({
+            "error": "Processing failed",
+            "details": str(e),
+            "filename": filename,
+            "summary": "",
+            "status": "error"
+        }), 500
+    finally:
+        if os.path.exists(filepath):
+            try:
+                os.remove(filepath)
+            except Exception as e:
+                logger.error(f"Error removing file {filepath}: {str(e)}")
+    
+    def generate():
+        start_time = time.time()
+        cache_key = make_cache_key(cleaned_text, summary_params(cleaned_text))
+        cached = summary_cache.get(cache_key)
+        if cached is not None:
+            processing_time = time.time() - start_time
+            yield sse_event("summary", {
+                **cached,
+                "filename": filename,
+                "processing_time": f"{processing_time:.2f} seconds",
+                "preprocessing": preprocessing,
+                "cached": True,
+                "status": "success"
+            })
+            return
+        
+        yield sse_event("start", {
+            "filename": filename,
+            "word_count": len(cleaned_text.split()),
+            "preprocessing": preprocessing
+        })
+        
+        stats = {}
+        summaries = {}
+        try:
+            for i, summary, from_cache in iter_chunk_summaries(cleaned_text, stats=stats):
+                summaries[i] = summary
+                yield sse_event("chunk", {
+                    "index": i,
+                    "completed": len(summaries),
+                    "total": stats['chunk_count'],
+                    "summary": summary,
+                    "cached": from_cache,
+                    "elapsed_ms": int((time.time() - start_time) * 1000)
+                })
+            
+            summary = join_summaries([summaries[i] for i in sorted(summaries)])
+            result = finish_summary(cache_key, cleaned_text, summary, stats, time.time() - start_time)
+            yield sse_event("summary", {
+                **result,
+                "filename": filename,
+                "status": "success"
+            })
+        except Exception as e:
+            logger.error(f"Error streaming summary for {filename}: {str(e)}")
+            yield sse_event("error", {
+                "error": "Processing failed",
+                "details": str(e),
+                "filename": filename,
+                "status": "error"
+            })
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/jobs', methods=['POST'])
+@rate_limited('summarize', RATE_LIMIT_SUMMARIZE)
+def submit_job():
+    file, error_response = validate_upload()
+    if error_response:
+        return error_response
+    
+    filename = secure_filename(file.filename)
+    # Unique upload path, the job owns the file until it finishes
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
+    with stage_seconds.time(stage='file_save'):
+        file.save(filepath)
+    
+    try:
+        job_id = job_queue.submit(run_summarization_job, filepath, filename)
+    except QueueFullError as e:
+        os.remove(filepath)
+        logger.warning(f"Job queue full, rejecting {filename}")
+        response = jsonify({
+            "error": "Too many pending summarizations",
+            "message": str(e),
+            "retry_after": e.retry_after,
+            "status": "error"
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    
+    logger.info(f"Queued job {job_id} for {filename}")
+    return jsonify({
+        "job_id": job_id,
+        "filename": filename,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "result_url": f"/jobs/{job_id}/result"
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job", "status": "error"}), 404
+    
+    return jsonify({
+        "job_id": job_id,
+        "status": job['status'],
+        "queue_position": job.get('queue_position'),
+        "timings": job['timings'],
+        "error": job['error']
+    })
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job", "status": "error"}), 404
+    
+    if job['status'] in ("queued", "running"):
+        response = jsonify({"job_id": job_id, "status": job['status']})
+        response.headers['Retry-After'] = '2'
+        return response, 202
+    
+    if job['status'] == "failed":
+        return jsonify({
+            "error": "Processing failed",
+            "details": job['error'],
+            "job_id": job_id,
+            "timings": job['timings'],
+            "summary": "",
+            "status": "error"
+        }), 500
+    
+    return jsonify({
+        **job['result'],
+        "job_id": job_id,
+        "timings": job['timings'],
+        "status": "success"
+    })
+
 @app.route('/translate', methods=['POST'])
-@rate_limited
+@rate_limited('translate', app.config['RATE_LIMIT'])
 def translate_endpoint():
     MAX_LENGTH = 500
     
@@ -433,7 +1081,7 @@ def translate_endpoint():
     data = request.get_json()
     text = data.get('text')
     lang = data.get('lang')
-    chunked = data.get('chunked', True)  # Enable chunking by default for robustness
+    chunked = data.get('chunked', True)  # Translate sentence by sentence by default
     
     if not text or not lang:
         return jsonify({
@@ -448,13 +1096,13 @@ def translate_endpoint():
         }), 400
     
     try:
-        if chunked and len(text) > MAX_LENGTH:
-            logger.info(f"Chunking text for translation. Text length: {len(text)}")
-            chunks = [text[i:i + MAX_LENGTH] for i in range(0, len(text), MAX_LENGTH)]
-            translated_chunks = [translate_text(chunk, lang) for chunk in chunks]
-            translated_text = ' '.join(translated_chunks)
+        if chunked:
+            # Whole sentences, so repeated ones are found in the translation memory
+            segments, separators = split_segments(text, MAX_LENGTH)
+            logger.info(f"Translating {len(segments)} segments. Text length: {len(text)}")
+            translated_text = join_segments(translation_client.translate_many(segments, lang), separators)
         else:
-            translated_text = translate_text(text, lang)
+            translated_text = translation_client.translate(text, lang)
         
         return jsonify({
             'translation': translated_text,  # Changed key to match frontend expectation
@@ -481,5 +1129,9 @@ def handle_exception(e):
     }), 500
 
 if __name__ == '__main__':
+    if MODEL_LOADING == 'preload':
+        preload_models()
+    elif MODEL_LOADING == 'background':
+        start_background_load()
     port = int(os.environ.get('PORT', 8000))
     app.run(host='0.0.0.0', port=port)
@@ -1,5 +1,36 @@
+import os
+
+# Summarization jobs live in-process, keep a single worker
 workers = 1
 threads = 2
 worker_class = "gthread"
 bind = "0.0.0.0:$PORT"
-timeout = 60
\ No newline at end of file
+timeout = 60
+
+# MODEL_LOADING=preload imports the app and loads and warms the models in the
+# master, so workers are forked warm and share the weights copy-on-write.
+# MODEL_LOADING=background (the default) loads them in a thread of each
+# worker, which answers health checks in the meantime.
+MODEL_LOADING = os.getenv('MODEL_LOADING', 'background')
+preload_app = MODEL_LOADING == 'preload'
+if preload_app:
+    # The tokenizers library turns its thread pool off in forked workers
+    # anyway; saying so up front avoids the warning on every fork
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+
+def when_ready(server):
+    # Called in the master after the app is imported, before any worker forks
+    if preload_app:
+        import app
+        try:
+            app.preload_models()
+        except Exception as e:
+            # Workers still load the model on first use; /health/ready stays 503
+            server.log.error(f"Model preload failed: {str(e)}")
+
+
+def post_worker_init(worker):
+    if MODEL_LOADING == 'background':
+        import app
+        app.start_background_load()
@@ -0,0 +1,62 @@
+import gc
+import logging
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_MODES = ('fp32', 'int8', 'bf16')
+
+
+def bf16_supported():
+    # Needs native bf16 instructions (AVX512-BF16 or AMX); elsewhere bf16
+    # matmuls are emulated and slower than fp32. Read from the CPU flags
+    # rather than asking torch, which is only imported with the model.
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False
+    return bool(flags & {'avx512_bf16', 'amx_bf16'})
+
+
+def resolve_inference_mode(mode):
+    # The mode that will actually run on this machine
+    if mode not in INFERENCE_MODES:
+        logger.warning(f"Unknown inference mode '{mode}', using fp32")
+        return 'fp32'
+    if mode == 'bf16' and not bf16_supported():
+        logger.warning("CPU has no native bf16 support, using fp32")
+        return 'fp32'
+    return mode
+
+
+def apply_inference_mode(model, mode):
+    # int8 quantizes the weights of every Linear layer and quantizes
+    # activations on the fly; embeddings and layer norms stay fp32. Both
+    # convert the model in place: a converted copy would hold the fp32 and
+    # converted weights in memory at once.
+    import torch
+
+    model.eval()
+    if mode == 'int8':
+        torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        # The replaced fp32 layers sit in reference cycles, free them now
+        gc.collect()
+        return model
+    if mode == 'bf16':
+        return model.to(torch.bfloat16)
+    return model
+
+
+def model_bytes(model):
+    # Weight memory, counting the packed int8 weights of quantized layers and
+    # tied weights (T5 shares its embeddings) once
+    import torch
+
+    total = 0
+    seen = set()
+    for value in model.state_dict().values():
+        for tensor in (value if isinstance(value, tuple) else (value,)):
+            if isinstance(tensor, torch.Tensor) and tensor.data_ptr() not in seen:
+                seen.add(tensor.data_ptr())
+                total += tensor.element_size() * tensor.nelement()
+    return total
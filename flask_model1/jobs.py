@@ -0,0 +1,126 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+# Bounded in-process job queue; finished jobs are kept for result_ttl seconds
+class JobQueue:
+    def __init__(self, workers=1, max_pending=8, result_ttl=3600, max_finished=256):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='summarize-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._durations = []
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _retry_after(self):
+        # Rough wait until a slot frees up, from the recent average job time
+        average = sum(self._durations) / len(self._durations) if self._durations else 30
+        return max(1, int(average * self._pending / self.workers))
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            self._expire()
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(self._retry_after())
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "timings": {},
+                "result": None,
+                "error": None
+            }
+            self._jobs[job_id] = job
+            self._pending += 1
+            self.submitted += 1
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            job['status'] = "running"
+            job['started_at'] = time.time()
+            job['timings']['queue_seconds'] = round(job['started_at'] - job['submitted_at'], 3)
+
+        try:
+            result = fn(*args, timings=job['timings'], **kwargs)
+            status, error = "done", None
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            result, status, error = None, "failed", str(e)
+
+        with self._lock:
+            job['finished_at'] = time.time()
+            job['timings']['total_seconds'] = round(job['finished_at'] - job['submitted_at'], 3)
+            job['result'] = result
+            job['error'] = error
+            job['status'] = status
+            self._pending -= 1
+            if status == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._durations.append(job['finished_at'] - job['started_at'])
+            self._durations = self._durations[-20:]
+
+    def _expire(self):
+        now = time.time()
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job['finished_at'] is not None
+        ]
+        overflow = len(finished) - self.max_finished
+        for job_id in finished:
+            job = self._jobs[job_id]
+            if overflow > 0 or now - job['finished_at'] > self.result_ttl:
+                del self._jobs[job_id]
+                overflow -= 1
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job, timings=dict(job['timings']))
+            if job['status'] == "queued":
+                queued = [j for j in self._jobs.values() if j['status'] == "queued"]
+                snapshot['queue_position'] = queued.index(job) + 1
+            return snapshot
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "running": sum(1 for job in self._jobs.values() if job['status'] == "running"),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed
+            }
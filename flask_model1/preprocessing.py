@@ -0,0 +1,394 @@
+import re
+import time
+from bisect import bisect_right
+from itertools import accumulate, chain, islice
+
+# Patterns from the original preprocess_text, compiled once. Their passes run
+# one after another, as before, since each can change what the next matches
+PAGE_NUMBER_PATTERN = r'Page\s*\d+\s*of\s*\d+'
+LONE_NUMBER_PATTERN = r'\n\d+\n'
+NOISE_PATTERNS = [
+    r'This\s+document\s+was\s+signed\s+electronically.*',
+    r'Electronic\s+signature.*',
+    r'IN\s+THE\s+(?:SUPREME\s+)?COURT\s+OF\s+.*\n',
+    r'CASE\s+NO[.:].*\n',
+    r'BEFORE[.:].*\n',
+    r'JUDGMENT\s+RESERVED\s+ON[.:].*\n',
+    r'PRESENT[.:].*\n'
+]
+PASS_PATTERNS = [(PAGE_NUMBER_PATTERN, ''), (LONE_NUMBER_PATTERN, '\n')] + [
+    (pattern, '') for pattern in NOISE_PATTERNS
+]
+
+# re.IGNORECASE loses the literal prefix scan, so the passes run case-sensitively
+# over a lowercased copy and the matched spans are cut from both copies. These
+# are the only characters IGNORECASE folds differently from str.lower(); text
+# holding any of them takes the IGNORECASE passes instead.
+FOLD_EXCEPTION_RE = re.compile('[\u0130\u0131\u017f]')
+IGNORECASE_PASSES = [
+    (re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in PASS_PATTERNS
+]
+LOWERCASE_PASSES = [
+    (re.compile(pattern.lower()), replacement) for pattern, replacement in PASS_PATTERNS
+]
+
+# Every pattern merged into one alternation: a single scan of the text finds
+# the noise, and the passes only run over the lines around each hit
+ANY_NOISE_RE = re.compile('|'.join(pattern.lower() for pattern, _ in PASS_PATTERNS))
+
+# A line is quiet when it holds text, no pattern matches in it, and it neither
+# starts nor ends with a word a pattern could continue through from the next
+# or previous line. Removals only spread from the lines with noise in them:
+# each pattern ending in ".*\n" removes at most one more line break, joining
+# the next line to what is left, so a chain of removals runs on through at
+# most that many quiet lines. A line boundary is therefore a safe place to cut
+# the text when the line after it is quiet and so are the SAFE_CUT_LINES text
+# lines before it, or all of them back to the start.
+SAFE_CUT_LINES = 1 + sum(pattern.endswith(r'.*\n') for pattern in NOISE_PATTERNS)
+DIGIT_CHARS = tuple('0123456789')
+PATTERN_WORD = r'[a-z]+|\\d\+'
+
+
+# The words a pattern runs on from past a \s, which can be a line break, are
+# read off the patterns themselves: the word after each \s can start a line
+# joined to the one before (a head), the word before it can end a line joined
+# to the next (a tail). \d+ stands for any digit. Optional groups are
+# flattened, since the words inside them border a \s either way; a \s
+# followed by ".*" needs no head, the tail before it already marks the line.
+# A pattern joining lines any other way fails the import rather than making
+# _last_safe_cut cut through it.
+def _joining_words(patterns):
+    heads, tails = set(), set()
+    for pattern in patterns:
+        pieces = re.split(r'\\s[*+]', re.sub(r'\(\?:|\)\?', '', pattern.lower()))
+        for before, after in zip(pieces, pieces[1:]):
+            tail = re.search(f'(?:{PATTERN_WORD})$', before)
+            head = re.match(PATTERN_WORD, after)
+            if not tail or not (head or after.startswith('.*')):
+                raise ValueError(f"Can't tell which lines {pattern!r} joins")
+            tails.add(tail.group())
+            if head:
+                heads.add(head.group())
+
+    def expand(words):
+        return tuple(chain.from_iterable(DIGIT_CHARS if word == r'\d+' else (word,) for word in sorted(words)))
+
+    return expand(heads), expand(tails)
+
+
+JOINING_HEADS, JOINING_TAILS = _joining_words([PAGE_NUMBER_PATTERN] + NOISE_PATTERNS)
+DIGITS_RE = re.compile(r'\d+')
+
+MIN_LINE_LENGTH = 25
+
+# Structured mode keeps line breaks while filtering, so the noise patterns are
+# made line-local and page furniture can be dropped line by line
+def _line_local(pattern):
+    return pattern.replace(r'\s', r'[^\S\n]').replace(r'.*\n', '.*')
+
+LINE_NOISE_PATTERNS = [PAGE_NUMBER_PATTERN] + NOISE_PATTERNS
+LINE_NOISE_RE = re.compile('|'.join(_line_local(pattern.lower()) for pattern in LINE_NOISE_PATTERNS))
+LINE_NOISE_IGNORECASE_RE = re.compile(
+    '|'.join(_line_local(pattern) for pattern in LINE_NOISE_PATTERNS), re.IGNORECASE
+)
+PAGE_FURNITURE_RE = re.compile(r'[\W_]*(?:page\s*)?\d+(?:\s*(?:of|/)\s*\d+)?[\W_]*', re.IGNORECASE)
+SENTENCE_END_RE = re.compile(r'[.!?;:][\'")\]]*$')
+
+# Lines this close to the top or bottom of a page are header/footer candidates;
+# one seen on at least REPEAT_MIN_PAGES pages and REPEAT_MIN_RATIO of the pages
+# sampled (digits ignored, so running page numbers still match) is dropped
+# everywhere. Only the first REPEAT_SAMPLE_PAGES pages are sampled and held
+# in memory; every later page is cleaned as it arrives.
+EDGE_LINES = 3
+REPEAT_MIN_PAGES = 3
+REPEAT_MIN_RATIO = 0.5
+REPEAT_SAMPLE_PAGES = 20
+
+
+def _can_join(lowered):
+    return lowered.lstrip().startswith(JOINING_HEADS) or lowered.rstrip().endswith(JOINING_TAILS)
+
+
+def _is_quiet(line):
+    if not line.strip() or FOLD_EXCEPTION_RE.search(line):
+        return False
+    lowered = line.lower()
+    return not (_can_join(lowered) or ANY_NOISE_RE.search(lowered + '\n'))
+
+
+def _line_start(text, end):
+    return text.rfind('\n', 0, end) + 1
+
+
+def _last_safe_cut(text, floor):
+    # Latest safe line boundary above floor, or 0. Lines are walked backwards
+    # counting quiet text lines in a row; the last line of the first run long
+    # enough begins the cut.
+    boundary = _line_start(text, len(text))
+    run = 0
+    latest = 0
+    while True:
+        end = text.find('\n', boundary)
+        line = text[boundary:] if end == -1 else text[boundary:end]
+        if line.strip():
+            if not _is_quiet(line):
+                run = 0
+            else:
+                if not run:
+                    latest = boundary
+                run += 1
+                if run > SAFE_CUT_LINES:
+                    break
+        if boundary == 0 or (boundary <= floor and (not run or latest <= floor)):
+            break
+        boundary = _line_start(text, boundary - 1)
+    return latest if run and latest > floor else 0
+
+
+def _noise_windows(lowered, hits):
+    # Character ranges running from the last safe cut before each hit to the
+    # first one after it, overlapping ranges merged. The hits come from one
+    # scan of the whole text, so only the lines they touch need marking as
+    # noisy; every other line just has its first and last words checked.
+    lines = lowered.split('\n')
+    starts = list(accumulate((len(line) + 1 for line in lines), initial=0))
+    has_text = [bool(line.strip()) for line in lines]
+    quiet = [filled and not _can_join(line) for line, filled in zip(lines, has_text)]
+    spans = []
+    for hit in hits:
+        first = bisect_right(starts, hit.start()) - 1
+        last = bisect_right(starts, hit.end() - 1) - 1
+        quiet[first:last + 1] = [False] * (last + 1 - first)
+        spans.append((first, last))
+
+    # safe[i]: the text can be cut just before line i
+    safe = []
+    run = SAFE_CUT_LINES
+    for filled, is_quiet in zip(has_text, quiet):
+        safe.append(is_quiet and run >= SAFE_CUT_LINES)
+        if is_quiet:
+            run += 1
+        elif filled:
+            run = 0
+
+    windows = []
+    for first, last in spans:
+        if windows and first < windows[-1][1]:
+            if last < windows[-1][1]:
+                continue
+            start = windows.pop()[0]
+        else:
+            start = first
+            while start > 0 and not safe[start]:
+                start -= 1
+        end = last + 1
+        while end < len(lines) and not safe[end]:
+            end += 1
+        windows.append((start, end))
+    length = starts[-1] - 1
+    return [(starts[start], min(starts[end], length)) for start, end in windows]
+
+
+def _strip_window(text, lowered):
+    for pattern, replacement in LOWERCASE_PASSES:
+        spans = [match.span() for match in pattern.finditer(lowered)]
+        if spans:
+            text = _cut_spans(text, spans, replacement)
+            lowered = _cut_spans(lowered, spans, replacement)
+    return text
+
+
+def _cut_spans(text, spans, replacement):
+    pieces = []
+    copied_to = 0
+    for start, end in spans:
+        pieces.append(text[copied_to:start])
+        pieces.append(replacement)
+        copied_to = end
+    pieces.append(text[copied_to:])
+    return ''.join(pieces)
+
+
+def strip_noise(text):
+    if FOLD_EXCEPTION_RE.search(text):
+        for pattern, replacement in IGNORECASE_PASSES:
+            text = pattern.sub(replacement, text)
+        return text
+
+    # One scan with the merged pattern finds the noise. The passes then run,
+    # one after another as before, over the window around each hit as if it
+    # were the whole text; everything between windows is copied as it is.
+    lowered = text.lower()
+    hits = list(ANY_NOISE_RE.finditer(lowered))
+    if not hits:
+        return text
+
+    pieces = []
+    copied_to = 0
+    for start, end in _noise_windows(lowered, hits):
+        pieces.append(text[copied_to:start])
+        pieces.append(_strip_window(text[start:end], lowered[start:end]))
+        copied_to = end
+    pieces.append(text[copied_to:])
+    return ''.join(pieces)
+
+
+def filter_line(line, skip_prefixes):
+    if DIGITS_RE.fullmatch(line) or len(line) < MIN_LINE_LENGTH or line.startswith(skip_prefixes):
+        return ""
+    return line
+
+
+def clean_text(text, skip_prefixes):
+    # Whitespace collapses to single spaces, so the result is a single line
+    return filter_line(' '.join(strip_noise(text).split()), skip_prefixes)
+
+
+def iter_clean_segments(pages, stats=None):
+    # Pages are joined with newlines and stripped, as extract_text_from_file
+    # does. Text is cleaned up to the last safe cut each time a page arrives,
+    # so only a few trailing lines are ever carried between pages.
+    if stats is None:
+        stats = {}
+    stats.setdefault('input_chars', 0)
+    stats.setdefault('clean_seconds', 0.0)
+
+    buffer = None
+    checked = 0
+    for page in pages:
+        if buffer is None:
+            buffer = page.lstrip()
+            if not buffer:
+                buffer = None
+                continue
+        else:
+            buffer = buffer + '\n' + page
+
+        # Boundaries at or before `checked` were already found unsafe
+        start_time = time.perf_counter()
+        cut = _last_safe_cut(buffer, checked)
+        if cut > 0:
+            segment = buffer[:cut]
+            buffer = buffer[cut:]
+            stats['input_chars'] += len(segment)
+            cleaned = ' '.join(strip_noise(segment).split())
+        checked = _line_start(buffer, len(buffer))
+        stats['clean_seconds'] += time.perf_counter() - start_time
+        if cut > 0:
+            yield cleaned
+
+    if buffer is not None:
+        start_time = time.perf_counter()
+        segment = buffer.rstrip()
+        stats['input_chars'] += len(segment)
+        cleaned = ' '.join(strip_noise(segment).split())
+        stats['clean_seconds'] += time.perf_counter() - start_time
+        yield cleaned
+
+
+def clean_pages(pages, skip_prefixes, stats=None):
+    line = ' '.join(segment for segment in iter_clean_segments(pages, stats) if segment)
+    return filter_line(line, skip_prefixes)
+
+
+def _clean_line(line, removed):
+    # '' for a blank line (a paragraph break), None for a line that only held noise
+    if FOLD_EXCEPTION_RE.search(line):
+        matches = LINE_NOISE_IGNORECASE_RE.finditer(line)
+    else:
+        matches = LINE_NOISE_RE.finditer(line.lower())
+    spans = [match.span() for match in matches]
+    if spans:
+        if removed is not None:
+            removed.extend(line[start:end] for start, end in spans)
+        line = ' '.join(_cut_spans(line, spans, '').split())
+        return line or None
+    return ' '.join(line.split())
+
+
+def _edge_indexes(lines):
+    # Short pages get a smaller zone so body lines are never all candidates
+    filled = [i for i, line in enumerate(lines) if line]
+    count = min(EDGE_LINES, len(filled) // 3)
+    return set(filled[:count] + filled[len(filled) - count:])
+
+
+def _repeat_key(line):
+    return DIGITS_RE.sub('#', line.lower())
+
+
+def _iter_page_lines(pages, removed, totals):
+    for page in pages:
+        start_time = time.perf_counter()
+        page = page.strip()
+        lines = [line for line in (_clean_line(line, removed) for line in page.split('\n')) if line is not None]
+        totals['pages'] += 1
+        totals['input_chars'] += len(page)
+        totals['clean_seconds'] += time.perf_counter() - start_time
+        yield lines
+
+
+def clean_structured(pages, skip_prefixes, stats=None, removed=None):
+    # Lines are filtered before anything is joined, so short headings, page
+    # numbers and headers/footers repeated across pages are dropped. Lines
+    # inside a paragraph are unwrapped; blank lines become paragraph breaks.
+    # Removed text is appended to `removed` when a list is passed.
+    if stats is None:
+        stats = {}
+    totals = {'pages': 0, 'input_chars': 0, 'clean_seconds': 0.0}
+    page_lines = _iter_page_lines(pages, removed, totals)
+    sample = list(islice(page_lines, REPEAT_SAMPLE_PAGES))
+
+    start_time = time.perf_counter()
+    seen_on = {}
+    for lines in sample:
+        for key in {_repeat_key(lines[i]) for i in _edge_indexes(lines)}:
+            seen_on[key] = seen_on.get(key, 0) + 1
+    threshold = max(REPEAT_MIN_PAGES, REPEAT_MIN_RATIO * len(sample))
+    repeated = {key for key, count in seen_on.items() if count >= threshold}
+    totals['clean_seconds'] += time.perf_counter() - start_time
+
+    paragraphs = []
+    current = []
+    removed_lines = 0
+    sentence_done = True
+    for lines in chain(sample, page_lines):
+        start_time = time.perf_counter()
+        edges = _edge_indexes(lines) if repeated else ()
+        for i, line in enumerate(lines):
+            if not line:
+                if current:
+                    paragraphs.append(' '.join(current))
+                    current = []
+                continue
+
+            ends_sentence = bool(SENTENCE_END_RE.search(line))
+            if (
+                (i in edges and _repeat_key(line) in repeated)
+                or PAGE_FURNITURE_RE.fullmatch(line)
+                or line.startswith(skip_prefixes)
+                # A short line that neither continues nor ends a sentence is a heading
+                or (len(line) < MIN_LINE_LENGTH and sentence_done and not ends_sentence)
+            ):
+                removed_lines += 1
+                if removed is not None:
+                    removed.append(line)
+                continue
+
+            current.append(line)
+            sentence_done = ends_sentence
+        totals['clean_seconds'] += time.perf_counter() - start_time
+    if current:
+        paragraphs.append(' '.join(current))
+
+    text = '\n\n'.join(paragraphs)
+    stats.update({
+        'pages': totals['pages'],
+        'input_chars': totals['input_chars'],
+        'output_chars': len(text),
+        'removed_chars': max(totals['input_chars'] - len(text), 0),
+        'removed_lines': removed_lines,
+        'repeated_lines': len(repeated),
+        'clean_seconds': totals['clean_seconds']
+    })
+    return text
@@ -0,0 +1,306 @@
+import re
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Attempts per provider for one text, retries permitting
+MAX_ATTEMPTS = 3
+
+# Each whitespace run, with the sentence-ending punctuation (and closing
+# quotes or brackets) before it, if any
+BOUNDARY_RE = re.compile(r'([.!?]+["\')\]]*)?(\s+)')
+LAST_WORD_RE = re.compile(r'(\S+)$')
+# Texts packed into one call are sent one per line, each behind its number
+# in brackets, which the providers pass through as they would a citation
+SEGMENT_NUMBER_RE = re.compile(r'\s*\[(\d+)\]\s*(.*)')
+# Words whose trailing period doesn't end a sentence, common in judgments
+ABBREVIATIONS = frozenset((
+    'v', 'vs', 'no', 'nos', 's', 'ss', 'sec', 'secs', 'art', 'arts', 'cl', 'r', 'o', 'para', 'paras',
+    'mr', 'mrs', 'ms', 'dr', 'hon', 'j', 'jj', 'cj', 'ltd', 'pvt', 'co', 'corp', 'inc', 'govt', 'dept',
+    'i.e', 'e.g', 'viz', 'etc', 'cf', 'ibid', 'vol', 'pp', 'p', 'rs', 'st', 'sr', 'jr', 'u.s', 'ors', 'anr'
+))
+
+
+class TranslationError(Exception):
+    pass
+
+
+def _is_sentence_end(text, start, match):
+    if '\n' in match.group(2):
+        return True
+    if not match.group(1):
+        return False
+    word = LAST_WORD_RE.search(text, start, match.start())
+    if word is not None:
+        word = word.group(1).lstrip('("\'[').lower()
+        if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+            return False
+    # A lowercase word after the period means it wasn't the end
+    return match.end() == len(text) or not text[match.end()].islower()
+
+
+def _pieces(sentence, max_chars):
+    # Sentences over max_chars are cut after the last "; " or ", " that fits,
+    # else at the last space, else mid-word
+    while len(sentence) > max_chars:
+        cut = max(sentence.rfind('; ', 0, max_chars), sentence.rfind(', ', 0, max_chars))
+        if cut > 0:
+            yield sentence[:cut + 1], ' '
+            sentence = sentence[cut + 2:]
+            continue
+        cut = sentence.rfind(' ', 0, max_chars)
+        if cut > 0:
+            yield sentence[:cut], ' '
+            sentence = sentence[cut + 1:]
+        else:
+            yield sentence[:max_chars], ''
+            sentence = sentence[max_chars:]
+    yield sentence, None
+
+
+def split_segments(text, max_chars=500):
+    # (segments, separators) for the stripped text: each segment is one
+    # sentence, or part of one over max_chars, followed by its separator
+    text = text.strip()
+    segments = []
+    separators = []
+
+    def append(sentence, separator):
+        for piece, piece_separator in _pieces(sentence, max_chars):
+            segments.append(piece)
+            separators.append(piece_separator if piece_separator is not None else separator)
+
+    start = 0
+    for match in BOUNDARY_RE.finditer(text):
+        if _is_sentence_end(text, start, match):
+            append(text[start:match.start(2)], match.group(2))
+            start = match.end()
+    if start < len(text):
+        append(text[start:], '')
+    return segments, separators
+
+
+def join_segments(segments, separators):
+    return ''.join(segment + separator for segment, separator in zip(segments, separators))
+
+
+# Retries shared by every text of one request, so a struggling provider costs
+# a bounded number of extra round-trips instead of a full set per chunk
+class RetryBudget:
+
+    def __init__(self, retries):
+        self._remaining = retries
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            return True
+
+
+def _mymemory(session, url, text, target_lang, timeout):
+    response = session.get(url, params={'q': text, 'langpair': f'en|{target_lang}'}, timeout=timeout)
+    if response.status_code != 200:
+        return None, response.status_code
+    data = response.json()
+    # Quota and language errors come back as HTTP 200 too, with a warning in
+    # place of the translation, so only responseStatus tells them apart
+    if data.get('quotaFinished'):
+        # The daily quota is used up: no retry will help, the next provider may
+        return None, 403
+    status = str(data.get('responseStatus'))
+    if status != '200':
+        return None, int(status) if status.isdigit() else 400
+    return (data.get('responseData') or {}).get('translatedText'), response.status_code
+
+
+def _libretranslate(session, url, text, target_lang, timeout):
+    response = session.post(url, json={'q': text, 'source': 'en', 'target': target_lang}, timeout=timeout)
+    if response.status_code != 200:
+        return None, response.status_code
+    return response.json().get('translatedText'), response.status_code
+
+
+PROVIDERS = {
+    'mymemory': _mymemory,
+    'libretranslate': _libretranslate
+}
+
+
+def _retryable(status):
+    # Rate limits, server errors and connection failures (status None)
+    return status is None or status == 429 or status >= 500
+
+
+def number_segments(texts):
+    return '\n'.join(f"[{number}] {text}" for number, text in enumerate(texts, 1))
+
+
+def unnumber_segments(translated, count):
+    # The translations in order, or None unless the reply holds exactly the
+    # lines [1] to [count], in that order
+    lines = [line for line in translated.split('\n') if line.strip()]
+    if len(lines) != count:
+        return None
+    results = []
+    for number, line in enumerate(lines, 1):
+        match = SEGMENT_NUMBER_RE.fullmatch(line)
+        if match is None or int(match.group(1)) != number:
+            return None
+        results.append(match.group(2).strip())
+    return results
+
+
+# Translates lists of texts concurrently through one keep-alive session.
+# Providers are tried in order for each call, each with its own cap on
+# calls in flight; results come back in input order. Texts found in the
+# translation memory, if given, never reach a provider. The others are
+# packed into calls of up to batch_chars, numbered line by line; a reply
+# whose numbers don't line up is translated again text by text.
+class TranslationClient:
+
+    def __init__(self, providers, memory=None, concurrency=4, retry_budget=4, backoff=0.5, timeout=15,
+                 batch_chars=500, observe_call=None):
+        # providers is a list of (name, url), name one of PROVIDERS;
+        # observe_call(name, seconds) is told the round-trip time of each call
+        self.providers = [(name, url, threading.BoundedSemaphore(concurrency)) for name, url in providers]
+        self.memory = memory
+        self.observe_call = observe_call
+        self.batch_chars = batch_chars
+        self.retry_budget = retry_budget
+        self.backoff = backoff
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency * len(providers), thread_name_prefix='translate'
+        )
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(providers), pool_maxsize=concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        self.calls = {name: 0 for name, _ in providers}
+        self.failures = {name: 0 for name, _ in providers}
+        self.retries = 0
+        self.batches = 0
+        self.batch_fallbacks = 0
+
+    def _call(self, name, url, semaphore, text, target_lang):
+        with semaphore:
+            with self._lock:
+                self.calls[name] += 1
+            start_time = time.perf_counter()
+            try:
+                return PROVIDERS[name](self._session, url, text, target_lang, self.timeout)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"{name} translation failed: {str(e)}")
+                return None, None
+            finally:
+                if self.observe_call is not None:
+                    self.observe_call(name, time.perf_counter() - start_time)
+
+    def _translate_one(self, text, target_lang, budget):
+        for name, url, semaphore in self.providers:
+            for attempt in range(MAX_ATTEMPTS):
+                translated, status = self._call(name, url, semaphore, text, target_lang)
+                if translated is not None:
+                    return translated
+                with self._lock:
+                    self.failures[name] += 1
+                if not _retryable(status) or attempt == MAX_ATTEMPTS - 1 or not budget.take():
+                    break
+                with self._lock:
+                    self.retries += 1
+                # Exponential backoff with jitter, so retried chunks don't return together
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+            logger.warning(f"{name} gave up on a {len(text)} char text, trying the next provider")
+        raise TranslationError('Translation failed - all services exhausted after retries')
+
+    def _translate_batch(self, texts, target_lang, budget):
+        if len(texts) == 1:
+            return [self._translate_one(texts[0], target_lang, budget)]
+
+        with self._lock:
+            self.batches += 1
+        results = unnumber_segments(self._translate_one(number_segments(texts), target_lang, budget), len(texts))
+        if results is not None and all(results):
+            return results
+        with self._lock:
+            self.batch_fallbacks += 1
+        logger.warning(f"Batch of {len(texts)} came back misnumbered, translating one by one")
+        return [self._translate_one(text, target_lang, budget) for text in texts]
+
+    def _batches(self, texts):
+        # Texts holding a line break would break the numbering, so go alone
+        batch = []
+        size = 0
+        for text in texts:
+            packed = len(number_segments([text]))
+            if batch and ('\n' in text or size + 1 + packed > self.batch_chars):
+                yield batch
+                batch = []
+                size = 0
+            batch.append(text)
+            size += packed + (1 if size else 0)
+            if '\n' in text:
+                yield batch
+                batch = []
+                size = 0
+        if batch:
+            yield batch
+
+    def translate_many(self, texts, target_lang):
+        budget = RetryBudget(self.retry_budget)
+        unique = list(dict.fromkeys(texts))
+        if self.memory is not None:
+            stored = self.memory.get_many(unique, target_lang)
+        else:
+            stored = [None] * len(unique)
+
+        results = {text: translated for text, translated in zip(unique, stored) if translated is not None}
+        missing = [text for text, translated in zip(unique, stored) if translated is None]
+        futures = [
+            (batch, self._executor.submit(self._translate_batch, batch, target_lang, budget))
+            for batch in self._batches(missing)
+        ]
+
+        # Every batch is waited for, so the ones that did translate are stored
+        # even when another fails; a failed one is never stored
+        error = None
+        translated = {}
+        for batch, future in futures:
+            try:
+                translated.update(zip(batch, future.result()))
+            except TranslationError as e:
+                error = e
+        if translated and self.memory is not None:
+            self.memory.put_many(list(translated), list(translated.values()), target_lang)
+        if error is not None:
+            raise error
+        results.update(translated)
+        return [results[text] for text in texts]
+
+    def translate(self, text, target_lang):
+        return self.translate_many([text], target_lang)[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "providers": [name for name, _, _ in self.providers],
+                "calls": dict(self.calls),
+                "failures": dict(self.failures),
+                "retries": self.retries,
+                "batches": self.batches,
+                "batch_fallbacks": self.batch_fallbacks,
+                "memory": self.memory.stats() if self.memory is not None else None
+            }
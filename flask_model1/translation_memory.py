@@ -0,0 +1,154 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_RE = re.compile(r'\s+')
+# Rows per "IN (...)" lookup, under SQLite's bound parameter limit
+LOOKUP_BATCH = 500
+
+
+def normalize_segment(text):
+    return WHITESPACE_RE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+# Translated sentences in one SQLite database shared by every worker and kept
+# across restarts, keyed by the normalized sentence and target language. Once
+# the stored text exceeds max_bytes the least recently used entries go.
+class TranslationMemory:
+
+    def __init__(self, path, max_bytes=32 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS segments (
+                key BLOB PRIMARY KEY,
+                translation TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS segments_used ON segments (used_at);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+            INSERT OR IGNORE INTO meta VALUES ('bytes', 0);
+        """)
+
+    @property
+    def _db(self):
+        # One connection per process: SQLite connections can't be used across
+        # a fork, and a preloading gunicorn master forks its workers
+        if self._connection_pid != os.getpid():
+            # Autocommit mode, transactions are opened explicitly
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _key(self, text, target_lang):
+        return hashlib.sha256(f"{target_lang}\0{normalize_segment(text)}".encode('utf-8')).digest()
+
+    def get_many(self, texts, target_lang):
+        # Translations for the texts, None where the memory has none
+        keys = [self._key(text, target_lang) for text in texts]
+        unique = list(set(keys))
+        found = {}
+        with self._lock:
+            try:
+                for start in range(0, len(unique), LOOKUP_BATCH):
+                    batch = unique[start:start + LOOKUP_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    found.update(self._db.execute(
+                        f'SELECT key, translation FROM segments WHERE key IN ({placeholders})', batch
+                    ))
+                    # Eviction is least-recently-used across workers
+                    hits = [key for key in batch if key in found]
+                    if hits:
+                        self._db.execute(
+                            f'UPDATE segments SET used_at = ? WHERE key IN ({",".join("?" * len(hits))})',
+                            [time.time()] + hits
+                        )
+            except sqlite3.Error as e:
+                logger.error(f"Error reading translation memory: {str(e)}")
+            results = [found.get(key) for key in keys]
+            self.hits += sum(1 for result in results if result is not None)
+            self.misses += sum(1 for result in results if result is None)
+        return results
+
+    def put_many(self, texts, translations, target_lang):
+        now = time.time()
+        rows = [
+            (self._key(text, target_lang), translation, len(text.encode('utf-8')) + len(translation.encode('utf-8')), now)
+            for text, translation in zip(texts, translations)
+        ]
+        if not rows:
+            return
+
+        with self._lock:
+            db = self._db
+            try:
+                db.execute('BEGIN IMMEDIATE')
+                added = 0
+                for row in rows:
+                    # Another worker may have stored the same sentence meanwhile
+                    if db.execute('INSERT OR IGNORE INTO segments VALUES (?, ?, ?, ?)', row).rowcount:
+                        added += row[2]
+                db.execute("UPDATE meta SET value = value + ? WHERE key = 'bytes'", (added,))
+                total = db.execute("SELECT value FROM meta WHERE key = 'bytes'").fetchone()[0]
+                if total > self.max_bytes:
+                    self._evict(total)
+                db.execute('COMMIT')
+            except sqlite3.Error as e:
+                logger.error(f"Error writing translation memory: {str(e)}")
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+
+    def _evict(self, total):
+        # Trim to 90% of the budget so we don't evict on every write; called
+        # inside the write transaction
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        while total > target:
+            rows = self._db.execute('SELECT key, bytes FROM segments ORDER BY used_at LIMIT 256').fetchall()
+            if not rows:
+                break
+            batch = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                batch.append(key)
+                total -= size
+            self._db.execute(f'DELETE FROM segments WHERE key IN ({",".join("?" * len(batch))})', batch)
+            removed += len(batch)
+        self._db.execute("UPDATE meta SET value = ? WHERE key = 'bytes'", (total,))
+        self.evictions += removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            try:
+                entries = self._db.execute('SELECT COUNT(*) FROM segments').fetchone()[0]
+                stored_bytes = self._db.execute("SELECT value FROM meta WHERE key = 'bytes'").fetchone()[0]
+            except sqlite3.Error:
+                entries = stored_bytes = None
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": stored_bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -1,16 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 import os
 import logging
 import random
+import time
+import gc
+import hmac
+import threading
+from functools import wraps
 from werkzeug.utils import secure_filename
-import PyPDF2
-import docx
+from extraction import iter_pdf_pages, iter_document_pages
+from preprocessing import clean_text, clean_pages, clean_structured
+from index_store import IndexStore, make_index_key
+from term_matcher import TermMatcher
+from embedding_batcher import BatchingEmbeddings
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from onnx_embeddings import OnnxEmbeddings
+from corpus_index import CorpusIndex
+from lexical_index import BM25Index, tokenize, citation_share
+from rate_limiter import RateLimiter
+from metrics import MetricsRegistry, CONTENT_TYPE, COUNT_BUCKETS, cache_lookups
 import re
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from collections import Counter
+import numpy as np
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -28,6 +41,11 @@ logger = logging.getLogger(__name__)
 
 # Configuration for file handling
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt'}
+# 'structured' filters line by line and drops repeated page headers/footers,
+# 'legacy' reproduces the old single-line output
+PREPROCESS_MODE = os.getenv('PREPROCESS_MODE', 'structured')
+# Cleaned text starting with these is dropped as boilerplate
+SKIP_PREFIXES = ('Sl', '©', 'Page', 'http')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 PREPROCESSED_FOLDER = os.path.join(BASE_DIR, 'preprocessed')
@@ -38,6 +56,79 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PREPROCESSED_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# 'torch' runs the model through sentence-transformers, 'onnx' through ONNX
+# Runtime with int8 weights (exported to processed/onnx on first load)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_ONNX_THREADS = int(os.getenv('EMBEDDING_ONNX_THREADS', 1))
+TEXT_CHUNK_SIZE = 1000
+TEXT_CHUNK_OVERLAP = 200
+
+# Built indexes are kept on disk (shared by workers, kept across restarts)
+# and the most recently used ones stay loaded in memory
+INDEX_STORE_MAX_BYTES = int(os.getenv('INDEX_STORE_MAX_BYTES', 512 * 1024 * 1024))
+INDEX_MEMORY_MAX_BYTES = int(os.getenv('INDEX_MEMORY_MAX_BYTES', 128 * 1024 * 1024))
+# Chunk and query texts from concurrent requests are embedded together:
+# up to EMBEDDING_MAX_BATCH texts per encoder pass, waiting at most
+# EMBEDDING_MAX_WAIT_MS for a batch to fill
+EMBEDDING_MAX_BATCH = int(os.getenv('EMBEDDING_MAX_BATCH', 32))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv('EMBEDDING_MAX_WAIT_MS', 10))
+
+# Chunk embeddings are cached by text hash across documents; float16 halves
+# the file at a precision loss well below what changes retrieval ranking
+EMBEDDING_CACHE_DTYPE = os.getenv('EMBEDDING_CACHE_DTYPE', 'float16')
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv('EMBEDDING_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# When the embeddings model is loaded and warmed (see gunicorn.conf.py):
+#   'background' - in a thread of each worker, which serves /health meanwhile
+#   'preload'    - in the gunicorn master, so workers fork with it loaded
+#   'lazy'       - on the first request that needs it
+# /health/ready answers 503 until it is warm, except in lazy mode
+MODEL_LOADING = os.getenv('MODEL_LOADING', 'background')
+WARMUP_TEXT = "The appeal is allowed and the judgment of the High Court is set aside."
+
+# /ask fuses the HYBRID_CANDIDATES best chunks by BM25 and by vector
+# similarity with reciprocal rank fusion. Questions in which at least
+# LEXICAL_ONLY_SHARE of the words are section numbers or citations are
+# answered from BM25 alone, without running the encoder.
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+LEXICAL_ONLY_SHARE = float(os.getenv('LEXICAL_ONLY_SHARE', 0.6))
+
+# What a chunk must score to count as relevant depends on how it was found.
+# Vector scores from the L2 indexes built here are squared distances, lower
+# for closer chunks: at most MAX_VECTOR_DISTANCE (a cosine similarity of 0.25
+# for the normalized embeddings). Inner products are held to the same cosine,
+# higher being better. BM25-only scores are relative to the best hit, which
+# scores 1.0: at least MIN_LEXICAL_SCORE.
+MAX_VECTOR_DISTANCE = float(os.getenv('MAX_VECTOR_DISTANCE', 1.5))
+MIN_LEXICAL_SCORE = float(os.getenv('MIN_LEXICAL_SCORE', 0.5))
+
+# Every uploaded document is also added to one corpus-wide index for
+# /corpus/search; past CORPUS_ANN_THRESHOLD chunks it switches from exact
+# search to an IVF index probing CORPUS_NPROBE lists per query. Past
+# CORPUS_MAX_CHUNKS chunks the oldest documents are dropped from it.
+CORPUS_ANN_THRESHOLD = int(os.getenv('CORPUS_ANN_THRESHOLD', 50000))
+CORPUS_NPROBE = int(os.getenv('CORPUS_NPROBE', 16))
+CORPUS_MAX_CHUNKS = int(os.getenv('CORPUS_MAX_CHUNKS', 200000))
+CORPUS_MAX_RESULTS = 20
+
+# Requests per minute and client, counted across workers in SQLite; 0 turns
+# a limit off. /corpus/search and listing the corpus count towards the /ask
+# limit, deleting from it towards the /upload one.
+RATE_LIMIT_UPLOAD = int(os.getenv('RATE_LIMIT_UPLOAD', 10))
+RATE_LIMIT_ASK = int(os.getenv('RATE_LIMIT_ASK', 30))
+# Header with the client address when behind a proxy, e.g. Fly-Client-IP
+RATE_LIMIT_CLIENT_HEADER = os.getenv('RATE_LIMIT_CLIENT_HEADER', '')
+
+# The corpus holds every user's documents and there are no user accounts, so
+# listing and deleting its documents is off unless CORPUS_ADMIN_TOKEN is set,
+# and then takes "Authorization: Bearer <token>"
+CORPUS_ADMIN_TOKEN = os.getenv('CORPUS_ADMIN_TOKEN', '')
+
+# Document ids handed out by /upload are index store keys
+DOCUMENT_ID_RE = re.compile(r'[0-9a-f]{64}')
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['PREPROCESSED_FOLDER'] = PREPROCESSED_FOLDER
 app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
@@ -623,23 +714,144 @@ IRRELEVANT_RESPONSES = [
     "I can only answer questions about the legal judgment document."
 ]
 
+# Matches every legal term in one pass over the text
+legal_term_matcher = TermMatcher(LEGAL_TERMS)
+MIN_LEGAL_TERM_WEIGHT = 2
+
 # Lazy-load embeddings model
 embeddings = None
-vectorstore_cache = {}
+embedding_batcher = None
+embeddings_warm = False
+embeddings_lock = threading.RLock()
+embedding_cache = EmbeddingCache(
+    os.path.join(PROCESSED_FOLDER, 'embeddings'),
+    f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}",
+    dtype=EMBEDDING_CACHE_DTYPE,
+    max_bytes=EMBEDDING_CACHE_MAX_BYTES
+)
+index_store = IndexStore(
+    os.path.join(PROCESSED_FOLDER, 'indexes'),
+    max_bytes=INDEX_STORE_MAX_BYTES,
+    memory_bytes=INDEX_MEMORY_MAX_BYTES
+)
+corpus_index = CorpusIndex(
+    os.path.join(PROCESSED_FOLDER, 'corpus'),
+    f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}",
+    ann_threshold=CORPUS_ANN_THRESHOLD,
+    nprobe=CORPUS_NPROBE,
+    max_chunks=CORPUS_MAX_CHUNKS
+)
+# Lookups answered by BM25 alone and by the fused ranking
+retrieval_counts = Counter()
+rate_limiter = RateLimiter(os.path.join(PROCESSED_FOLDER, 'rate_limits.db'), window=60)
+
+# Served at /metrics in the Prometheus text format. Stage timings are
+# recorded as requests run; cache, queue and model figures are read from
+# the objects above when scraped.
+metrics = MetricsRegistry()
+metrics.add_process_metrics()
+stage_seconds = metrics.histogram(
+    'pipeline_stage_seconds', 'Time spent in each pipeline stage, per call.', ['stage']
+)
+request_seconds = metrics.histogram('request_seconds', 'Request handling time by endpoint.', ['endpoint'])
+request_chunks = metrics.histogram(
+    'request_chunks', 'Chunks per indexed document.', buckets=COUNT_BUCKETS
+)
+request_tokens = metrics.histogram(
+    'request_tokens', 'Word tokens (as BM25 counts them) per indexed document.', buckets=COUNT_BUCKETS
+)
+metrics.collected(
+    'cache_lookups_total', 'Cache lookups by cache and result.', 'counter',
+    lambda: cache_lookups({'embedding': embedding_cache, 'index': index_store}),
+    ['cache', 'result']
+)
+metrics.collected(
+    'queue_depth', 'Texts waiting to be embedded.', 'gauge',
+    lambda: {('embedding_batches',): embedding_batcher.stats()['pending'] if embedding_batcher is not None else 0},
+    ['queue']
+)
+metrics.collected(
+    'retrievals_total', 'Per-document lookups by retrieval mode.', 'counter',
+    lambda: {(mode,): count for mode, count in retrieval_counts.items()},
+    ['mode']
+)
+metrics.collected(
+    'model_loaded', 'Whether the model is loaded in this process.', 'gauge',
+    lambda: {(EMBEDDING_MODEL_NAME,): int(embeddings is not None)},
+    ['model']
+)
 
 def load_embeddings():
-    global embeddings
-    if embeddings is None:
-        logger.info("⏳ Loading embeddings model...")
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={
-                'normalize_embeddings': True,
-                'batch_size': 4
-            }
-        )
-        logger.info("✅ Embeddings model loaded successfully!")
+    global embeddings, embedding_batcher
+    # Requests arriving during a background load and warm-up wait here
+    with embeddings_lock:
+        if embeddings is None:
+            logger.info(f"⏳ Loading embeddings model ({EMBEDDING_BACKEND} backend)...")
+            if EMBEDDING_BACKEND == 'onnx':
+                encoder = OnnxEmbeddings(
+                    EMBEDDING_MODEL_NAME,
+                    os.path.join(PROCESSED_FOLDER, 'onnx', EMBEDDING_MODEL_NAME.replace('/', '--')),
+                    threads=EMBEDDING_ONNX_THREADS
+                )
+            else:
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+
+                encoder = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL_NAME,
+                    model_kwargs={'device': 'cpu'},
+                    encode_kwargs={
+                        'normalize_embeddings': True,
+                        'batch_size': EMBEDDING_MAX_BATCH
+                    }
+                )
+            embedding_batcher = BatchingEmbeddings(
+                encoder,
+                max_batch_size=EMBEDDING_MAX_BATCH,
+                max_wait=EMBEDDING_MAX_WAIT_MS / 1000
+            )
+            embeddings = CachedEmbeddings(embedding_batcher, embedding_cache)
+            logger.info("✅ Embeddings model loaded successfully!")
+
+def warm_up_embeddings(single_threaded=False):
+    # The warm-up encode goes to the encoder directly, so the batcher thread
+    # isn't started in a process that is about to fork. Requests wait on the
+    # lock until it's done.
+    global embeddings_warm
+    with embeddings_lock:
+        load_embeddings()
+        start_time = time.time()
+        if EMBEDDING_BACKEND == 'onnx' or not single_threaded:
+            embedding_batcher.embeddings.embed_query(WARMUP_TEXT)
+        else:
+            import torch
+            threads = torch.get_num_threads()
+            torch.set_num_threads(1)
+            embedding_batcher.embeddings.embed_query(WARMUP_TEXT)
+            torch.set_num_threads(threads)
+        embeddings_warm = True
+    logger.info(f"Embeddings model warmed up in {time.time() - start_time:.2f}s")
+
+def preload_models():
+    # Runs in the gunicorn master. The warm-up encode is single-threaded:
+    # OpenMP threads started before the fork would be missing in the workers.
+    warm_up_embeddings(single_threaded=True)
+
+    # Objects that exist now are never collected; keeping the collector off
+    # them stops it writing to their pages, so they stay shared with workers
+    gc.collect()
+    gc.freeze()
+
+def start_background_load():
+    def run():
+        try:
+            warm_up_embeddings()
+        except Exception as e:
+            logger.error(f"Background embeddings load failed: {str(e)}")
+
+    threading.Thread(target=run, name='embeddings-loader', daemon=True).start()
+
+def is_ready():
+    return embeddings_warm or MODEL_LOADING == 'lazy'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -648,42 +860,7 @@ def preprocess_text(text):
     try:
         if not text or not isinstance(text, str):
             return ""
-            
-        text = re.sub(r'Page\s*\d+\s*of\s*\d+', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'\n\d+\n', '\n', text)
-        
-        noise_patterns = [
-            r'This\s+document\s+was\s+signed\s+electronically.*',
-            r'Electronic\s+signature.*',
-            r'IN\s+THE\s+(?:SUPREME\s+)?COURT\s+OF\s+.*\n',
-            r'CASE\s+NO[.:].*\n',
-            r'BEFORE[.:].*\n',
-            r'JUDGMENT\s+RESERVED\s+ON[.:].*\n',
-            r'PRESENT[.:].*\n'
-        ]
-        
-        for pattern in noise_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
-        
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            if (re.fullmatch(r'\d+', line) or 
-                len(line) < 25 or 
-                line.startswith(('Sl', '©', 'Page', 'http'))):
-                continue
-                
-            cleaned_lines.append(line)
-        
-        return '\n\n'.join(cleaned_lines) or ""
+        return clean_text(text, SKIP_PREFIXES)
     except Exception as e:
         logger.error(f"Error in preprocessing: {str(e)}")
         return text if isinstance(text, str) else ""
@@ -696,32 +873,37 @@ def get_processed_path(filename):
     processed_filename = get_processed_filename(filename)
     return os.path.normpath(os.path.join(app.config['PROCESSED_FOLDER'], processed_filename))
 
-def extract_text_from_file(filepath, filename):
+def extract_clean_text(filepath, filename, stats):
+    # stats gets input_chars (0 for an empty document) and clean_seconds;
+    # in legacy mode PDF pages are cleaned as they are extracted
+    start_time = time.time()
     try:
         ext = os.path.splitext(filename)[1].lower()
         
-        if ext == '.pdf':
-            with open(filepath, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ""
-                for page in reader.pages:
-                    page_text = page.extract_text() or ""
-                    text += page_text + "\n"
-            return text.strip()
-        
-        elif ext in ['.doc', '.docx']:
-            doc = docx.Document(filepath)
-            return "\n".join(para.text for para in doc.paragraphs if para.text)
+        if PREPROCESS_MODE == 'structured':
+            if ext == '.pdf':
+                pages = iter_pdf_pages(filepath)
+            else:
+                pages = ["\n".join(iter_document_pages(filepath, filename))]
+            return clean_structured(pages, SKIP_PREFIXES, stats)
         
-        elif ext == '.txt':
-            with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
-                return f.read()
+        if ext == '.pdf':
+            return clean_pages(iter_pdf_pages(filepath), SKIP_PREFIXES, stats)
         
-        raise ValueError(f"Unsupported file type: {ext}")
+        raw_text = "\n".join(iter_document_pages(filepath, filename))
+        start_time = time.time()
+        cleaned_text = preprocess_text(raw_text)
+        stats['input_chars'] = len(raw_text.strip())
+        stats['clean_seconds'] = time.time() - start_time
+        return cleaned_text
     
     except Exception as e:
         logger.error(f"Extraction failed for {filename}: {str(e)}")
         raise
+    finally:
+        if 'clean_seconds' in stats:
+            stage_seconds.observe(time.time() - start_time - stats['clean_seconds'], stage='extraction')
+            stage_seconds.observe(stats['clean_seconds'], stage='preprocessing')
 
 def create_vector_store(text, filename):
     try:
@@ -740,29 +922,144 @@ def create_vector_store(text, filename):
         
         with open(processed_path, 'r', encoding='utf-8') as f:
             text = f.read()
-        documents = [Document(page_content=text, metadata={"source": processed_path})]
+        from langchain_community.vectorstores import FAISS
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        documents = [Document(page_content=text, metadata={"source": processed_path, "filename": filename})]
         
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=TEXT_CHUNK_SIZE,
+            chunk_overlap=TEXT_CHUNK_OVERLAP,
             separators=["\n\n", "\n", " ", ""]
         )
-        chunks = text_splitter.split_documents(documents)
+        with stage_seconds.time(stage='chunking'):
+            chunks = text_splitter.split_documents(documents)
+            # Legal-term flags are stored with the chunks, so /ask doesn't rescan them
+            for chunk in chunks:
+                terms = legal_term_matcher.find(chunk.page_content)
+                chunk.metadata['legal_terms'] = sorted(terms)
+                chunk.metadata['has_legal_terms'] = legal_term_matcher.weight(terms) >= MIN_LEGAL_TERM_WEIGHT
         
-        vectorstore = FAISS.from_documents(chunks, embeddings)
+        # Adding the vectors to a flat index is negligible next to embedding them
+        with stage_seconds.time(stage='embedding'):
+            vectorstore = FAISS.from_documents(chunks, embeddings)
+        # Kept with the vectors and persisted with them by the index store
+        vectorstore.lexical_index = BM25Index.from_texts([chunk.page_content for chunk in chunks])
+        request_chunks.observe(len(chunks))
+        request_tokens.observe(sum(vectorstore.lexical_index.lengths))
         return vectorstore, None
     except Exception as e:
         logger.error(f"Error in create_vector_store: {str(e)}")
         return None, str(e)
 
+def index_params():
+    return {
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "chunk_size": TEXT_CHUNK_SIZE,
+        "chunk_overlap": TEXT_CHUNK_OVERLAP,
+        "preprocess_mode": PREPROCESS_MODE
+    }
+
+def chunk_at(vectorstore, position):
+    return vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+
+def add_to_corpus(key, filename, vectorstore):
+    # The per-document index already holds the chunk vectors; a failure here
+    # leaves the document usable through /ask, so it's only logged
+    if corpus_index.contains(key):
+        return
+    try:
+        count = vectorstore.index.ntotal
+        documents = [chunk_at(vectorstore, i) for i in range(count)]
+        corpus_index.add_document(key, filename, documents, vectorstore.index.reconstruct_n(0, count))
+    except Exception as e:
+        logger.error(f"Error adding {filename} to the corpus index: {str(e)}")
+
+def document_key(file):
+    key = make_index_key(file.stream, index_params())
+    file.stream.seek(0)
+    return key
+
+def lexical_index_for(vectorstore):
+    lexical = getattr(vectorstore, 'lexical_index', None)
+    if lexical is None:
+        lexical = BM25Index.from_texts([
+            chunk_at(vectorstore, i).page_content for i in range(vectorstore.index.ntotal)
+        ])
+        vectorstore.lexical_index = lexical
+    return lexical
+
+def vector_score(index, query, position):
+    # The score FAISS would have returned for one chunk: squared L2 distance,
+    # or the inner product for inner-product indexes
+    import faiss
+
+    vector = index.reconstruct(position)
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        return float(vector @ query)
+    return float(((vector - query) ** 2).sum())
+
+def retrieve(vectorstore, question, k=5):
+    # The score mode and the k best (chunk, score) pairs. Scores are the
+    # vector scores of the fused chunks ('l2' or 'inner_product', after the
+    # index metric), or BM25 relative to the best hit for lexical-only
+    # lookups ('lexical'); score_passes knows which way each one runs.
+    import faiss
+
+    tokens = tokenize(question)
+    lexical = lexical_index_for(vectorstore)
+    with stage_seconds.time(stage='lexical_search'):
+        lexical_hits = lexical.search(tokens, HYBRID_CANDIDATES)
+    if lexical_hits and citation_share(tokens) >= LEXICAL_ONLY_SHARE:
+        retrieval_counts['lexical'] += 1
+        best = lexical_hits[0][1]
+        return 'lexical', [(chunk_at(vectorstore, position), score / best) for position, score in lexical_hits[:k]]
+
+    retrieval_counts['hybrid'] += 1
+    with stage_seconds.time(stage='embedding'):
+        query = np.asarray([embeddings.embed_query(question)], dtype=np.float32)
+    with stage_seconds.time(stage='faiss_search'):
+        scores, positions = vectorstore.index.search(query, min(HYBRID_CANDIDATES, vectorstore.index.ntotal))
+    vector_hits = [(int(position), float(score)) for position, score in zip(positions[0], scores[0]) if position >= 0]
+
+    fused = {}
+    for hits in (vector_hits, lexical_hits):
+        for rank, (position, _) in enumerate(hits):
+            fused[position] = fused.get(position, 0.0) + 1 / (RRF_K + rank + 1)
+
+    vector_scores = dict(vector_hits)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:k]
+    mode = 'inner_product' if vectorstore.index.metric_type == faiss.METRIC_INNER_PRODUCT else 'l2'
+    return mode, [
+        (chunk_at(vectorstore, position),
+         vector_scores[position] if position in vector_scores else vector_score(vectorstore.index, query[0], position))
+        for position in ranked
+    ]
+
+def score_passes(mode, score):
+    if mode == 'lexical':
+        return score >= MIN_LEXICAL_SCORE
+    if mode == 'inner_product':
+        # For normalized vectors, squared distance = 2 - 2 * inner product
+        return score >= 1 - MAX_VECTOR_DISTANCE / 2
+    # Squared L2 distance: lower is closer
+    return score <= MAX_VECTOR_DISTANCE
+
 def contains_legal_terms(text):
     if not text:
         return False
-    text_lower = text.lower()
-    return sum(term in text_lower for term in LEGAL_TERMS) >= 2
+    return legal_term_matcher.weight(legal_term_matcher.find(text)) >= MIN_LEGAL_TERM_WEIGHT
 
-def is_relevant_response(query, docs_and_scores):
-    if not docs_and_scores or not any(score >= 0.8 for _, score in docs_and_scores):
+def chunk_has_legal_terms(doc):
+    # Indexes built before the flags were stored are scanned on the fly
+    flag = doc.metadata.get('has_legal_terms')
+    if flag is None:
+        return contains_legal_terms(doc.page_content)
+    return flag
+
+def is_relevant_response(query, mode, docs_and_scores):
+    if not docs_and_scores or not any(score_passes(mode, score) for _, score in docs_and_scores):
         return False
 
     query_lower = query.lower()
@@ -770,29 +1067,106 @@ def is_relevant_response(query, docs_and_scores):
             any(word in query_lower for word in ['who', 'what', 'when', 'where', 'why', 'how', 'explain'])):
         return False
 
-    for doc, _ in docs_and_scores:
-        if contains_legal_terms(doc.page_content) and contains_legal_terms(query):
-            return True
-    return False
+    query_terms = legal_term_matcher.find(query)
+    logger.debug(f"Legal terms in query: {sorted(query_terms)}")
+    if legal_term_matcher.weight(query_terms) < MIN_LEGAL_TERM_WEIGHT:
+        return False
+    return any(chunk_has_legal_terms(doc) for doc, _ in docs_and_scores)
 
 def format_answer(doc, score):
     content = doc.page_content
     return {
         "content": content,
-        "score": float(score)
+        "score": float(score),
+        "legal_terms": doc.metadata.get('legal_terms', [])
     }
 
+def client_address():
+    if RATE_LIMIT_CLIENT_HEADER:
+        forwarded = request.headers.get(RATE_LIMIT_CLIENT_HEADER)
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr
+
+def rate_limited(scope, limit):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            ip = client_address()
+            allowed, retry_after = rate_limiter.hit(scope, ip, limit)
+            if not allowed:
+                logger.warning(f"Rate limit exceeded for IP: {ip} ({scope})")
+                response = jsonify({
+                    "error": "Rate limit exceeded",
+                    "message": f"Limit is {limit} requests per minute.",
+                    "retry_after": retry_after,
+                    "status": "error"
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def corpus_admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not CORPUS_ADMIN_TOKEN:
+            return jsonify({"error": "Not found", "status": "error"}), 404
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(token.encode('utf-8'), CORPUS_ADMIN_TOKEN.encode('utf-8')):
+            logger.warning(f"Corpus administration refused for IP: {client_address()}")
+            return jsonify({"error": "Unauthorized", "status": "error"}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Only matched routes, so unknown paths can't add label values
+    if request.url_rule is not None and 'request_start' in g:
+        request_seconds.observe(time.perf_counter() - g.request_start, endpoint=request.url_rule.rule)
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         "status": "healthy",
         "embeddings_loaded": embeddings is not None,
-        "device": "cpu"
+        "ready": is_ready(),
+        "device": "cpu",
+        "embedding_backend": EMBEDDING_BACKEND,
+        "index_store": index_store.stats(),
+        "legal_terms": legal_term_matcher.stats(),
+        "embedding_batches": embedding_batcher.stats() if embedding_batcher is not None else None,
+        "embedding_cache": embedding_cache.stats(),
+        "corpus": corpus_index.stats(),
+        "retrieval": dict(retrieval_counts),
+        "rate_limits": rate_limiter.stats()
     })
 
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    return jsonify({"status": "alive"})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    # Only warm instances should receive traffic
+    if not is_ready():
+        return jsonify({"status": "loading"}), 503
+    return jsonify({"status": "ready"})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
 @app.route('/upload', methods=['POST'])
+@rate_limited('upload', RATE_LIMIT_UPLOAD)
 def upload_document():
-    if embeddings is None:
+    if not embeddings_warm:
         try:
             load_embeddings()
         except Exception as e:
@@ -811,30 +1185,46 @@ def upload_document():
             "status": "error"
         }), 400
     
+    filename = secure_filename(file.filename)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    
     try:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        key = document_key(file)
+        vectorstore = index_store.get(key, embeddings)
+        if vectorstore is not None:
+            logger.info(f"Index for {filename} loaded from store ({key[:12]})")
+            add_to_corpus(key, filename, vectorstore)
+            return jsonify({
+                "message": "Document processed successfully",
+                "filename": filename,
+                "document_id": key,
+                "status": "success"
+            })
         
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        file.save(filepath)
+        with stage_seconds.time(stage='file_save'):
+            file.save(filepath)
         
-        raw_text = extract_text_from_file(filepath, filename)
-        if not raw_text:
+        stats = {}
+        cleaned_text = extract_clean_text(filepath, filename, stats)
+        if not stats['input_chars']:
             return jsonify({
                 "error": "Could not extract text from document",
                 "status": "error"
             }), 400
+        logger.info(f"Preprocessing removed {stats['input_chars'] - len(cleaned_text)} chars from {filename}")
             
-        cleaned_text = preprocess_text(raw_text)
         vectorstore, error = create_vector_store(cleaned_text, filename)
         if error:
             return jsonify({"error": error, "status": "error"}), 500
         
-        vectorstore_cache[filename] = vectorstore
+        index_store.set(key, vectorstore)
+        add_to_corpus(key, filename, vectorstore)
         
         return jsonify({
             "message": "Document processed successfully",
             "filename": filename,
+            "document_id": key,
             "status": "success"
         })
     except Exception as e:
@@ -852,78 +1242,108 @@ def upload_document():
                 logger.error(f"Error removing file {filepath}: {str(e)}")
 
 @app.route('/ask', methods=['POST'])
+@rate_limited('ask', RATE_LIMIT_ASK)
 def ask_question():
     try:
         # Ensure embeddings are loaded before proceeding
-        if embeddings is None:
+        if not embeddings_warm:
             try:
                 load_embeddings()
             except Exception as e:
                 return jsonify({"error": "Embeddings model failed to load", "status": "error"}), 503
 
-        if 'file' not in request.files:
+        # Either a document_id from /upload or the file itself
+        document_id = request.form.get('document_id', '').strip()
+        file = request.files.get('file')
+        question = request.form.get('question', '').strip()
+
+        if not document_id and file is None:
             return jsonify({
-                "error": "Missing file",
+                "error": "Missing file or document_id",
                 "status": "error"
             }), 400
 
-        file = request.files['file']
-        question = request.form.get('question', '').strip()
-
-        if not file or file.filename == '':
+        if not document_id and file.filename == '':
             return jsonify({"error": "No file selected", "status": "error"}), 400
 
+        if document_id and not DOCUMENT_ID_RE.fullmatch(document_id):
+            return jsonify({"error": "Invalid document_id", "status": "error"}), 400
+
         if len(question.split()) < 3:
             return jsonify({
                 "error": "Please ask a more detailed question (minimum 3 words)",
                 "status": "success"
             }), 200
 
-        filename = secure_filename(file.filename)
-        vectorstore = vectorstore_cache.get(filename)
+        vectorstore = None
+        filename = None
+        if document_id:
+            key = document_id
+            vectorstore = index_store.get(key, embeddings)
+            if vectorstore is None and (file is None or file.filename == ''):
+                # Unknown or evicted, the client has to upload the file again
+                return jsonify({
+                    "error": "Document not found, please upload it again",
+                    "code": "document_not_found",
+                    "document_id": document_id,
+                    "status": "error"
+                }), 404
+
+        if vectorstore is None:
+            filename = secure_filename(file.filename)
+            key = document_key(file)
+            vectorstore = index_store.get(key, embeddings)
         
         if vectorstore is None:
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            with stage_seconds.time(stage='file_save'):
+                file.save(filepath)
 
-            raw_text = extract_text_from_file(filepath, filename)
-            if not raw_text:
+            stats = {}
+            cleaned_text = extract_clean_text(filepath, filename, stats)
+            if not stats['input_chars']:
                 return jsonify({
                     "error": "Could not extract text from document",
                     "status": "error"
                 }), 400
+            logger.info(f"Preprocessing removed {stats['input_chars'] - len(cleaned_text)} chars from {filename}")
 
-            cleaned_text = preprocess_text(raw_text)
             vectorstore, error = create_vector_store(cleaned_text, filename)
             if error:
                 return jsonify({"error": error, "status": "error"}), 500
             
-            vectorstore_cache[filename] = vectorstore  # Cache the vectorstore
+            index_store.set(key, vectorstore)
             
             if os.path.exists(filepath):
                 os.remove(filepath)
 
-        docs_and_scores = vectorstore.similarity_search_with_score(question, k=5)
+        mode, docs_and_scores = retrieve(vectorstore, question, k=5)
+        if filename is None and docs_and_scores:
+            filename = docs_and_scores[0][0].metadata.get('filename')
         
-        if not is_relevant_response(question, docs_and_scores):
+        if not is_relevant_response(question, mode, docs_and_scores):
             return jsonify({
                 "answer": random.choice(IRRELEVANT_RESPONSES),
                 "sections": [],
                 "isRelevant": False,
                 "filename": filename,
+                "document_id": key,
+                "retrieval": mode,
                 "status": "success"
             })
         
         relevant_sections = []
         for doc, score in docs_and_scores:
-            if score >= 0.8 and contains_legal_terms(doc.page_content):
+            if score_passes(mode, score) and chunk_has_legal_terms(doc):
                 relevant_sections.append(format_answer(doc, score))
 
         return jsonify({
             "answer": "Here are the relevant sections from the document:",
             "sections": relevant_sections,
             "filename": filename,
+            "document_id": key,
             "isRelevant": True,
+            "retrieval": mode,
             "status": "success"
         })
     except Exception as e:
@@ -934,6 +1354,88 @@ def ask_question():
             "status": "error"
         }), 500
 
+@app.route('/corpus/search', methods=['POST'])
+@rate_limited('ask', RATE_LIMIT_ASK)
+def search_corpus():
+    try:
+        if not embeddings_warm:
+            try:
+                load_embeddings()
+            except Exception as e:
+                return jsonify({"error": "Embeddings model failed to load", "status": "error"}), 503
+
+        question = request.form.get('question', '').strip()
+        if not question:
+            return jsonify({"error": "Missing question", "status": "error"}), 400
+        try:
+            k = min(int(request.form.get('k', 5)), CORPUS_MAX_RESULTS)
+            chunks_per_document = int(request.form.get('chunks_per_document', 3))
+        except ValueError:
+            return jsonify({"error": "k and chunks_per_document must be integers", "status": "error"}), 400
+        if k < 1 or chunks_per_document < 1:
+            return jsonify({"error": "k and chunks_per_document must be positive", "status": "error"}), 400
+
+        start_time = time.time()
+        with stage_seconds.time(stage='embedding'):
+            query = embeddings.embed_query(question)
+        # The FAISS search over the whole corpus, and fetching the chunks it found
+        with stage_seconds.time(stage='corpus_search'):
+            groups = corpus_index.search(query, k, chunks_per_document)
+        logger.info(f"Corpus search returned {len(groups)} documents in {time.time() - start_time:.3f}s")
+
+        return jsonify({
+            "results": [
+                {
+                    "document_id": group['document_id'],
+                    "filename": group['filename'],
+                    "score": group['score'],
+                    "sections": [format_answer(doc, score) for doc, score in group['chunks']]
+                }
+                for group in groups
+            ],
+            "status": "success"
+        })
+    except Exception as e:
+        logger.error(f"Error searching corpus: {str(e)}")
+        return jsonify({
+            "error": "Failed to search corpus",
+            "details": str(e),
+            "status": "error"
+        }), 500
+
+@app.route('/corpus/documents', methods=['GET'])
+@rate_limited('ask', RATE_LIMIT_ASK)
+@corpus_admin_required
+def list_corpus_documents():
+    return jsonify({"documents": corpus_index.documents(), "status": "success"})
+
+@app.route('/corpus/documents/<document_id>', methods=['DELETE'])
+@rate_limited('upload', RATE_LIMIT_UPLOAD)
+@corpus_admin_required
+def delete_corpus_document(document_id):
+    if not DOCUMENT_ID_RE.fullmatch(document_id):
+        return jsonify({"error": "Invalid document_id", "status": "error"}), 400
+    try:
+        if not corpus_index.delete_document(document_id):
+            return jsonify({
+                "error": "Document not found",
+                "code": "document_not_found",
+                "document_id": document_id,
+                "status": "error"
+            }), 404
+    except Exception as e:
+        logger.error(f"Error deleting {document_id} from the corpus index: {str(e)}")
+        return jsonify({
+            "error": "Failed to delete document",
+            "details": str(e),
+            "status": "error"
+        }), 500
+    return jsonify({"document_id": document_id, "status": "success"})
+
 if __name__ == '__main__':
+    if MODEL_LOADING == 'preload':
+        preload_models()
+    elif MODEL_LOADING == 'background':
+        start_background_load()
     port = int(os.environ.get('PORT', 8001))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,467 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+DATABASE_FILE = 'corpus.db'
+SNAPSHOT_FILE = 'index.npz'
+# An IVF index is retrained once the corpus is this many times its training size
+RETRAIN_GROWTH = 4
+# Changes between two snapshots of the index on disk
+SNAPSHOT_EVERY = 50
+# Rows per "IN (...)" lookup, under SQLite's bound parameter limit
+LOOKUP_BATCH = 500
+
+
+# Chunks of every uploaded document in one index, searchable across the
+# corpus. Chunk text, metadata and vectors are stored in SQLite; the FAISS
+# index over them is held in memory by each process. Writers are serialized
+# by the database, and other processes notice their changes through a
+# generation counter, then add and remove the chunks that differ. A snapshot
+# of the index on disk, written every SNAPSHOT_EVERY changes, saves a
+# process starting up from rebuilding it. Search is exact up to
+# ann_threshold chunks and goes through an IVF index with 8-bit scalar
+# quantization past it; training it, and retraining it as the corpus grows,
+# happens in a background thread while the old index keeps serving. Past
+# max_chunks the oldest documents are dropped.
+class CorpusIndex:
+
+    def __init__(self, directory, model_id, ann_threshold=50000, nprobe=16, max_chunks=200000):
+        self.model_id = model_id
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self.max_chunks = max_chunks
+        self.directory = os.path.join(directory, hashlib.sha256(model_id.encode('utf-8')).hexdigest()[:16])
+        self._snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        self._lock = threading.Lock()
+        self._index = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._generation = None
+        self._trained_size = None
+        self._rebuilding = False
+        self.searches = 0
+        self.rebuilds = 0
+        self.snapshots = 0
+        self.evictions = 0
+        self._connection = None
+        self._connection_pid = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                document_id TEXT PRIMARY KEY,
+                filename TEXT,
+                chunks INTEGER,
+                added_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id TEXT NOT NULL,
+                position INTEGER,
+                text TEXT,
+                metadata TEXT,
+                vector BLOB
+            );
+            CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+            INSERT OR IGNORE INTO meta VALUES ('generation', 0);
+            INSERT OR IGNORE INTO meta VALUES ('snapshot_generation', 0);
+        """)
+
+    @property
+    def _db(self):
+        # One connection per process: SQLite connections can't be used across
+        # a fork, and a preloading gunicorn master forks its workers
+        if self._connection_pid != os.getpid():
+            # Autocommit mode, transactions are opened explicitly
+            self._connection = sqlite3.connect(
+                os.path.join(self.directory, DATABASE_FILE), check_same_thread=False, isolation_level=None
+            )
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _meta(self, key):
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _sync(self):
+        # Brings the in-memory index up to the database; called with the lock held
+        generation = self._meta('generation')
+        if generation == self._generation:
+            return
+        if self._index is None and not self._read_snapshot():
+            self._rebuild()
+        else:
+            self._catch_up()
+        self._generation = generation
+
+    def _read_snapshot(self):
+        # Any snapshot will do, however old: _catch_up brings it up to date
+        import faiss
+
+        try:
+            with np.load(self._snapshot_path) as snapshot:
+                index = faiss.deserialize_index(snapshot['index'])
+                ids = snapshot['ids']
+                trained_size = int(snapshot['trained_size'])
+        except (OSError, ValueError, KeyError, RuntimeError):
+            return False
+
+        self._index = index
+        self._ids = ids
+        self._trained_size = trained_size if trained_size >= 0 else None
+        self._configure()
+        return True
+
+    def _catch_up(self):
+        # Adds the chunks written and removes the ones deleted since the
+        # in-memory index was last in step, by comparing chunk ids
+        ids = np.array([row[0] for row in self._db.execute('SELECT id FROM chunks ORDER BY id')], dtype=np.int64)
+        removed = np.setdiff1d(self._ids, ids, assume_unique=True)
+        added = np.setdiff1d(ids, self._ids, assume_unique=True)
+        if removed.size:
+            self._index.remove_ids(removed)
+        if added.size:
+            dim = self._index.d
+            for start in range(0, added.size, LOOKUP_BATCH):
+                batch = added[start:start + LOOKUP_BATCH].tolist()
+                rows = self._db.execute(
+                    f'SELECT id, vector FROM chunks WHERE id IN ({",".join("?" * len(batch))})', batch
+                ).fetchall()
+                if not rows:
+                    continue
+                vectors = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float16)
+                self._index.add_with_ids(
+                    vectors.reshape(len(rows), dim).astype(np.float32),
+                    np.array([row[0] for row in rows], dtype=np.int64)
+                )
+        self._ids = ids
+        if self._needs_rebuild():
+            self._start_rebuild()
+
+    def _rebuild(self):
+        # Builds the index in place, for a process with no index or snapshot
+        # to start from; growth past ann_threshold goes through _start_rebuild
+        dim = self._meta('dim')
+        if dim is None:
+            self._index = None
+            self._ids = np.empty(0, dtype=np.int64)
+            return
+
+        rows = self._db.execute('SELECT id, vector FROM chunks ORDER BY id').fetchall()
+        self._index, self._ids, self._trained_size = self._build(rows, dim)
+        self._configure()
+        self.rebuilds += 1
+        logger.info(f"Corpus index rebuilt: {len(rows)} chunks, {self.index_type()}")
+
+    def _start_rebuild(self):
+        # Called with the lock held; at most one rebuild runs at a time
+        if self._rebuilding:
+            return
+        self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self):
+        # Reads the chunks and trains the new index without the lock or a
+        # write transaction, so searches and writes go on against the old
+        # one. The lock is only taken to catch the new index up with the
+        # changes made meanwhile and swap it in.
+        try:
+            # A connection of its own: the shared one is only used under the lock
+            connection = sqlite3.connect(os.path.join(self.directory, DATABASE_FILE))
+            try:
+                connection.execute('BEGIN')
+                dim = connection.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()[0]
+                rows = connection.execute('SELECT id, vector FROM chunks ORDER BY id').fetchall()
+                connection.execute('COMMIT')
+            finally:
+                connection.close()
+
+            index, ids, trained_size = self._build(rows, dim)
+
+            import faiss
+            with self._lock:
+                self._index, self._ids, self._trained_size = index, ids, trained_size
+                self._configure()
+                generation = self._meta('generation')
+                self._catch_up()
+                self._generation = generation
+                self.rebuilds += 1
+                snapshot = {
+                    "index": faiss.serialize_index(self._index),
+                    "ids": self._ids,
+                    "trained_size": -1 if self._trained_size is None else self._trained_size
+                }
+            logger.info(f"Corpus index rebuilt: {len(rows)} chunks, {self.index_type()}")
+            self._write_snapshot(snapshot)
+        except Exception as e:
+            logger.error(f"Error rebuilding corpus index: {str(e)}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _build(self, rows, dim):
+        # A new index over (id, vector) rows, with its training size
+        import faiss
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        vectors = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float16)
+        vectors = vectors.reshape(len(rows), dim).astype(np.float32)
+
+        if len(rows) < self.ann_threshold:
+            index = faiss.index_factory(dim, 'IDMap2,Flat', faiss.METRIC_INNER_PRODUCT)
+            trained_size = None
+        else:
+            # About sqrt(n) lists, each trained on 39 (the faiss minimum) to 64
+            # vectors, which keeps a retrain at 200k chunks to seconds
+            nlist = max(1, min(int(len(rows) ** 0.5), len(rows) // 39))
+            index = faiss.index_factory(dim, f'IVF{nlist},SQ8', faiss.METRIC_INNER_PRODUCT)
+            sample = np.random.default_rng(0).choice(len(rows), min(len(rows), nlist * 64), replace=False)
+            index.train(vectors[sample])
+            trained_size = len(rows)
+        if len(rows):
+            index.add_with_ids(vectors, ids)
+        return index, ids, trained_size
+
+    def _configure(self):
+        if self._trained_size is not None:
+            import faiss
+            faiss.extract_index_ivf(self._index).nprobe = self.nprobe
+
+    def _needs_rebuild(self):
+        count = self._index.ntotal
+        if self._trained_size is None:
+            return count >= self.ann_threshold
+        return count >= self._trained_size * RETRAIN_GROWTH
+
+    def _commit(self):
+        # Bumps the generation inside the open transaction and commits it.
+        # Every SNAPSHOT_EVERY changes the index is serialized too, to be
+        # written once the lock is released; None otherwise.
+        import faiss
+
+        generation = self._meta('generation') + 1
+        self._db.execute("UPDATE meta SET value = ? WHERE key = 'generation'", (generation,))
+        snapshot = None
+        if self._index is not None and generation - self._meta('snapshot_generation') >= SNAPSHOT_EVERY:
+            self._db.execute("UPDATE meta SET value = ? WHERE key = 'snapshot_generation'", (generation,))
+            snapshot = {
+                "index": faiss.serialize_index(self._index),
+                "ids": self._ids,
+                "trained_size": -1 if self._trained_size is None else self._trained_size
+            }
+        self._db.execute('COMMIT')
+        self._generation = generation
+        return snapshot
+
+    def _write_snapshot(self, snapshot):
+        tmp_path = f"{self._snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **snapshot)
+            os.replace(tmp_path, self._snapshot_path)
+        except OSError as e:
+            logger.error(f"Error writing corpus index snapshot: {str(e)}")
+            return
+        with self._lock:
+            self.snapshots += 1
+
+    def _write(self, apply):
+        # Runs apply() in a write transaction against an up-to-date index
+        snapshot = None
+        with self._lock:
+            # A process with no index loads or builds it before taking the
+            # database's write lock, the catch-up inside is then a no-op
+            self._sync()
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._sync()
+                changed = apply()
+                if changed:
+                    snapshot = self._commit()
+                    # After the commit, so the rebuild reads this change too
+                    if self._index is not None and self._needs_rebuild():
+                        self._start_rebuild()
+                else:
+                    self._db.execute('ROLLBACK')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                # The in-memory index may hold the rolled back change
+                self._generation = None
+                raise
+
+        if snapshot is not None:
+            self._write_snapshot(snapshot)
+        return changed
+
+    def _remove_document(self, document_id):
+        # Deletes the document's chunks from the database and the index
+        ids = np.array([row[0] for row in self._db.execute(
+            'SELECT id FROM chunks WHERE document_id = ?', (document_id,)
+        )], dtype=np.int64)
+        self._db.execute('DELETE FROM chunks WHERE document_id = ?', (document_id,))
+        self._db.execute('DELETE FROM documents WHERE document_id = ?', (document_id,))
+        if self._index is not None and ids.size:
+            self._index.remove_ids(ids)
+            self._ids = np.setdiff1d(self._ids, ids, assume_unique=True)
+
+    def add_document(self, document_id, filename, documents, vectors):
+        # Documents are keyed by content hash, so adding one twice is a no-op
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        def apply():
+            if self._db.execute('SELECT 1 FROM documents WHERE document_id = ?', (document_id,)).fetchone():
+                return False
+            if not len(documents):
+                return False
+            if len(documents) > self.max_chunks:
+                raise ValueError(f"Document has {len(documents)} chunks, the corpus holds at most {self.max_chunks}")
+
+            dim = self._meta('dim')
+            if dim is None:
+                self._db.execute("INSERT INTO meta VALUES ('dim', ?)", (vectors.shape[1],))
+            elif dim != vectors.shape[1]:
+                raise ValueError(f"Vectors have {vectors.shape[1]} dimensions, the corpus has {dim}")
+
+            # Oldest documents make room for the new one
+            total = self._db.execute('SELECT COALESCE(SUM(chunks), 0) FROM documents').fetchone()[0]
+            while total + len(documents) > self.max_chunks:
+                oldest, chunks = self._db.execute(
+                    'SELECT document_id, chunks FROM documents ORDER BY added_at LIMIT 1'
+                ).fetchone()
+                self._remove_document(oldest)
+                total -= chunks
+                self.evictions += 1
+
+            self._db.execute(
+                'INSERT INTO documents VALUES (?, ?, ?, ?)',
+                (document_id, filename, len(documents), time.time())
+            )
+            ids = []
+            for position, (doc, vector) in enumerate(zip(documents, vectors)):
+                cursor = self._db.execute(
+                    'INSERT INTO chunks (document_id, position, text, metadata, vector) VALUES (?, ?, ?, ?, ?)',
+                    (document_id, position, doc.page_content, json.dumps(doc.metadata),
+                     vector.astype(np.float16).tobytes())
+                )
+                ids.append(cursor.lastrowid)
+
+            if self._index is None:
+                self._rebuild()
+            else:
+                # Chunk ids only grow, so the id list stays sorted
+                ids = np.array(ids, dtype=np.int64)
+                self._index.add_with_ids(vectors, ids)
+                self._ids = np.concatenate([self._ids, ids])
+            return True
+
+        return self._write(apply)
+
+    def delete_document(self, document_id):
+        def apply():
+            if not self._db.execute('SELECT 1 FROM documents WHERE document_id = ?', (document_id,)).fetchone():
+                return False
+            self._remove_document(document_id)
+            return True
+
+        return self._write(apply)
+
+    def _lookup(self, ids):
+        rows = {}
+        for start in range(0, len(ids), LOOKUP_BATCH):
+            batch = ids[start:start + LOOKUP_BATCH]
+            query = (
+                'SELECT c.id, c.document_id, d.filename, c.text, c.metadata '
+                'FROM chunks c JOIN documents d ON d.document_id = c.document_id '
+                f'WHERE c.id IN ({",".join("?" * len(batch))})'
+            )
+            for chunk_id, document_id, filename, text, metadata in self._db.execute(query, batch):
+                rows[chunk_id] = (document_id, filename, Document(page_content=text, metadata=json.loads(metadata)))
+        return rows
+
+    def search(self, vector, k=5, chunks_per_document=3):
+        # The k best documents, each with its best-scoring chunks; scores are
+        # cosine similarities, since the vectors are normalized
+        query = np.asarray([vector], dtype=np.float32)
+        with self._lock:
+            self._sync()
+            self.searches += 1
+            if self._index is None or not self._index.ntotal:
+                return []
+
+            total = self._index.ntotal
+            fetch = min(total, k * chunks_per_document * 4)
+            rows = {}
+            while True:
+                scores, ids = self._index.search(query, fetch)
+                hits = [(int(i), float(score)) for i, score in zip(ids[0], scores[0]) if i >= 0]
+                rows.update(self._lookup([i for i, _ in hits if i not in rows]))
+
+                groups = {}
+                for chunk_id, score in hits:
+                    if chunk_id not in rows:
+                        continue
+                    document_id, filename, doc = rows[chunk_id]
+                    group = groups.setdefault(document_id, {
+                        "document_id": document_id,
+                        "filename": filename,
+                        "score": score,
+                        "chunks": []
+                    })
+                    if len(group['chunks']) < chunks_per_document:
+                        group['chunks'].append((doc, score))
+
+                # Too few distinct documents among the hits: look further down
+                if len(groups) >= k or fetch >= total:
+                    break
+                fetch = min(total, fetch * 4)
+
+        return sorted(groups.values(), key=lambda group: group['score'], reverse=True)[:k]
+
+    def documents(self):
+        with self._lock:
+            return [
+                {"document_id": document_id, "filename": filename, "chunks": chunks, "added_at": added_at}
+                for document_id, filename, chunks, added_at in self._db.execute(
+                    'SELECT document_id, filename, chunks, added_at FROM documents ORDER BY added_at'
+                )
+            ]
+
+    def contains(self, document_id):
+        with self._lock:
+            return self._db.execute(
+                'SELECT 1 FROM documents WHERE document_id = ?', (document_id,)
+            ).fetchone() is not None
+
+    def index_type(self):
+        if self._index is None:
+            return None
+        return 'ivf_sq8' if self._trained_size is not None else 'flat'
+
+    def stats(self):
+        with self._lock:
+            documents, chunks = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM documents'
+            ).fetchone()
+            return {
+                "documents": documents,
+                "chunks": chunks,
+                "index_type": self.index_type(),
+                "ann_threshold": self.ann_threshold,
+                "nprobe": self.nprobe,
+                "max_chunks": self.max_chunks,
+                "searches": self.searches,
+                "rebuilds": self.rebuilds,
+                "rebuilding": self._rebuilding,
+                "snapshots": self.snapshots,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,155 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.vectors = [None] * len(texts)
+        self.remaining = len(texts)
+        self.next_index = 0
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.started = False
+
+
+# Embeddings wrapper that micro-batches texts from concurrent callers. A
+# background thread waits up to max_wait for texts to pile up, then sends at
+# most max_batch_size of them, sorted by length, through the encoder in one
+# call. Queries are taken before document chunks so /ask isn't stuck behind
+# a large upload.
+class BatchingEmbeddings(Embeddings):
+
+    def __init__(self, embeddings, max_batch_size=32, max_wait=0.01):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queries = deque()
+        self._documents = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self.batches = 0
+        self.texts = 0
+        self.encode_seconds = 0.0
+        self.requests = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def embed_documents(self, texts):
+        return self._submit(list(texts), self._documents).result()
+
+    def embed_query(self, text):
+        return self._submit([text], self._queries).result()[0]
+
+    def _submit(self, texts, queue):
+        request = _Request(texts)
+        if not texts:
+            request.future.set_result([])
+            return request.future
+
+        with self._condition:
+            # Started on first use so it runs in the worker process; a thread
+            # started before a fork doesn't exist in the child
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._thread.start()
+            queue.append(request)
+            self._condition.notify()
+        return request.future
+
+    def _pending(self):
+        return sum(
+            len(request.texts) - request.next_index
+            for queue in (self._queries, self._documents)
+            for request in queue
+        )
+
+    def _take(self):
+        # Called with the lock held
+        items = []
+        now = time.perf_counter()
+        for queue in (self._queries, self._documents):
+            while queue and len(items) < self.max_batch_size:
+                request = queue[0]
+                if request.future.done():
+                    queue.popleft()
+                    continue
+                if not request.started:
+                    request.started = True
+                    wait = now - request.enqueued_at
+                    self.requests += 1
+                    self.queue_wait_total += wait
+                    self.queue_wait_max = max(self.queue_wait_max, wait)
+
+                count = min(len(request.texts) - request.next_index, self.max_batch_size - len(items))
+                items.extend((request, i) for i in range(request.next_index, request.next_index + count))
+                request.next_index += count
+                if request.next_index == len(request.texts):
+                    queue.popleft()
+        return items
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not (self._queries or self._documents):
+                    self._condition.wait()
+                # Give concurrent requests a short window to join this batch
+                deadline = time.perf_counter() + self.max_wait
+                while self._pending() < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                items = self._take()
+
+            if items:
+                self._encode(items)
+
+    def _encode(self, items):
+        # Sorted by length so the padded batch wastes as little as possible
+        items.sort(key=lambda item: len(item[0].texts[item[1]]))
+        start_time = time.perf_counter()
+        try:
+            vectors = self.embeddings.embed_documents([request.texts[i] for request, i in items])
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(items)} texts failed: {str(e)}")
+            for request, _ in items:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - start_time
+
+        with self._condition:
+            self.batches += 1
+            self.texts += len(items)
+            self.encode_seconds += elapsed
+
+        for (request, i), vector in zip(items, vectors):
+            request.vectors[i] = vector
+            request.remaining -= 1
+            if request.remaining == 0:
+                request.future.set_result(request.vectors)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "batches": self.batches,
+                "texts": self.texts,
+                "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+                "texts_per_second": round(self.texts / self.encode_seconds, 1) if self.encode_seconds else 0.0,
+                "queue_wait_ms": {
+                    "mean": round(self.queue_wait_total / self.requests * 1000, 2) if self.requests else 0.0,
+                    "max": round(self.queue_wait_max * 1000, 2)
+                },
+                "pending": self._pending()
+            }
@@ -0,0 +1,205 @@
+import os
+import json
+import fcntl
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 32
+
+
+# Chunk embeddings on disk, shared by every document and worker. Vectors are
+# appended to one flat array file; a parallel file holds the SHA-256 of each
+# row's text (and model id), so row i of one belongs to row i of the other.
+# Appends are serialized with flock. Single rows can't be dropped from an
+# append-only file, so once the budget is exceeded the cache starts over.
+class EmbeddingCache:
+
+    def __init__(self, directory, model_id, dtype='float16', max_bytes=256 * 1024 * 1024):
+        self.model_id = model_id
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.directory = os.path.join(
+            directory, hashlib.sha256(f"{model_id}\0{self.dtype.name}".encode('utf-8')).hexdigest()[:16]
+        )
+        self._vectors_path = os.path.join(self.directory, 'vectors.bin')
+        self._keys_path = os.path.join(self.directory, 'keys.bin')
+        self._meta_path = os.path.join(self.directory, 'meta.json')
+        self._lock_path = os.path.join(self.directory, '.lock')
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._keys_read = 0
+        self._keys_inode = None
+        self._dim = None
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._refresh()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode('utf-8')).digest()
+
+    def _refresh(self):
+        # Picks up rows appended by other processes; called with the lock held
+        try:
+            stat = os.stat(self._keys_path)
+        except OSError:
+            self._rows, self._keys_read, self._keys_inode = {}, 0, None
+            return
+
+        if stat.st_ino != self._keys_inode or stat.st_size < self._keys_read:
+            # Reset by another process
+            self._rows, self._keys_read, self._keys_inode = {}, 0, stat.st_ino
+            try:
+                with open(self._meta_path, 'r', encoding='utf-8') as f:
+                    self._dim = json.load(f)['dim']
+            except (OSError, ValueError, KeyError):
+                self._dim = None
+
+        usable = stat.st_size - stat.st_size % DIGEST_SIZE
+        if usable > self._keys_read:
+            with open(self._keys_path, 'rb') as f:
+                f.seek(self._keys_read)
+                data = f.read(usable - self._keys_read)
+            first_row = self._keys_read // DIGEST_SIZE
+            for offset in range(0, len(data), DIGEST_SIZE):
+                self._rows[data[offset:offset + DIGEST_SIZE]] = first_row + offset // DIGEST_SIZE
+            self._keys_read += len(data)
+
+    def get_many(self, texts):
+        # Vectors for the texts, None where the text isn't cached. The refresh
+        # is a single stat when nothing changed, and it catches a reset by
+        # another process before the old rows are read from the new file.
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            self._refresh()
+            rows = [self._rows.get(key) for key in keys]
+            dim = self._dim
+            inode = self._keys_inode
+
+        stored = {}
+        if dim is not None and any(row is not None for row in rows):
+            try:
+                with open(self._vectors_path, 'rb') as f:
+                    # Rows past the end of the file can't be read yet
+                    stored_rows = os.fstat(f.fileno()).st_size // (dim * self.dtype.itemsize)
+                    found = {row for row in rows if row is not None and row < stored_rows}
+                    if found:
+                        vectors = np.memmap(f, dtype=self.dtype, mode='r', shape=(max(found) + 1, dim))
+                        stored = {row: vectors[row].astype(np.float32).tolist() for row in found}
+                # A reset after the refresh may have replaced the file just read
+                if os.stat(self._keys_path).st_ino != inode:
+                    stored = {}
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading embedding cache: {str(e)}")
+                stored = {}
+
+        vectors = [stored.get(row) for row in rows]
+        hits = sum(vector is not None for vector in vectors)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, texts, vectors):
+        data = np.asarray(vectors, dtype=self.dtype)
+        if not len(texts) or data.ndim != 2:
+            return
+        keys = [self._key(text) for text in texts]
+
+        with self._lock, open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                new = {}
+                for key, row in zip(keys, data):
+                    if key not in self._rows:
+                        new.setdefault(key, row)
+                if not new:
+                    return
+
+                row_bytes = data.shape[1] * self.dtype.itemsize
+                stored_rows = self._keys_read // DIGEST_SIZE
+                if self._dim != data.shape[1] or (stored_rows + len(new)) * row_bytes > self.max_bytes:
+                    self._reset(data.shape[1])
+                    stored_rows = 0
+
+                # Drop any vectors a crashed writer left without keys
+                with open(self._vectors_path, 'r+b') as f:
+                    f.truncate(stored_rows * row_bytes)
+                    f.seek(0, os.SEEK_END)
+                    f.write(np.stack(list(new.values())).tobytes())
+                with open(self._keys_path, 'ab') as f:
+                    f.write(b''.join(new))
+
+                for offset, key in enumerate(new):
+                    self._rows[key] = stored_rows + offset
+                self._keys_read += len(new) * DIGEST_SIZE
+            except OSError as e:
+                logger.error(f"Error writing embedding cache: {str(e)}")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reset(self, dim):
+        # New files under new inodes, so other processes notice and reload
+        for path, content in (
+            (self._meta_path, json.dumps({"model": self.model_id, "dtype": self.dtype.name, "dim": dim})),
+            (self._vectors_path, ''),
+            (self._keys_path, '')
+        ):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        self._rows = {}
+        self._keys_read = 0
+        self._keys_inode = os.stat(self._keys_path).st_ino
+        if self._dim is not None:
+            self.resets += 1
+        self._dim = dim
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            rows = self._keys_read // DIGEST_SIZE
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "rows": rows,
+                "bytes": rows * (self._dim or 0) * self.dtype.itemsize,
+                "max_bytes": self.max_bytes,
+                "dtype": self.dtype.name,
+                "resets": self.resets
+            }
+
+
+# Sends only the chunks missing from the cache to the wrapped embeddings;
+# queries are rarely repeated and go straight through
+class CachedEmbeddings(Embeddings):
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self.cache.put_many(missing, [computed[text] for text in missing])
+            vectors = [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import subprocess
+from collections import deque
+
+# With PDF_WORKERS above 1, large PDFs are split into page ranges and
+# extracted by that many worker processes. Off by default, as it only pays
+# off with as many free cores: a worker costs about 170 ms to start and parse
+# the file, against about 1.2 ms a page extracted in process, so two workers
+# break even at about 300 pages and four at about 200.
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', 1))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 300))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 16))
+
+
+def iter_pdf_pages(filepath, workers=PDF_WORKERS, min_parallel_pages=PDF_PARALLEL_MIN_PAGES,
+                   pages_per_task=PDF_PAGES_PER_TASK):
+    import PyPDF2
+
+    with open(filepath, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        page_count = len(reader.pages)
+
+        if workers <= 1 or page_count < min_parallel_pages:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+
+    ranges = deque(
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+    workers = min(workers, len(ranges))
+
+    # Workers run this file as a script. Not forked, since the parent may hold
+    # model threads and locks, and not through multiprocessing, whose spawned
+    # workers re-import the parent's main module: app.py, when it runs directly.
+    processes = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), filepath],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)
+    ]
+    try:
+        # Range i goes to worker i % workers, which answers in order. Only a
+        # couple of ranges per worker in flight, so finished pages never pile
+        # up in memory ahead of the consumer.
+        in_flight = deque()
+        task = 0
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, stop = ranges.popleft()
+                process = processes[task % workers]
+                process.stdin.write(json.dumps([start, stop]) + '\n')
+                process.stdin.flush()
+                in_flight.append(process)
+                task += 1
+            process = in_flight.popleft()
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"PDF extraction worker exited with code {process.wait()}")
+            yield from json.loads(line)
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+            process.stdin.close()
+            process.stdout.close()
+
+
+def _serve(filepath):
+    # A worker for one PDF, parsed once: extracts the page range of each
+    # [start, stop] line on stdin and writes its pages back as a line of JSON
+    import PyPDF2
+
+    with open(filepath, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for line in sys.stdin:
+            start, stop = json.loads(line)
+            pages = [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+            sys.stdout.write(json.dumps(pages) + '\n')
+            sys.stdout.flush()
+
+
+def iter_document_pages(filepath, filename):
+    ext = os.path.splitext(filename)[1].lower()
+
+    if ext == '.pdf':
+        yield from iter_pdf_pages(filepath)
+
+    elif ext in ['.doc', '.docx']:
+        import docx
+
+        doc = docx.Document(filepath)
+        for para in doc.paragraphs:
+            if para.text:
+                yield para.text
+
+    elif ext == '.txt':
+        with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+            yield f.read()
+
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+
+if __name__ == '__main__':
+    _serve(sys.argv[1])
@@ -0,0 +1,211 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from langchain_core.documents import Document
+
+from lexical_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.faiss'
+DOCSTORE_FILE = 'docstore.json'
+
+
+def make_index_key(stream, params):
+    # Hash of the uploaded bytes plus everything that shapes the index
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    digest.update(b'\0')
+    for block in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+# FAISS indexes stored on disk under their SHA-256 key, with an in-memory LRU
+# bounded by bytes in front. The disk copy is shared by every worker and
+# survives restarts, so a document is only embedded once.
+class IndexStore:
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, memory_bytes=128 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._disk_bytes = sum(size for _, _, size in self._scan())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan(self):
+        for shard in os.listdir(self.directory):
+            shard_path = os.path.join(self.directory, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for key in os.listdir(shard_path):
+                if key.endswith('.tmp'):
+                    continue
+                path = os.path.join(shard_path, key)
+                try:
+                    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+                    mtime = os.path.getmtime(os.path.join(path, INDEX_FILE))
+                except OSError:
+                    continue
+                yield path, mtime, size
+
+    def _remember(self, key, vectorstore, size):
+        if key in self._memory:
+            self._memory_size -= self._memory.pop(key)[1]
+        self._memory[key] = (vectorstore, size)
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_size -= evicted_size
+
+    def get(self, key, embeddings):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key][0]
+
+        import faiss
+
+        path = self._path(key)
+        index_path = os.path.join(path, INDEX_FILE)
+        try:
+            with open(os.path.join(path, DOCSTORE_FILE), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            # Read fully into memory: faiss only memory-maps the inverted lists
+            # of IVF indexes, and langchain builds flat ones
+            index = faiss.read_index(index_path)
+            size = os.path.getsize(index_path) + os.path.getsize(os.path.join(path, DOCSTORE_FILE))
+            # Bump mtime so disk eviction stays least-recently-used
+            os.utime(index_path)
+        except (OSError, ValueError, RuntimeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+
+        documents = {
+            doc_id: Document(page_content=doc['page_content'], metadata=doc['metadata'])
+            for doc_id, doc in zip(stored['ids'], stored['documents'])
+        }
+        vectorstore = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=InMemoryDocstore(documents),
+            index_to_docstore_id=dict(enumerate(stored['ids']))
+        )
+        # Stored since hybrid retrieval; older entries get one built on first use
+        lexical = stored.get('lexical')
+        vectorstore.lexical_index = BM25Index.from_dict(lexical) if lexical else None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, vectorstore, size)
+        return vectorstore
+
+    def set(self, key, vectorstore):
+        import faiss
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+        documents = []
+        for doc_id in ids:
+            doc = vectorstore.docstore.search(doc_id)
+            documents.append({"page_content": doc.page_content, "metadata": doc.metadata})
+        lexical = getattr(vectorstore, 'lexical_index', None)
+
+        # Written to a temporary directory and renamed, so readers in other
+        # workers never see a half-written index
+        tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            faiss.write_index(vectorstore.index, os.path.join(tmp_path, INDEX_FILE))
+            with open(os.path.join(tmp_path, DOCSTORE_FILE), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "ids": ids,
+                    "documents": documents,
+                    "lexical": lexical.to_dict() if lexical is not None else None
+                }, f)
+            size = sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))
+            # Another worker may have stored the same key meanwhile. Its copy is
+            # kept, so nothing is added on disk, but this one is still held in
+            # memory at its full size
+            if os.path.exists(path):
+                shutil.rmtree(tmp_path)
+                added = 0
+            else:
+                os.rename(tmp_path, path)
+                added = size
+        except (OSError, RuntimeError) as e:
+            logger.error(f"Error writing index {key}: {str(e)}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+
+        with self._lock:
+            self._remember(key, vectorstore, size)
+            self._disk_bytes += added
+            over_budget = self._disk_bytes > self.max_bytes
+
+        if over_budget:
+            self._evict()
+
+    def _evict(self):
+        # Trim to 90% of the budget so we don't rescan on every write
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._scan(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                shutil.rmtree(path)
+            except OSError:
+                continue
+            total -= size
+            key = os.path.basename(path)
+            with self._lock:
+                if key in self._memory:
+                    self._memory_size -= self._memory.pop(key)[1]
+                self.evictions += 1
+
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "max_memory_bytes": self.memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "max_bytes": self.max_bytes
+            }
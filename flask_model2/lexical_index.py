@@ -0,0 +1,82 @@
+import math
+import re
+from collections import Counter
+
+# Words, numbers and hyphen/slash compounds such as "80-ib" or "u/s", so
+# section numbers and citations survive as tokens
+TOKEN_RE = re.compile(r'[a-z0-9]+(?:[-/][a-z0-9]+)*')
+
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'did', 'do', 'does', 'for', 'from',
+    'has', 'have', 'how', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 'said', 'say', 'says', 'that',
+    'the', 'this', 'to', 'was', 'were', 'what', 'when', 'where', 'which', 'who', 'why', 'with'
+))
+
+# Tokens that only occur in references to statutes and reported cases
+CITATION_WORDS = frozenset((
+    'section', 'sec', 's', 'sub-section', 'article', 'art', 'rule', 'order', 'clause', 'schedule',
+    'para', 'paragraph', 'no', 'act', 'ipc', 'crpc', 'cpc', 'scc', 'air', 'scr', 'scale', 'v', 'vs',
+    'versus', 'u/s'
+))
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def citation_share(tokens):
+    # Share of the tokens that are numbers or citation words
+    if not tokens:
+        return 0.0
+    citations = sum(1 for token in tokens if token in CITATION_WORDS or any(ch.isdigit() for ch in token))
+    return citations / len(tokens)
+
+
+# Inverted index over the chunks of one document, scored with Okapi BM25.
+# Chunks are identified by their position, the same as in the FAISS index
+# built from them.
+class BM25Index:
+
+    def __init__(self, postings, lengths, k1=1.5, b=0.75):
+        # postings maps each term to [[position, term frequency], ...]
+        self.postings = postings
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @classmethod
+    def from_texts(cls, texts, k1=1.5, b=0.75):
+        postings = {}
+        lengths = []
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings.setdefault(term, []).append([position, frequency])
+        return cls(postings, lengths, k1, b)
+
+    @classmethod
+    def from_dict(cls, stored):
+        return cls(stored['postings'], stored['lengths'], stored['k1'], stored['b'])
+
+    def to_dict(self):
+        return {"k1": self.k1, "b": self.b, "lengths": self.lengths, "postings": self.postings}
+
+    def search(self, tokens, k=5):
+        # [(position, score)] of the k best chunks containing any query token
+        count = len(self.lengths)
+        if not count or not self.average_length:
+            return []
+
+        scores = {}
+        for term in set(tokens):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / self.average_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
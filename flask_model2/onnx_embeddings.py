@@ -0,0 +1,111 @@
+import os
+import inspect
+import logging
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+FP32_FILE = 'model.onnx'
+INT8_FILE = 'model_int8.onnx'
+# sentence-transformers truncates all-MiniLM-L6-v2 input at 256 tokens
+MAX_SEQUENCE_LENGTH = 256
+
+
+def export_quantized(model_name, directory):
+    # Exports the encoder to ONNX once and quantizes its weights to int8;
+    # later calls (and restarts) reuse the file in directory
+    int8_path = os.path.join(directory, INT8_FILE)
+    if os.path.exists(int8_path):
+        return int8_path
+
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info(f"Exporting {model_name} to ONNX int8...")
+    os.makedirs(directory, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(directory)
+
+    sample = tokenizer(["Export sample text"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+    # Newer torch defaults to the dynamo exporter; keep the TorchScript one
+    export_kwargs = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+    # Per-process names, in case two workers export at the same time
+    fp32_path = os.path.join(directory, f"{os.getpid()}.{FP32_FILE}")
+    tmp_path = f"{int8_path}.{os.getpid()}.tmp"
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            **export_kwargs
+        )
+    quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, int8_path)
+    os.remove(fp32_path)
+    logger.info(f"ONNX int8 model written to {int8_path}")
+    return int8_path
+
+
+# all-MiniLM-L6-v2 served by ONNX Runtime: mean pooling over the int8 encoder
+# output and L2 normalization, as the sentence-transformers pipeline does
+class OnnxEmbeddings(Embeddings):
+
+    def __init__(self, model_name, directory, threads=1, max_length=MAX_SEQUENCE_LENGTH):
+        from transformers import AutoTokenizer
+
+        self.model_path = export_quantized(model_name, directory)
+        self.threads = threads
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.max_length = max_length
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        # One session per process: the session's thread pool doesn't survive
+        # a fork, so a worker forked from a preloading master opens its own
+        with self._lock:
+            if self._session_pid != os.getpid():
+                import onnxruntime
+
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = self.threads
+                options.inter_op_num_threads = 1
+                options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+                self._session = onnxruntime.InferenceSession(
+                    self.model_path, options, providers=['CPUExecutionProvider']
+                )
+                self._session_pid = os.getpid()
+            return self._session
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np'
+        )
+        session = self._get_session()
+        input_names = [node.name for node in session.get_inputs()]
+        hidden = session.run(None, {name: encoded[name].astype(np.int64) for name in input_names})[0]
+
+        mask = encoded['attention_mask'][..., None].astype(np.float32)
+        vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,130 @@
+import os
+import math
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Sliding-window counters, one row per (scope, client), in a SQLite database
+# shared by every worker. A row holds the request counts of the current and
+# the previous fixed window; the previous count is weighted by how much of it
+# still overlaps the sliding window, so each check is one row read and
+# written. Rows idle for two windows carry no state and are swept out.
+class RateLimiter:
+
+    def __init__(self, path, window=60):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._next_sweep = 0
+        self.allowed = 0
+        self.denied = 0
+        self.errors = 0
+        self.evicted = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS counters (
+                scope TEXT NOT NULL,
+                client TEXT NOT NULL,
+                window INTEGER NOT NULL,
+                current INTEGER NOT NULL,
+                previous INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (scope, client)
+            );
+            CREATE INDEX IF NOT EXISTS counters_updated ON counters (updated_at);
+        """)
+
+    @property
+    def _db(self):
+        # One connection per process: SQLite connections can't be used across
+        # a fork, and a preloading gunicorn master forks its workers
+        if self._connection_pid != os.getpid():
+            # Autocommit mode, transactions are opened explicitly
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=1)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            # The counters are worth losing on a power cut, not an fsync per request
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _retry_after(self, limit, current, previous, offset):
+        # Seconds until the weighted count drops low enough for one more request
+        if current + 1 > limit:
+            # Not before the next window, where this window's count is the previous
+            return self.window - offset + self.window * (1 - (limit - 1) / current)
+        return self.window * (1 - (limit - 1 - current) / previous) - offset
+
+    def hit(self, scope, client, limit):
+        # (allowed, retry_after seconds); counts the request if it's allowed.
+        # A limit of 0 turns the scope off, and a database error lets the
+        # request through rather than failing it.
+        if limit <= 0:
+            return True, 0
+        now = time.time()
+        window = int(now // self.window)
+        offset = now - window * self.window
+
+        with self._lock:
+            db = self._db
+            try:
+                db.execute('BEGIN IMMEDIATE')
+                row = db.execute(
+                    'SELECT window, current, previous FROM counters WHERE scope = ? AND client = ?',
+                    (scope, client)
+                ).fetchone()
+                current = previous = 0
+                if row is not None and row[0] == window:
+                    current, previous = row[1], row[2]
+                elif row is not None and row[0] == window - 1:
+                    previous = row[1]
+
+                estimate = previous * (1 - offset / self.window) + current
+                allowed = estimate + 1 <= limit
+                if allowed:
+                    db.execute(
+                        'INSERT OR REPLACE INTO counters VALUES (?, ?, ?, ?, ?, ?)',
+                        (scope, client, window, current + 1, previous, now)
+                    )
+                if now >= self._next_sweep:
+                    self._sweep(now)
+                db.execute('COMMIT')
+            except sqlite3.Error as e:
+                logger.error(f"Rate limiter error, letting the request through: {str(e)}")
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+                self.errors += 1
+                return True, 0
+
+            if allowed:
+                self.allowed += 1
+                return True, 0
+            self.denied += 1
+            return False, max(1, math.ceil(self._retry_after(limit, current, previous, offset)))
+
+    def _sweep(self, now):
+        # Called inside the write transaction, about once a window per process
+        removed = self._db.execute('DELETE FROM counters WHERE updated_at < ?', (now - 2 * self.window,)).rowcount
+        self.evicted += removed
+        self._next_sweep = now + self.window
+
+    def stats(self):
+        with self._lock:
+            try:
+                counters = self._db.execute('SELECT COUNT(*) FROM counters').fetchone()[0]
+            except sqlite3.Error:
+                counters = None
+            return {
+                "window_seconds": self.window,
+                "allowed": self.allowed,
+                "denied": self.denied,
+                "errors": self.errors,
+                "evicted": self.evicted,
+                "counters": counters
+            }
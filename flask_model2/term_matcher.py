@@ -0,0 +1,69 @@
+from collections import Counter, deque
+
+
+# Aho-Corasick automaton over a fixed term list. One pass over the text finds
+# every term occurring in it as a substring, the same hits as checking
+# `term in text` for each term, case-insensitively.
+class TermMatcher:
+
+    def __init__(self, terms):
+        # A term listed several times counts that many times towards weight()
+        self.weights = Counter(term.lower() for term in terms)
+
+        goto = [{}]
+        outputs = [()]
+        for term in self.weights:
+            state = 0
+            for ch in term:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    outputs.append(())
+                state = next_state
+            outputs[state] = (term,)
+
+        # Failure links in breadth-first order, then folded into the goto
+        # tables so matching never has to follow them
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        order = []
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for ch, next_state in goto[state].items():
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(ch, 0)
+                fail[next_state] = target if target != next_state else 0
+                outputs[next_state] += outputs[fail[next_state]]
+                queue.append(next_state)
+
+        for state in order:
+            for ch, next_state in goto[fail[state]].items():
+                goto[state].setdefault(ch, next_state)
+
+        self._goto = goto
+        self._outputs = outputs
+
+    def find(self, text):
+        goto = self._goto
+        outputs = self._outputs
+        state = 0
+        found = set()
+        for ch in text.lower():
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+    def weight(self, found):
+        return sum(self.weights[term] for term in found)
+
+    def stats(self):
+        return {
+            "terms": len(self.weights),
+            "states": len(self._goto)
+        }
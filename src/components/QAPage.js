@@ -11,6 +11,7 @@ function QAPage() {
   const [qaHistory, setQaHistory] = useState([]);
   const [isProcessing, setIsProcessing] = useState(false);
   const [currentFilename, setCurrentFilename] = useState(null);
+  const [documentId, setDocumentId] = useState(null);
   const [error, setError] = useState(null);
   const location = useLocation();
   const navigate = useNavigate();
@@ -27,6 +28,9 @@ function QAPage() {
         ) {
           setQaHistory(parsed.qaHistory);
           setCurrentFilename(parsed.currentFilename);
+          if (typeof parsed.documentId === 'string') {
+            setDocumentId(parsed.documentId);
+          }
           if (parsed.fileName) {
             setSelectedFile({ name: parsed.fileName });
           }
@@ -46,13 +50,14 @@ function QAPage() {
         localStorage.setItem('qaState', JSON.stringify({
           qaHistory: qaHistory,
           currentFilename,
+          documentId,
           fileName: selectedFile ? selectedFile.name : null,
         }));
       } catch (err) {
         setError('Failed to save Q&A history');
       }
     }
-  }, [qaHistory, selectedFile, currentFilename]);
+  }, [qaHistory, selectedFile, currentFilename, documentId]);
 
   useEffect(() => {
     return () => {
@@ -64,6 +69,16 @@ function QAPage() {
     };
   }, [location]);
 
+  const uploadDocument = useCallback(async (file) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await fetch('http://localhost:8001/upload', {
+      method: 'POST',
+      body: formData,
+    });
+    return response;
+  }, []);
+
   const handleFileChange = useCallback(async (file, retries = 3, delay = 5000) => {
     if (!file) return;
     if (file.size > 5 * 1024 * 1024) {
@@ -73,12 +88,7 @@ function QAPage() {
     setIsProcessing(true);
     setError(null);
     try {
-      const formData = new FormData();
-      formData.append('file', file);
-      const response = await fetch('http://localhost:8001/upload', {
-        method: 'POST',
-        body: formData,
-      });
+      const response = await uploadDocument(file);
 
       if (response.status === 503 && retries > 0) {
         setError(`Server is initializing. Retrying in ${delay/1000}s...`);
@@ -97,6 +107,7 @@ function QAPage() {
       }
 
       setCurrentFilename(data.filename);
+      setDocumentId(data.document_id);
       setSelectedFile(file);
       setQaHistory([]);
       localStorage.removeItem('qaState');
@@ -105,7 +116,7 @@ function QAPage() {
     } finally {
       setIsProcessing(false);
     }
-  }, []);
+  }, [uploadDocument]);
 
   const handleInputChange = useCallback((event) => {
     handleFileChange(event.target.files[0]);
@@ -140,6 +151,7 @@ function QAPage() {
   const handleRemoveFile = useCallback(() => {
     setSelectedFile(null);
     setCurrentFilename(null);
+    setDocumentId(null);
     setQaHistory([]);
     setError(null);
     try {
@@ -156,7 +168,7 @@ function QAPage() {
         !isProcessing
       ) {
         e.preventDefault();
-        if (!selectedFile) {
+        if (!selectedFile && !documentId) {
           setError('Please upload a document first.');
           return;
         }
@@ -175,14 +187,42 @@ function QAPage() {
         setQuestion('');
         setIsProcessing(true);
 
-        try {
+        const askQuestion = (id) => {
+          // The server keeps the indexed document, so only its id is sent
           const formData = new FormData();
-          formData.append('file', selectedFile);
+          if (id) {
+            formData.append('document_id', id);
+          } else {
+            formData.append('file', selectedFile);
+          }
           formData.append('question', question);
-          const response = await fetch('http://localhost:8001/ask', {
+          return fetch('http://localhost:8001/ask', {
             method: 'POST',
             body: formData,
           });
+        };
+
+        try {
+          let response = await askQuestion(documentId);
+
+          if (response.status === 404) {
+            const errorData = await response.json();
+            if (errorData.code !== 'document_not_found') {
+              throw new Error(errorData.error || 'Failed to get answer');
+            }
+            // The server dropped the document; upload it again if we still have it
+            if (!(selectedFile instanceof File)) {
+              setDocumentId(null);
+              throw new Error('Document expired, please upload it again');
+            }
+            const uploadResponse = await uploadDocument(selectedFile);
+            const uploadData = await uploadResponse.json();
+            if (!uploadResponse.ok || uploadData.status !== 'success') {
+              throw new Error(uploadData.error || 'Failed to upload document');
+            }
+            setDocumentId(uploadData.document_id);
+            response = await askQuestion(uploadData.document_id);
+          }
 
           if (response.status === 503 && retries > 0) {
             setError(`Server is initializing. Retrying in ${delay/1000}s...`);
@@ -229,7 +269,7 @@ function QAPage() {
         }
       }
     },
-    [question, selectedFile, isProcessing]
+    [question, selectedFile, documentId, isProcessing, uploadDocument]
   );
 
   const handleBackClick = () => {